@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import threading
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from drd.api import claude_api  # noqa: E402
+from drd.api.main import call_dravid_api_with_pagination, async_call_dravid_api_with_pagination  # noqa: E402
+from drd.api.transport import close_async_http_client, reset_session  # noqa: E402
+from drd.prompts.file_metada_desc_prompts import get_file_metadata_prompt  # noqa: E402
+from stand_in_server import start_stand_in_server_process  # noqa: E402
+
+
+def create_synthetic_repo(root, file_count):
+    for i in range(file_count):
+        package = os.path.join(root, f"pkg_{i // 100}")
+        os.makedirs(package, exist_ok=True)
+        with open(os.path.join(package, f"module_{i}.py"), 'w') as f:
+            f.write(f"def function_{i}(value):\n    return value * {i}\n")
+
+
+def load_prompts(root):
+    prompts = []
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(dirpath, name)
+            with open(path) as f:
+                prompts.append(get_file_metadata_prompt(
+                    os.path.relpath(path, root), f.read(), "{}", "{}"))
+    return prompts
+
+
+class ThreadSampler:
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, threading.active_count())
+            time.sleep(0.005)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+async def fan_out_threads(prompts, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def analyze(prompt):
+        async with semaphore:
+            return await asyncio.to_thread(call_dravid_api_with_pagination, prompt, include_context=True)
+
+    return await asyncio.gather(*(analyze(p) for p in prompts))
+
+
+async def fan_out_async(prompts, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def analyze(prompt):
+        async with semaphore:
+            return await async_call_dravid_api_with_pagination(prompt, include_context=True)
+
+    try:
+        return await asyncio.gather(*(analyze(p) for p in prompts))
+    finally:
+        await close_async_http_client()
+
+
+def run(label, coroutine):
+    with ThreadSampler() as sampler:
+        start = time.perf_counter()
+        results = asyncio.run(coroutine)
+        elapsed = time.perf_counter() - start
+    print(f"{label:<8} files={len(results)} wall={elapsed:.2f}s "
+          f"throughput={len(results) / elapsed:.0f} files/s peak_threads={sampler.peak}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Metadata fan-out: thread-per-request vs native asyncio clients")
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help="Simulated LLM latency per request in seconds")
+    args = parser.parse_args()
+
+    repo = tempfile.mkdtemp(prefix='drd-bench-repo-')
+    server, url = start_stand_in_server_process(args.latency)
+    os.environ.setdefault('CLAUDE_API_KEY', 'bench-key')
+    os.environ['DRAVID_LLM'] = 'claude'
+    os.environ['DRAVID_HTTP_POOL_SIZE'] = str(args.concurrency)
+    os.environ['DRAVID_ASYNC_POOL_SIZE'] = str(args.concurrency)
+    # the stand-in has no quota; keep the scheduler's rate limits out of the numbers
+    os.environ['DRAVID_RPM'] = '1000000000'
+    os.environ['DRAVID_INPUT_TPM'] = '1000000000'
+    os.environ['DRAVID_OUTPUT_TPM'] = '1000000000'
+    os.environ['DRAVID_MAX_CONCURRENCY'] = str(args.concurrency)
+    try:
+        create_synthetic_repo(repo, args.files)
+        prompts = load_prompts(repo)
+        with patch.object(claude_api, 'API_URL', url):
+            run("threads", fan_out_threads(prompts, args.concurrency))
+            run("asyncio", fan_out_async(prompts, args.concurrency))
+    finally:
+        server.terminate()
+        reset_session()
+        shutil.rmtree(repo, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
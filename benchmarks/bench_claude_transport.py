@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+from unittest.mock import patch
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from drd.api import claude_api  # noqa: E402
+from drd.api.transport import reset_session  # noqa: E402
+from stand_in_server import start_stand_in_server  # noqa: E402
+
+
+def unpooled_post(url, json=None, headers=None, stream=False, timeout=None):
+    return requests.post(url, json=json, headers=headers, stream=stream, timeout=timeout)
+
+
+def run_meta_init_calls(calls):
+    latencies = []
+    for i in range(calls):
+        start = time.perf_counter()
+        claude_api.call_claude_api_with_pagination(
+            f"Describe file src/module_{i}.py", include_context=True)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(label, latencies):
+    print(f"{label:<10} calls={len(latencies)} "
+          f"mean={statistics.mean(latencies) * 1000:.2f}ms "
+          f"p50={statistics.median(latencies) * 1000:.2f}ms "
+          f"total={sum(latencies):.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Per-call latency of the Claude client against a local stand-in server")
+    parser.add_argument('--calls', type=int, default=300)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="Simulated server processing time in seconds")
+    args = parser.parse_args()
+
+    server, url = start_stand_in_server(args.latency)
+    os.environ.setdefault('CLAUDE_API_KEY', 'bench-key')
+    try:
+        with patch.object(claude_api, 'API_URL', url):
+            with patch.object(claude_api, 'get_session') as get_session:
+                get_session.return_value.post.side_effect = unpooled_post
+                unpooled = run_meta_init_calls(args.calls)
+            reset_session()
+            pooled = run_meta_init_calls(args.calls)
+    finally:
+        server.shutdown()
+        reset_session()
+
+    report("unpooled", unpooled)
+    report("pooled", pooled)
+    saved = statistics.mean(unpooled) - statistics.mean(pooled)
+    print(f"saved per call: {saved * 1000:.2f}ms "
+          "(plain TCP on loopback; a real TLS handshake to the API costs far more)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from drd.api import openai_api  # noqa: E402
+from drd.api.providers import reset_clients  # noqa: E402
+from stand_in_server import start_stand_in_server  # noqa: E402
+
+
+def provider_env(llm_type, base_url):
+    if llm_type == 'azure':
+        return {
+            'DRAVID_LLM': 'azure',
+            'AZURE_OPENAI_API_KEY': 'bench-key',
+            'AZURE_OPENAI_API_VERSION': '2024-02-01',
+            'AZURE_OPENAI_ENDPOINT': base_url,
+            'AZURE_OPENAI_DEPLOYMENT_NAME': 'bench-deployment',
+        }
+    return {
+        'DRAVID_LLM': 'openai',
+        'OPENAI_API_KEY': 'bench-key',
+        'OPENAI_BASE_URL': f"{base_url}/v1",
+    }
+
+
+def uncached_client():
+    # what get_client() did before clients were cached: a new client, and
+    # with it a new connection pool, for every request
+    llm_type = openai_api.get_env_variable('DRAVID_LLM', 'openai').lower()
+    return openai_api.create_client(llm_type, openai_api.get_client_settings(llm_type))
+
+
+def time_calls(calls, func):
+    latencies = []
+    for i in range(calls):
+        start = time.perf_counter()
+        func(i)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run_requests(calls):
+    return time_calls(calls, lambda i: openai_api.call_api_with_pagination(
+        f"Describe file src/module_{i}.py", instruction_prompt="Describe the file"))
+
+
+def report(label, latencies):
+    print(f"{label:<30} calls={len(latencies)} "
+          f"mean={statistics.mean(latencies) * 1000:.3f}ms "
+          f"p50={statistics.median(latencies) * 1000:.3f}ms "
+          f"total={sum(latencies):.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Per-call client overhead for OpenAI and Azure against a local stand-in server")
+    parser.add_argument('--calls', type=int, default=300)
+    args = parser.parse_args()
+
+    server, url = start_stand_in_server()
+    base_url = url.rsplit('/v1/', 1)[0]
+    try:
+        for llm_type in ('openai', 'azure'):
+            with patch.dict(os.environ, provider_env(llm_type, base_url)):
+                report(f"{llm_type} construct per call",
+                       time_calls(args.calls, lambda i: uncached_client()))
+                report(f"{llm_type} cached lookup",
+                       time_calls(args.calls, lambda i: openai_api.get_client()))
+                with patch.object(openai_api, 'get_client', uncached_client):
+                    report(f"{llm_type} request, new client", run_requests(args.calls))
+                report(f"{llm_type} request, cached client", run_requests(args.calls))
+                reset_clients()
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import io
+import os
+import sys
+import time
+import base64
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from drd.utils.image_utils import prepare_image, prepare_images, clear_image_cache, has_pillow  # noqa: E402
+
+
+def build_screenshot(width, height, seed):
+    # flat panels with rows of "text" and a few photos, like a web page
+    from PIL import Image, ImageDraw, ImageFilter
+    rng = random.Random(seed)
+    image = Image.new('RGB', (width, height), (246, 246, 246))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.randrange(width), rng.randrange(height)
+        draw.rectangle((x, y, x + rng.randrange(200, 900), y + rng.randrange(100, 600)),
+                       fill=tuple(rng.randrange(256) for _ in range(3)))
+    for y in range(20, height, 28):
+        x = 20
+        while x < width - 40:
+            word = rng.randrange(20, 90)
+            draw.rectangle((x, y, x + word, y + 12), fill=(30, 30, 30))
+            x += word + 12
+    for _ in range(3):
+        photo = Image.effect_noise((rng.randrange(300, 700), rng.randrange(200, 500)), 80)
+        photo = photo.filter(ImageFilter.GaussianBlur(2)).convert('RGB')
+        image.paste(photo, (rng.randrange(width - photo.width), rng.randrange(height - photo.height)))
+    output = io.BytesIO()
+    image.save(output, 'PNG')
+    return output.getvalue()
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Payload size and preparation time for vision requests")
+    parser.add_argument('--width', type=int, default=2880)
+    parser.add_argument('--height', type=int, default=1800)
+    parser.add_argument('--images', type=int, default=4)
+    parser.add_argument('--mbps', type=float, default=20,
+                        help="Uplink bandwidth used to estimate upload time")
+    args = parser.parse_args()
+
+    if not has_pillow():
+        print("Pillow is not installed; images would be sent unchanged")
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = []
+        for i in range(args.images):
+            path = os.path.join(tmpdir, f'screenshot_{i}.png')
+            with open(path, 'wb') as f:
+                f.write(build_screenshot(args.width, args.height, i))
+            paths.append(path)
+
+        raw = sum(os.path.getsize(path) for path in paths)
+        raw_payload = sum(len(base64.b64encode(open(path, 'rb').read())) for path in paths)
+
+        clear_image_cache()
+        _, sequential = timed(lambda: [prepare_image(path) for path in paths])
+        clear_image_cache()
+        images, parallel = timed(lambda: prepare_images(paths))
+        _, cached = timed(lambda: prepare_images(paths))
+        prepared = sum(image.size for image in images)
+
+        upload = 8 / (args.mbps * 1e6)
+        print(f"{args.images} images, {args.width}x{args.height}")
+        print(f"raw:      {raw / 1e6:7.2f} MB on disk, {raw_payload / 1e6:7.2f} MB base64, "
+              f"upload ~{raw_payload * upload:6.2f}s")
+        print(f"prepared: {prepared / 1e6:7.2f} MB base64 ({images[0].mime_type}), "
+              f"upload ~{prepared * upload:6.2f}s")
+        print(f"prepare:  sequential {sequential * 1000:7.1f}ms, parallel {parallel * 1000:7.1f}ms, "
+              f"cached {cached * 1000:7.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+from unittest.mock import patch
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from drd.api.claude_api import parse_response  # noqa: E402
+from drd.metadata import rate_limit_handler  # noqa: E402
+from drd.utils import parser as response_parser  # noqa: E402
+from drd.utils.parser import extract_and_parse_xml  # noqa: E402
+
+
+def build_response(index, summary_chars, dependencies):
+    summary = ("Handles request routing, validation and persistence. " * (summary_chars // 54 + 1))[:summary_chars]
+    deps = ''.join(f"<dependency>package-{index}-{d}@1.{d}.0</dependency>" for d in range(dependencies))
+    return (
+        "Here is the metadata:\n"
+        "<response><metadata>"
+        f"<path>src/pkg_{index // 100}/module_{index}.py</path>"
+        "<type>python</type>"
+        f"<summary>{summary}</summary>"
+        f"<exports>fun:function_{index},class:Model{index}</exports>"
+        f"<imports>src/pkg_{index // 100}/base.py</imports>"
+        f"<external_dependencies>{deps}</external_dependencies>"
+        "</metadata></response>"
+    )
+
+
+def legacy_parse_response(response):
+    # the API layer before: parse, then serialise the tree back to text
+    try:
+        return ET.tostring(extract_and_parse_xml(response), encoding='unicode')
+    except Exception:
+        return response
+
+
+async def analyze(responses, parse):
+    async def call(query, include_context=False, instruction_prompt=None):
+        return parse(responses[query])
+
+    with patch.object(rate_limit_handler, 'async_call_dravid_api_with_pagination', call), \
+            patch.object(rate_limit_handler, 'get_file_metadata_prompt', lambda filename, *args: filename), \
+            patch.object(rate_limit_handler, 'print_success'):
+        return await asyncio.gather(*(
+            rate_limit_handler.process_single_file(name, '', '{}', '{}') for name in responses))
+
+
+def measure(label, responses, parse):
+    calls = 0
+    parse_xml = response_parser.parse_xml
+
+    def counting_parse_xml(response):
+        nonlocal calls
+        calls += 1
+        return parse_xml(response)
+
+    with patch.object(response_parser, 'parse_xml', counting_parse_xml):
+        start = time.perf_counter()
+        results = asyncio.run(analyze(responses, parse))
+        elapsed = time.perf_counter() - start
+    print(f"{label:<8} files={len(results)} wall={elapsed:.2f}s "
+          f"per_file={elapsed / len(results) * 1e6:.0f}us xml_parses={calls}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Metadata run over many responses: parse once vs parse, serialise and parse again")
+    parser.add_argument('--files', type=int, default=5000)
+    parser.add_argument('--summary-chars', type=int, default=2000)
+    parser.add_argument('--dependencies', type=int, default=40)
+    args = parser.parse_args()
+
+    responses = {f"src/module_{i}.py": build_response(i, args.summary_chars, args.dependencies)
+                 for i in range(args.files)}
+    legacy = measure("legacy", responses, legacy_parse_response)
+    current = measure("current", responses, parse_response)
+    assert legacy == current
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import os
+import re
+import sys
+import time
+import argparse
+from unittest.mock import patch
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from drd.utils.pretty_print_stream import pretty_print_xml_stream  # noqa: E402
+
+LINE = "generated fixture data, 0123456789 abcdefghijklmnopqrstuvwxyz\n"
+
+
+def build_response(size):
+    body = LINE * max(1, size // len(LINE))
+    return (
+        "<response><explanation>Add a large fixture file</explanation><steps>"
+        "<step><type>shell</type><command>mkdir -p fixtures</command></step>"
+        "<step><type>file</type><operation>CREATE</operation><filename>fixtures/data.txt</filename>"
+        f"<content><![CDATA[{body}]]></content></step>"
+        "</steps></response>"
+    )
+
+
+def legacy_pretty_print_xml_stream(chunk, state):
+    # the renderer used before, which searches the whole buffer per chunk
+    state['buffer'] += chunk
+
+    max_iterations = 1000
+    iteration_count = 0
+
+    while iteration_count < max_iterations:
+        iteration_count += 1
+
+        if not state.get('in_step'):
+            # Process explanation tags
+            match = re.search(r'<\s*explanation\s*>(.*?)<\s*/\s*explanation\s*>',
+                              state['buffer'], re.DOTALL | re.IGNORECASE)
+            if match:
+                explanation = match.group(1).strip()
+                click.echo(click.style("\nExplanation:",
+                           fg="green", bold=True), nl=False)
+                click.echo(f" {explanation}")
+                state['buffer'] = state['buffer'][match.end():]
+                continue
+
+            # Look for step start
+            step_start = re.search(
+                r'<\s*step\s*>', state['buffer'], re.IGNORECASE)
+            if step_start:
+                state['in_step'] = True
+                state['buffer'] = state['buffer'][step_start.end():]
+                continue
+
+        if state['in_step']:
+            step_end = re.search(r'<\s*/\s*step\s*>',
+                                 state['buffer'], re.IGNORECASE)
+            if step_end:
+                step_content = state['buffer'][:step_end.start()]
+                state['buffer'] = state['buffer'][step_end.end():]
+                state['in_step'] = False
+
+                # Process step content
+                type_match = re.search(
+                    r'<\s*type\s*>(.*?)<\s*/\s*type\s*>', step_content, re.DOTALL | re.IGNORECASE)
+                if type_match:
+                    step_type = type_match.group(1).strip().lower()
+                    if step_type == 'file':
+                        operation_match = re.search(
+                            r'<\s*operation\s*>(.*?)<\s*/\s*operation\s*>', step_content, re.DOTALL | re.IGNORECASE)
+                        filename_match = re.search(
+                            r'<\s*filename\s*>(.*?)<\s*/\s*filename\s*>', step_content, re.DOTALL | re.IGNORECASE)
+                        if operation_match and filename_match:
+                            operation = operation_match.group(1).strip()
+                            filename = filename_match.group(1).strip()
+                            click.echo(click.style("\n📂 File Operation:",
+                                       fg="yellow", bold=True), nl=False)
+                            click.echo(f" {operation} {filename}")
+
+                        # Process CDATA content
+                        cdata_start = step_content.find("<![CDATA[")
+                        if cdata_start != -1:
+                            cdata_end = step_content.rfind("]]>")
+                            if cdata_end != -1:
+                                cdata_content = step_content[cdata_start+9:cdata_end]
+                                click.echo(click.style(
+                                    "\n📄 File Content:", fg="cyan", bold=True))
+                                click.echo(cdata_content)
+                    elif step_type == 'shell':
+                        command_match = re.search(
+                            r'<\s*command\s*>(.*?)<\s*/\s*command\s*>', step_content, re.DOTALL | re.IGNORECASE)
+                        if command_match:
+                            command = command_match.group(1).strip()
+                            click.echo(click.style("\nShell Command:",
+                                       fg="blue", bold=True), nl=False)
+                            click.echo(f" {command}")
+                continue
+
+        # If we've reached this point, we couldn't process anything in this iteration
+        break
+
+    if iteration_count == max_iterations:
+        print("Debug: Max iterations reached, possible infinite loop detected")
+
+
+
+def measure(label, render, text, chunk_size):
+    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+    state = {
+        'buffer': '',
+        'in_step': False,
+    }
+    with patch.object(click, 'echo'):
+        start = time.perf_counter()
+        for chunk in chunks:
+            render(chunk, state)
+        elapsed = time.perf_counter() - start
+    print(f"{label:<8} size={len(text) / 1e6:5.2f}MB chunks={len(chunks):<7} "
+          f"{elapsed:8.3f}s  {len(text) / elapsed / 1e6:8.2f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Throughput of the streamed response renderer on a response with one large file")
+    parser.add_argument('--size', type=int, default=2 * 1024 * 1024)
+    parser.add_argument('--chunk-size', type=int, default=20)
+    parser.add_argument('--legacy-size', type=int, default=256 * 1024,
+                        help="Response size for the previous renderer, which is quadratic; 0 skips it")
+    args = parser.parse_args()
+
+    measure("current", pretty_print_xml_stream, build_response(args.size), args.chunk_size)
+    if args.legacy_size:
+        measure("legacy", legacy_pretty_print_xml_stream, build_response(args.legacy_size), args.chunk_size)
+        measure("current", pretty_print_xml_stream, build_response(args.legacy_size), args.chunk_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import threading
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from drd.api import claude_api  # noqa: E402
+from drd.api.main import call_dravid_api_with_pagination, async_call_dravid_api_with_pagination  # noqa: E402
+from drd.api.phases import phase_scope, METADATA, MAIN_QUERY  # noqa: E402
+from drd.api.scheduler import get_scheduler, reset_schedulers  # noqa: E402
+from drd.api.transport import close_async_http_client, reset_session  # noqa: E402
+from stand_in_server import start_stand_in_server_process  # noqa: E402
+
+PROMPT = "<file>module.py</file> Describe this module."
+
+
+async def background_job(files):
+    async def analyze():
+        with phase_scope(METADATA):
+            return await async_call_dravid_api_with_pagination(PROMPT)
+
+    try:
+        await asyncio.gather(*(analyze() for _ in range(files)))
+    finally:
+        await close_async_http_client()
+
+
+def interactive_user(phase, interval, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        with phase_scope(phase):
+            call_dravid_api_with_pagination("What does this project do?")
+        latencies.append(time.perf_counter() - start)
+        stop.wait(interval)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(label, phase, args):
+    reset_schedulers()
+    reset_session()
+    latencies = []
+    stop = threading.Event()
+    user = threading.Thread(target=interactive_user,
+                            args=(phase, args.interval, stop, latencies))
+    start = time.perf_counter()
+    user.start()
+    asyncio.run(background_job(args.files))
+    stop.set()
+    user.join()
+    elapsed = time.perf_counter() - start
+    lanes = get_scheduler('claude').stats()['lanes']
+    print(f"{label:<12} background={args.files} files in {elapsed:.1f}s | interactive calls={len(latencies)} "
+          f"p50={percentile(latencies, 0.5):.2f}s p95={percentile(latencies, 0.95):.2f}s "
+          f"max={max(latencies):.2f}s")
+    for lane, stats in lanes.items():
+        wait = stats['wait']
+        if wait['count']:
+            print(f"{'':<12} {lane:<12} waits: n={wait['count']} p50={wait['p50']:.2f}s "
+                  f"p95={wait['p95']:.2f}s max={wait['max']:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Interactive latency while a metadata job saturates the provider quota")
+    parser.add_argument('--files', type=int, default=900)
+    parser.add_argument('--rpm', type=int, default=600)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--interval', type=float, default=0.5,
+                        help="Seconds between interactive queries")
+    args = parser.parse_args()
+
+    os.environ.setdefault('CLAUDE_API_KEY', 'bench-key')
+    os.environ['DRAVID_LLM'] = 'claude'
+    # the same queries sharing one lane shows what a single FIFO queue did
+    for label, phase in (("single lane", METADATA), ("lanes", MAIN_QUERY)):
+        server, url = start_stand_in_server_process(args.latency, rpm=args.rpm)
+        try:
+            with patch.object(claude_api, 'API_URL', url):
+                run(label, phase, args)
+        finally:
+            server.terminate()
+
+
+if __name__ == '__main__':
+    main()
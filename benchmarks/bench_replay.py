@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+from contextlib import redirect_stdout
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from drd.api import claude_api  # noqa: E402
+from drd.api.cassette import reset_cassette  # noqa: E402
+from drd.api.transport import reset_session  # noqa: E402
+from drd.api.scheduler import reset_schedulers  # noqa: E402
+from drd.metadata.initializer import initialize_project_metadata  # noqa: E402
+from stand_in_server import start_stand_in_server_process  # noqa: E402
+
+
+def create_synthetic_repo(root, file_count):
+    for i in range(file_count):
+        package = os.path.join(root, f"pkg_{i // 50}")
+        os.makedirs(package, exist_ok=True)
+        with open(os.path.join(package, f"module_{i}.py"), 'w') as f:
+            f.write(f"def function_{i}(value):\n    return value * {i}\n")
+
+
+def run_meta_init(label, mode, template, timing='fast'):
+    os.environ['DRAVID_TRANSPORT_MODE'] = mode
+    os.environ['DRAVID_REPLAY_TIMING'] = timing
+    # each run stands for a fresh CLI process
+    reset_cassette()
+    reset_session()
+    reset_schedulers()
+    # prompts mention the project path, so every run uses the same one
+    repo = os.path.join(os.path.dirname(template), 'project')
+    try:
+        shutil.copytree(template, repo)
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            asyncio.run(initialize_project_metadata(repo))
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(repo, ignore_errors=True)
+    print(f"{label:<16} wall={elapsed:.2f}s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="meta-init recorded against a stand-in server, then replayed without network")
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.2,
+                        help="Simulated LLM latency per request in seconds while recording")
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='drd-bench-cassette-')
+    template = os.path.join(workdir, 'repo')
+    os.makedirs(template)
+    create_synthetic_repo(template, args.files)
+    os.environ['DRAVID_CASSETTE'] = os.path.join(workdir, 'meta_init.jsonl')
+    os.environ.setdefault('CLAUDE_API_KEY', 'bench-key')
+    os.environ['DRAVID_LLM'] = 'claude'
+    # the stand-in server has no quota to respect while recording
+    for name in ('DRAVID_RPM', 'DRAVID_INPUT_TPM', 'DRAVID_OUTPUT_TPM'):
+        os.environ.setdefault(name, '100000000')
+
+    server, url = start_stand_in_server_process(args.latency)
+    try:
+        with patch.object(claude_api, 'API_URL', url):
+            run_meta_init("record", 'record', template)
+            server.terminate()
+            # no server from here on; every response comes from the cassette
+            run_meta_init("replay original", 'replay', template, timing='original')
+            fast = [run_meta_init("replay fast", 'replay', template) for _ in range(args.runs)]
+        print(f"local processing: best={min(fast):.3f}s worst={max(fast):.3f}s over {args.runs} runs")
+    finally:
+        server.terminate()
+        reset_cassette()
+        reset_session()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from drd.api import claude_api  # noqa: E402
+from drd.api.main import async_call_dravid_api_with_pagination  # noqa: E402
+from drd.api.retry import get_retry_stats, retry_stats, reset_circuit_breakers  # noqa: E402
+from drd.api.scheduler import reset_schedulers  # noqa: E402
+from drd.api.transport import close_async_http_client  # noqa: E402
+from stand_in_server import start_stand_in_server_process  # noqa: E402
+
+PROMPT = "<file>module_{}.py</file> Describe this module."
+
+
+async def fixed_concurrency(files, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def analyze(index):
+        # straight to the provider, so only the semaphore bounds the fan-out
+        async with semaphore:
+            return await claude_api.async_call_claude_api_with_pagination(PROMPT.format(index))
+
+    try:
+        return await asyncio.gather(*(analyze(index) for index in range(files)), return_exceptions=True)
+    finally:
+        await close_async_http_client()
+
+
+async def scheduled(files):
+    # async_call_dravid_api_with_pagination takes its own scheduler slot; each
+    # file gets its own prompt so identical calls are not shared
+    try:
+        return await asyncio.gather(*(async_call_dravid_api_with_pagination(PROMPT.format(index))
+                                      for index in range(files)),
+                                    return_exceptions=True)
+    finally:
+        await close_async_http_client()
+
+
+def run(label, coroutine):
+    retry_stats.clear()
+    reset_circuit_breakers()
+    reset_schedulers()
+    start = time.perf_counter()
+    results = asyncio.run(coroutine)
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for result in results if isinstance(result, Exception))
+    stats = get_retry_stats().get('claude', {})
+    print(f"{label:<10} files={len(results)} failed={failed} wall={elapsed:.2f}s "
+          f"throughput={(len(results) - failed) / elapsed:.1f} files/s "
+          f"429s={stats.get('rate_limited', 0) + stats.get('exhausted', 0)} attempts={stats.get('attempts', 0)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Metadata fan-out against a rate-limited stand-in: fixed concurrency vs the scheduler")
+    parser.add_argument('--files', type=int, default=900)
+    parser.add_argument('--rpm', type=int, default=600,
+                        help="Requests per minute the stand-in allows")
+    parser.add_argument('--concurrency', type=int, default=50,
+                        help="Concurrency of the unscheduled run")
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    os.environ.setdefault('CLAUDE_API_KEY', 'bench-key')
+    os.environ['DRAVID_LLM'] = 'claude'
+    os.environ['DRAVID_ASYNC_POOL_SIZE'] = str(max(args.concurrency, 100))
+    os.environ.setdefault('DRAVID_RETRY_DEADLINE_MAIN_QUERY', '600')
+    for label, make_run in (("fixed", lambda: fixed_concurrency(args.files, args.concurrency)),
+                            ("scheduled", lambda: scheduled(args.files))):
+        # a fresh stand-in per run so both start with a full quota
+        server, url = start_stand_in_server_process(args.latency, rpm=args.rpm)
+        try:
+            with patch.object(claude_api, 'API_URL', url):
+                run(label, make_run())
+        finally:
+            server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+from contextlib import redirect_stdout
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+LINE = "generated fixture row,0123456789,abcdefghijklmnopqrstuvwxyz\n"
+CHUNK_CHARS = 64
+
+
+def stream_response(size):
+    def stream(query, instruction_prompt=None):
+        yield ("<response><explanation>Add a large fixture</explanation><steps>"
+               "<step><type>file</type><operation>CREATE</operation><filename>fixtures/data.csv</filename>"
+               "<content><![CDATA[")
+        # distinct chunks, as a real stream delivers them
+        for row in range(size // (len(LINE) + 10)):
+            line = f"{row:09d},{LINE}"
+            for i in range(0, len(line), CHUNK_CHARS):
+                yield line[i:i + CHUNK_CHARS]
+        yield "]]></content></step><step><type>shell</type><command>ls fixtures</command></step></steps></response>"
+    return stream
+
+
+def run(mode, size):
+    # runs in a child process so each mode has its own peak RSS
+    from drd.api import main as api_main
+    from drd.utils.parser import parse_dravid_response
+    from drd.utils.stream_parser import StreamParser
+    from drd.utils.step_executor import Executor
+
+    project = tempfile.mkdtemp(prefix='drd-bench-spool-')
+    os.chdir(project)
+    start = time.perf_counter()
+    with patch.object(api_main, 'get_api_functions', return_value=(None, None, stream_response(size))), \
+            patch('click.confirm', return_value=True), \
+            open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        if mode == 'in-memory':
+            commands = parse_dravid_response(api_main.stream_dravid_api("query"))
+        else:
+            parser = StreamParser()
+            api_main.stream_dravid_api("query", parser=parser)
+            commands = parser.close()
+        step = commands[1]
+        Executor().perform_file_operation(step['operation'], step['filename'], step['content'], force=True)
+    elapsed = time.perf_counter() - start
+    written = os.path.getsize(os.path.join(project, 'fixtures', 'data.csv'))
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(json.dumps({'elapsed': elapsed, 'written': written, 'peak': peak}))
+
+
+def measure(label, mode, size, env):
+    output = subprocess.run(
+        [sys.executable, __file__, '--run', mode, '--size', str(size)],
+        env=dict(os.environ, **env), capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    print(f"{label:<28} peak RSS={result['peak'] / 2**20:8.1f} MiB  "
+          f"{result['elapsed']:6.2f}s  written={result['written'] / 2**20:.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Peak memory of streaming a response that creates one large file")
+    parser.add_argument('--size', type=int, default=64 * 1024 * 1024,
+                        help="Size of the generated file in bytes")
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run(args.run, args.size)
+        return
+
+    no_spool = {'DRAVID_SPOOL_THRESHOLD': '0'}
+    measure("parse after stream", 'in-memory', args.size, no_spool)
+    measure("streamed, not spooled", 'streamed', args.size, no_spool)
+    measure("streamed and spooled", 'streamed', args.size, {})
+    measure("spooled, no single-flight", 'streamed', args.size, {'DRAVID_SINGLE_FLIGHT': 'false'})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from drd.api.claude_api import iter_stream_text  # noqa: E402
+
+NETWORK_READ_SIZE = 16384
+
+
+class NetworkReads(io.BytesIO):
+    # hands out at most one network read's worth of bytes per call
+    def read(self, size=-1):
+        if size is None or size < 0 or size > NETWORK_READ_SIZE:
+            size = NETWORK_READ_SIZE
+        return super().read(size)
+
+
+def build_stream(deltas, text):
+    events = [('message_start', {'type': 'message_start', 'message': {'usage': {'input_tokens': 10}}})]
+    for _ in range(deltas):
+        events.append(('ping', {'type': 'ping'}) if _ % 100 == 0 else None)
+        events.append(('content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                               'delta': {'type': 'text_delta', 'text': text}}))
+    events.append(('message_delta', {'type': 'message_delta', 'delta': {'stop_reason': 'end_turn'},
+                                     'usage': {'output_tokens': deltas}}))
+    events.append(('message_stop', {'type': 'message_stop'}))
+    return b''.join(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode()
+                    for name, data in filter(None, events))
+
+
+def make_response(payload):
+    response = requests.models.Response()
+    response.status_code = 200
+    response.raw = NetworkReads(payload)
+    return response
+
+
+def legacy_iter_stream_text(response):
+    # the line-based parser stream_claude_response used before
+    for line in response.iter_lines():
+        if line:
+            line = line.decode('utf-8')
+            if line.startswith('data: '):
+                event = json.loads(line[6:])
+                if event['type'] == 'content_block_delta':
+                    yield event['delta']['text']
+                elif event['type'] == 'message_stop':
+                    break
+
+
+def measure(label, payload, parse, rounds):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        text = ''.join(parse(make_response(payload)))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<12} {len(payload) / best / 1e6:8.1f} MB/s  {best * 1000:8.2f}ms  chars={len(text)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Throughput of the Claude stream parser over a synthetic SSE stream")
+    parser.add_argument('--deltas', type=int, default=50000)
+    parser.add_argument('--delta-chars', type=int, default=8,
+                        help="Characters per content_block_delta")
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    payload = build_stream(args.deltas, 'x' * args.delta_chars)
+    measure("line-based", payload, legacy_iter_stream_text, args.rounds)
+    measure("sse decoder", payload, lambda response: iter_stream_text(response, {}), args.rounds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import json
+import math
+import time
+import asyncio
+import threading
+import multiprocessing
+
+METADATA_RESPONSE = (
+    "<response><metadata><type>python</type><summary>Stand-in summary</summary>"
+    "<exports>None</exports><imports>None</imports></metadata></response>"
+)
+
+TOKEN_LIMIT = 10_000_000
+
+
+def build_response_body():
+    return json.dumps({
+        'content': [{'type': 'text', 'text': METADATA_RESPONSE}],
+        'stop_reason': 'end_turn',
+        'usage': {'input_tokens': 100, 'output_tokens': 40}
+    }).encode('utf-8')
+
+
+def build_openai_response_body():
+    return json.dumps({
+        'id': 'chatcmpl-stand-in',
+        'object': 'chat.completion',
+        'created': 0,
+        'model': 'gpt-4o',
+        'choices': [{'index': 0, 'finish_reason': 'stop',
+                     'message': {'role': 'assistant', 'content': METADATA_RESPONSE}}],
+        'usage': {'prompt_tokens': 100, 'completion_tokens': 40, 'total_tokens': 140}
+    }).encode('utf-8')
+
+
+class RequestQuota:
+    # Mimics Anthropic's requests-per-minute limit: a token bucket that
+    # refills continuously, reported through the same response headers.
+    def __init__(self, rpm):
+        self.rpm = rpm
+        self.level = rpm
+        self.updated = time.monotonic()
+
+    def check(self):
+        now = time.monotonic()
+        self.level = min(self.rpm, self.level +
+                         (now - self.updated) * self.rpm / 60)
+        self.updated = now
+        allowed = self.level >= 1
+        if allowed:
+            self.level -= 1
+        # only requests are limited; token budgets are reported as untouched
+        headers = (f"anthropic-ratelimit-requests-limit: {self.rpm}\r\n"
+                   f"anthropic-ratelimit-requests-remaining: {int(self.level)}\r\n"
+                   f"anthropic-ratelimit-input-tokens-limit: {TOKEN_LIMIT}\r\n"
+                   f"anthropic-ratelimit-input-tokens-remaining: {TOKEN_LIMIT}\r\n"
+                   f"anthropic-ratelimit-output-tokens-limit: {TOKEN_LIMIT}\r\n"
+                   f"anthropic-ratelimit-output-tokens-remaining: {TOKEN_LIMIT}\r\n")
+        if not allowed:
+            headers += f"retry-after: {math.ceil((1 - self.level) * 60 / self.rpm)}\r\n"
+        return allowed, headers.encode()
+
+
+async def handle_connection(reader, writer, latency, quota=None):
+    bodies = {False: build_response_body(), True: build_openai_response_body()}
+    try:
+        while True:
+            head = await reader.readuntil(b'\r\n\r\n')
+            # OpenAI and Azure clients post to .../chat/completions
+            body = bodies[b'/chat/completions' in head.split(b'\r\n', 1)[0]]
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            if length:
+                await reader.readexactly(length)
+            if latency:
+                await asyncio.sleep(latency)
+            status, extra_headers, payload = b'200 OK', b'', body
+            if quota is not None:
+                allowed, extra_headers = quota.check()
+                if not allowed:
+                    status, payload = b'429 Too Many Requests', b'{"type":"error"}'
+            writer.write(b'HTTP/1.1 ' + status + b'\r\nContent-Type: application/json\r\n' + extra_headers +
+                         b'Content-Length: ' + str(len(payload)).encode() + b'\r\n\r\n' + payload)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _start(latency, rpm=None):
+    quota = RequestQuota(rpm) if rpm else None
+    return await asyncio.start_server(
+        lambda r, w: handle_connection(r, w, latency, quota), '127.0.0.1', 0, backlog=1024)
+
+
+def _run(latency, on_ready, rpm=None):
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(_start(latency, rpm))
+    on_ready(loop, server.sockets[0].getsockname()[1])
+    loop.run_forever()
+
+
+class StandInServer:
+    def __init__(self, loop, port):
+        self.loop = loop
+        self.port = port
+
+    def shutdown(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def start_stand_in_server(latency=0.0):
+    ready = threading.Event()
+    holder = {}
+
+    def on_ready(loop, port):
+        holder['server'] = StandInServer(loop, port)
+        ready.set()
+
+    threading.Thread(target=_run, args=(latency, on_ready), daemon=True).start()
+    ready.wait(10)
+    server = holder['server']
+    return server, f"http://127.0.0.1:{server.port}/v1/messages"
+
+
+def start_stand_in_server_process(latency=0.0, rpm=None):
+    # Keeps the server's request handling off the client's GIL so that
+    # concurrency benchmarks measure the client, not the stand-in.
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_run, args=(latency, lambda loop, port: port_queue.put(port), rpm), daemon=True)
+    process.start()
+    port = port_queue.get(timeout=10)
+    return process, f"http://127.0.0.1:{port}/v1/messages"
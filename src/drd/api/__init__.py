@@ -1,4 +1,5 @@
-from .main import call_dravid_api_with_pagination, call_dravid_vision_api_with_pagination, stream_dravid_api
+from .main import call_dravid_api_with_pagination, call_dravid_vision_api_with_pagination, stream_dravid_api, async_call_dravid_api_with_pagination
 
 __all__ = ['call_dravid_api_with_pagination',
-           'call_dravid_vision_api_with_pagination', 'stream_dravid_api']
+           'call_dravid_vision_api_with_pagination', 'stream_dravid_api',
+           'async_call_dravid_api_with_pagination']
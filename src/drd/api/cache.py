@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+CACHE_DIR_NAME = '.drd_cache'
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_TTL = 7 * 24 * 60 * 60  # one week
+REPLAY_CHUNK_SIZE = 64
+
+_caches: Dict[str, 'ResponseCache'] = {}
+_caches_lock = threading.Lock()
+
+
+def is_cache_enabled() -> bool:
+    return os.getenv('DRAVID_CACHE', '').lower() in ('1', 'true', 'yes')
+
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def make_cache_key(provider: str, model: str, system_prompt: Optional[str], messages: List[Dict[str, Any]], stream: bool = False) -> str:
+    payload = json.dumps({
+        'provider': provider,
+        'model': model,
+        'system': system_prompt or "",
+        'messages': messages,
+        'stream': stream
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES, ttl: int = DEFAULT_TTL):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _remove(self, path: str, size: int):
+        try:
+            os.remove(path)
+            if self._total_bytes is not None:
+                self._total_bytes -= size
+        except OSError:
+            pass
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+
+            if time.time() - entry.get('created', 0) > self.ttl:
+                self._remove(path, os.path.getsize(path))
+                self.misses += 1
+                return None
+
+            # mtime doubles as the last-access time for LRU eviction
+            os.utime(path, None)
+            self.hits += 1
+            return entry['response']
+
+    def set(self, key: str, response: str):
+        path = self._path(key)
+        data = json.dumps({'created': time.time(), 'response': response})
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._entries())
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path):
+                self._total_bytes -= os.path.getsize(path)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._total_bytes += os.path.getsize(path)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        now = time.time()
+        entries = sorted(self._entries())
+        self._total_bytes = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            if now - mtime > self.ttl:
+                self._remove(path, size)
+        for mtime, size, path in entries:
+            if self._total_bytes <= self.max_bytes:
+                break
+            if os.path.exists(path):
+                self._remove(path, size)
+
+    def clear(self):
+        with self._lock:
+            for _, size, path in self._entries():
+                self._remove(path, size)
+            self._total_bytes = 0
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    if not is_cache_enabled():
+        return None
+    cache_dir = os.getenv('DRAVID_CACHE_DIR') or os.path.join(
+        os.getcwd(), CACHE_DIR_NAME)
+    with _caches_lock:
+        if cache_dir not in _caches:
+            _caches[cache_dir] = ResponseCache(
+                cache_dir,
+                max_bytes=_int_env('DRAVID_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES),
+                ttl=_int_env('DRAVID_CACHE_TTL', DEFAULT_TTL)
+            )
+        return _caches[cache_dir]
+
+
+def replay_chunks(response: str, chunk_size: int = REPLAY_CHUNK_SIZE) -> Iterator[str]:
+    for i in range(0, len(response), chunk_size):
+        yield response[i:i + chunk_size]
@@ -0,0 +1,439 @@
+import os
+import re
+import json
+import time
+import base64
+import codecs
+import asyncio
+import threading
+from collections import defaultdict, deque
+from typing import Any, Dict, Iterator, Optional
+import httpx
+import requests
+from requests.structures import CaseInsensitiveDict
+
+RECORD = 'record'
+REPLAY = 'replay'
+MODES = (RECORD, REPLAY)
+FAST = 'fast'
+ORIGINAL = 'original'
+# the cassette holds decoded bodies, so these no longer describe them
+DROPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+# prompts embed metadata such as "last_updated", which changes on every run
+TIMESTAMP_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?')
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+class CassetteMissError(LookupError):
+    def __init__(self, method: str, url: str):
+        super().__init__(f"No recorded response for {method} {url} in the cassette")
+        self.method = method
+        self.url = url
+
+
+def get_transport_mode() -> Optional[str]:
+    mode = os.getenv('DRAVID_TRANSPORT_MODE', '').lower()
+    if not mode or mode == 'live':
+        return None
+    if mode not in MODES:
+        raise ValueError(f"Unknown transport mode: {mode}")
+    return mode
+
+
+def get_cassette_path() -> str:
+    path = os.getenv('DRAVID_CASSETTE')
+    if not path:
+        raise ValueError("DRAVID_CASSETTE must point to a cassette file when recording or replaying")
+    return path
+
+
+def get_replay_speed() -> Optional[float]:
+    # None replays as fast as possible, otherwise recorded delays are divided
+    # by the returned factor
+    timing = os.getenv('DRAVID_REPLAY_TIMING', FAST).lower()
+    if timing == FAST:
+        return None
+    if timing == ORIGINAL:
+        return 1.0
+    try:
+        speed = float(timing)
+    except ValueError:
+        return None
+    return speed if speed > 0 else None
+
+
+def normalize_body(body: Any) -> Any:
+    if isinstance(body, (bytes, bytearray)):
+        if not body:
+            return None
+        try:
+            return json.loads(body)
+        except ValueError:
+            return base64.b64encode(bytes(body)).decode('ascii')
+    return body
+
+
+def request_key(method: str, url: str, body: Any) -> str:
+    # API keys live in headers, which are neither recorded nor matched on
+    key = json.dumps([method.upper(), url, normalize_body(body)], sort_keys=True, separators=(',', ':'))
+    return TIMESTAMP_PATTERN.sub('<timestamp>', key)
+
+
+def filter_headers(headers: Any) -> Dict[str, str]:
+    return {name.lower(): value for name, value in headers.items() if name.lower() not in DROPPED_HEADERS}
+
+
+class Recording:
+    def __init__(self, cassette: 'Cassette', method: str, url: str, body: Any):
+        self.cassette = cassette
+        self.method = method
+        self.url = url
+        self.body = normalize_body(body)
+        self.started = time.perf_counter()
+        self.status_code = None
+        self.headers = {}
+        self.headers_at = 0.0
+        self.chunks = []
+        self.binary = False
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.saved = False
+
+    def set_response(self, status_code: int, headers: Any):
+        self.status_code = status_code
+        self.headers = filter_headers(headers)
+        self.headers_at = time.perf_counter() - self.started
+
+    def add(self, chunk: bytes):
+        if not chunk:
+            return
+        at = time.perf_counter() - self.started
+        if not self.binary:
+            try:
+                self.chunks.append([at, self.decoder.decode(chunk)])
+                return
+            except UnicodeDecodeError:
+                # keep what was recorded so far, as bytes from here on
+                self.binary = True
+                self.chunks = [[t, base64.b64encode(text.encode('utf-8')).decode('ascii')]
+                               for t, text in self.chunks]
+        self.chunks.append([at, base64.b64encode(chunk).decode('ascii')])
+
+    def save(self):
+        if self.saved or self.status_code is None:
+            return
+        self.saved = True
+        self.cassette.save({
+            'request': {'method': self.method, 'url': self.url, 'body': self.body},
+            'response': {
+                'status_code': self.status_code,
+                'headers': self.headers,
+                'headers_at': self.headers_at,
+                'encoding': 'base64' if self.binary else 'text',
+                'chunks': self.chunks,
+            }
+        })
+
+
+class Interaction:
+    def __init__(self, response: Dict[str, Any], speed: Optional[float]):
+        self.status_code = response['status_code']
+        self.headers = CaseInsensitiveDict(response['headers'])
+        binary = response.get('encoding') == 'base64'
+        self.chunks = [(at, base64.b64decode(data) if binary else data.encode('utf-8'))
+                       for at, data in response['chunks']]
+        self.speed = speed
+
+    def delay(self, previous: float, at: float) -> float:
+        if self.speed is None:
+            return 0.0
+        return max(0.0, at - previous) / self.speed
+
+    def timed_chunks(self) -> Iterator[tuple]:
+        # the wait for the response headers is folded into the first chunk,
+        # so async replays never block the event loop
+        previous = 0.0
+        for at, chunk in self.chunks:
+            yield self.delay(previous, at), chunk
+            previous = at
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        for delay, chunk in self.timed_chunks():
+            if delay:
+                time.sleep(delay)
+            yield chunk
+
+    async def aiter_chunks(self):
+        for delay, chunk in self.timed_chunks():
+            if delay:
+                await asyncio.sleep(delay)
+            yield chunk
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str):
+        self.path = path
+        self.mode = mode
+        self.interactions = defaultdict(deque)
+        self.last = {}
+        self._lock = threading.Lock()
+        if mode == REPLAY:
+            self.load()
+
+    def load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    request = entry['request']
+                    key = request_key(request['method'], request['url'], request['body'])
+                    self.interactions[key].append(entry['response'])
+
+    def save(self, entry: Dict[str, Any]):
+        line = json.dumps(entry) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    def record(self, method: str, url: str, body: Any) -> Recording:
+        return Recording(self, method, url, body)
+
+    def play(self, method: str, url: str, body: Any) -> Interaction:
+        key = request_key(method, url, body)
+        with self._lock:
+            # identical requests get the recorded responses in order; once
+            # those run out the last one is served again
+            queue = self.interactions.get(key)
+            if queue:
+                self.last[key] = queue.popleft()
+            response = self.last.get(key)
+        if response is None:
+            raise CassetteMissError(method, url)
+        return Interaction(response, get_replay_speed())
+
+
+def get_cassette() -> Optional[Cassette]:
+    global _cassette
+    mode = get_transport_mode()
+    if mode is None:
+        return None
+    path = get_cassette_path()
+    with _cassette_lock:
+        if _cassette is None or (_cassette.path, _cassette.mode) != (path, mode):
+            _cassette = Cassette(path, mode)
+        return _cassette
+
+
+def reset_cassette():
+    global _cassette
+    with _cassette_lock:
+        _cassette = None
+
+
+def iter_lines(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    pending = b''
+    for chunk in chunks:
+        lines = (pending + chunk).splitlines(keepends=True)
+        pending = lines.pop() if lines and not lines[-1].endswith((b'\n', b'\r')) else b''
+        for line in lines:
+            yield line.rstrip(b'\r\n')
+    if pending:
+        yield pending
+
+
+class CassetteResponse:
+    # the requests.Response subset the API modules use, on top of a
+    # recording being written or an interaction being replayed
+    def __init__(self, url: str, status_code: int, headers: Any, chunks: Iterator[bytes],
+                 recording: Optional[Recording] = None, response: Any = None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self._chunks = chunks
+        self._content = None
+        self._recording = recording
+        self._response = response
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(
+                f"{self.status_code} Error for url: {self.url}", response=self)
+
+    def _iter_chunks(self) -> Iterator[bytes]:
+        if self._content is not None:
+            yield self._content
+            return
+        try:
+            for chunk in self._chunks:
+                if self._recording is not None:
+                    self._recording.add(chunk)
+                yield chunk
+        finally:
+            # a stream the caller stopped reading early is recorded up to
+            # where it stopped
+            self.close()
+
+    @property
+    def content(self) -> bytes:
+        if self._content is None:
+            self._content = b''.join(self._iter_chunks())
+        return self._content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8')
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        return self._iter_chunks()
+
+    def iter_lines(self) -> Iterator[bytes]:
+        return iter_lines(self._iter_chunks())
+
+    def close(self):
+        close = getattr(self._chunks, 'close', None)
+        if close is not None:
+            close()
+        if self._response is not None:
+            self._response.close()
+        if self._recording is not None:
+            self._recording.save()
+
+
+class CassetteSession:
+    def __init__(self, session, cassette: Cassette):
+        self.session = session
+        self.cassette = cassette
+
+    def post(self, url: str, json: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None,
+             stream: bool = False, timeout: Any = None, **kwargs) -> CassetteResponse:
+        if self.cassette.mode == REPLAY:
+            interaction = self.cassette.play('POST', url, json)
+            return CassetteResponse(url, interaction.status_code, interaction.headers, interaction.iter_chunks())
+
+        recording = self.cassette.record('POST', url, json)
+        response = self.session.post(url, json=json, headers=headers, stream=True, timeout=timeout, **kwargs)
+        recording.set_response(response.status_code, response.headers)
+        wrapped = CassetteResponse(url, response.status_code, filter_headers(response.headers),
+                                   response.iter_content(chunk_size=None), recording, response)
+        if not stream:
+            wrapped.content
+        return wrapped
+
+    def close(self):
+        self.session.close()
+
+
+async def cassette_async_post(cassette: Cassette, send, url: str, json: Optional[Dict[str, Any]] = None,
+                              headers: Optional[Dict[str, str]] = None) -> CassetteResponse:
+    if cassette.mode == REPLAY:
+        interaction = cassette.play('POST', url, json)
+        content = b''.join([chunk async for chunk in interaction.aiter_chunks()])
+        return CassetteResponse(url, interaction.status_code, interaction.headers, iter([content]))
+
+    recording = cassette.record('POST', url, json)
+    response = await send(url, json=json, headers=headers)
+    recording.set_response(response.status_code, response.headers)
+    wrapped = CassetteResponse(url, response.status_code, filter_headers(response.headers),
+                               iter([response.content]), recording)
+    wrapped.content
+    return wrapped
+
+
+class RecordingStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    def __init__(self, response: httpx.Response, recording: Recording):
+        self.response = response
+        self.recording = recording
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self.response.iter_bytes():
+            self.recording.add(chunk)
+            yield chunk
+
+    async def __aiter__(self):
+        async for chunk in self.response.aiter_bytes():
+            self.recording.add(chunk)
+            yield chunk
+
+    def close(self):
+        self.response.close()
+        self.recording.save()
+
+    async def aclose(self):
+        await self.response.aclose()
+        self.recording.save()
+
+
+class ReplayStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    def __init__(self, interaction: Interaction):
+        self.interaction = interaction
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self.interaction.iter_chunks()
+
+    def __aiter__(self):
+        return self.interaction.aiter_chunks()
+
+
+class CassetteTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    # plugs into the httpx clients the OpenAI SDK uses
+    def __init__(self, cassette: Cassette, transport=None, async_transport=None):
+        self.cassette = cassette
+        self.transport = transport
+        self.async_transport = async_transport
+
+    def _replay(self, request: httpx.Request) -> httpx.Response:
+        interaction = self.cassette.play(request.method, str(request.url), request.content)
+        return httpx.Response(interaction.status_code, headers=list(interaction.headers.items()),
+                              stream=ReplayStream(interaction), request=request)
+
+    def _recorded(self, request: httpx.Request, response: httpx.Response) -> httpx.Response:
+        recording = self.cassette.record(request.method, str(request.url), request.content)
+        # read through an httpx.Response so the body is decompressed first
+        decoded = httpx.Response(response.status_code, headers=response.headers,
+                                 stream=response.stream, request=request)
+        recording.set_response(response.status_code, response.headers)
+        return httpx.Response(response.status_code, headers=list(filter_headers(response.headers).items()),
+                              stream=RecordingStream(decoded, recording), request=request)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if self.cassette.mode == REPLAY:
+            return self._replay(request)
+        request.read()
+        return self._recorded(request, self.transport.handle_request(request))
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self.cassette.mode == REPLAY:
+            return self._replay(request)
+        await request.aread()
+        return self._recorded(request, await self.async_transport.handle_async_request(request))
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+    async def aclose(self):
+        if self.async_transport is not None:
+            await self.async_transport.aclose()
+
+
+def get_httpx_transport() -> Optional[CassetteTransport]:
+    cassette = get_cassette()
+    if cassette is None:
+        return None
+    return CassetteTransport(cassette, transport=httpx.HTTPTransport())
+
+
+def get_async_httpx_transport() -> Optional[CassetteTransport]:
+    cassette = get_cassette()
+    if cassette is None:
+        return None
+    return CassetteTransport(cassette, async_transport=httpx.AsyncHTTPTransport())
+
+
+def is_cassette_miss(error: BaseException) -> bool:
+    # the OpenAI SDK reports transport errors as APIConnectionError
+    return isinstance(error, CassetteMissError) or isinstance(error.__cause__, CassetteMissError)
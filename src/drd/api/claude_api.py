@@ -1,16 +1,38 @@
 import requests
 import os
 import json
+import contextvars
+import threading
+from contextlib import contextmanager
 from typing import Dict, Any, Optional, List
-from ..utils.parser import extract_and_parse_xml, parse_dravid_response
-from ..utils.file_utils import convert_to_base64
-from typing import Dict, Any, Optional, List, Generator
-import xml.etree.ElementTree as ET
+from ..utils.parser import extract_and_parse_xml, parse_dravid_response, ParsedResponse
+from ..utils.image_utils import prepare_images
+from .transport import get_session, async_post
+from .continuation import Continuation
+from .retry import call_with_retries, async_call_with_retries
+from .telemetry import record_call_usage, mark_first_token
+from .scheduler import observe_response
+from .sse import iter_response_events, StreamError
+from .routing import get_routed_model
+from .deadline import request_timeout
+from typing import Dict, Any, Optional, List, Generator, Sequence, Union
 import click
 
 API_URL = 'https://api.anthropic.com/v1/messages'
 MODEL = 'claude-3-5-sonnet-20240620'
 MAX_TOKENS = 8000
+CACHE_CONTROL = {'type': 'ephemeral'}
+
+_prompt_cache_prefix = contextvars.ContextVar(
+    'dravid_prompt_cache_prefix', default=None)
+prompt_cache_usage = {
+    'input_tokens': 0,
+    'cache_creation_input_tokens': 0,
+    'cache_read_input_tokens': 0,
+    'output_tokens': 0
+}
+# updated from hedging and read-ahead threads as well
+_usage_lock = threading.Lock()
 
 
 def get_api_key() -> str:
@@ -20,26 +42,95 @@ def get_api_key() -> str:
     return api_key
 
 
+def get_api_url() -> str:
+    return os.getenv('CLAUDE_API_URL') or API_URL
+
+
+def get_model() -> str:
+    return get_routed_model('claude') or MODEL
+
+
 def get_headers(api_key: str) -> Dict[str, str]:
     return {
         'x-api-key': api_key,
         'Content-Type': 'application/json',
-        "Anthropic-Beta": "max-tokens-3-5-sonnet-2024-07-15",
+        "Anthropic-Beta": "max-tokens-3-5-sonnet-2024-07-15,prompt-caching-2024-07-31",
         'Anthropic-Version': '2023-06-01'
     }
 
 
-def make_api_call(data: Dict[str, Any], headers: Dict[str, str], stream: bool = False) -> requests.Response:
-    response = requests.post(
-        API_URL, json=data, headers=headers, stream=stream)
+@contextmanager
+def prompt_cache_prefix(prefix: Optional[str]):
+    token = _prompt_cache_prefix.set(prefix or None)
+    try:
+        yield
+    finally:
+        _prompt_cache_prefix.reset(token)
+
+
+def build_system_prompt(instruction_prompt: Optional[str]) -> Any:
+    if not instruction_prompt:
+        return ""
+    return [{'type': 'text', 'text': instruction_prompt, 'cache_control': CACHE_CONTROL}]
+
+
+def build_user_content(query: str) -> Any:
+    prefix = _prompt_cache_prefix.get()
+    if not prefix:
+        return query
+    # the cached block may hold nothing but the shared prefix, or no later
+    # request would ever read it back
+    index = len(query) - len(query.lstrip())
+    if not query.startswith(prefix, index):
+        return query
+    split_at = index + len(prefix)
+    if split_at >= len(query):
+        return [{'type': 'text', 'text': query, 'cache_control': CACHE_CONTROL}]
+    return [
+        {'type': 'text', 'text': query[:split_at], 'cache_control': CACHE_CONTROL},
+        {'type': 'text', 'text': query[split_at:]}
+    ]
+
+
+def record_usage(usage: Optional[Dict[str, int]]):
+    if not usage:
+        return
+    record_call_usage(usage)
+    with _usage_lock:
+        for key in prompt_cache_usage:
+            prompt_cache_usage[key] += usage.get(key) or 0
+
+
+def get_prompt_cache_usage() -> Dict[str, int]:
+    with _usage_lock:
+        return dict(prompt_cache_usage)
+
+
+def send_request(data: Dict[str, Any], headers: Dict[str, str], stream: bool = False) -> requests.Response:
+    response = get_session().post(
+        get_api_url(), json=data, headers=headers, stream=stream, timeout=request_timeout(stream))
+    observe_response('claude', response.status_code, response.headers)
     response.raise_for_status()
     return response
 
 
+def observe_claude_response(status_code: int, headers: Any):
+    observe_response('claude', status_code, headers)
+
+
+def make_api_call(data: Dict[str, Any], headers: Dict[str, str], stream: bool = False) -> requests.Response:
+    return call_with_retries('claude', send_request, data, headers, stream)
+
+
+async def async_make_api_call(data: Dict[str, Any], headers: Dict[str, str]):
+    return await async_call_with_retries('claude', async_post, get_api_url(), json=data, headers=headers,
+                                         on_response=observe_claude_response)
+
+
 def parse_response(response: str) -> str:
     try:
-        root = extract_and_parse_xml(response)
-        return ET.tostring(root, encoding='unicode')
+        # callers read the tree from the response instead of parsing it again
+        return ParsedResponse(response, extract_and_parse_xml(response))
     except Exception as e:
         click.echo(f"Error parsing XML response: {e}", err=True)
         return response
@@ -48,103 +139,156 @@ def parse_response(response: str) -> str:
 def call_claude_api_with_pagination(query: str, include_context: bool = False, instruction_prompt: Optional[str] = None) -> str:
     api_key = get_api_key()
     headers = get_headers(api_key)
-    full_response = ""
 
     data = {
-        'model': MODEL,
-        'system': instruction_prompt or "",
-        'messages': [{'role': 'user', 'content': query}],
+        'model': get_model(),
+        'system': build_system_prompt(instruction_prompt),
+        'messages': [{'role': 'user', 'content': build_user_content(query)}],
         'max_tokens': MAX_TOKENS
     }
+    continuation = Continuation(data['messages'])
 
     while True:
         response = make_api_call(data, headers)
         resp = response.json()
-        full_response += resp['content'][0]['text']
-
-        if 'stop_reason' in resp and resp['stop_reason'] == 'max_tokens':
-            # If the response was truncated, continue the conversation
-            data['messages'].append(
-                {'role': 'assistant', 'content': full_response})
-            data['messages'].append(
-                {'role': 'user', 'content': 'Please continue.'})
-        else:
+        record_usage(resp.get('usage'))
+        continuation.add(resp['content'][0]['text'])
+
+        if not continuation.should_continue(resp.get('stop_reason') == 'max_tokens'):
             break
+        data['messages'] = continuation.next_messages()
 
-    return parse_response(full_response)
+    return parse_response(continuation.text)
 
 
-def call_claude_vision_api_with_pagination(query: str, image_path: str, include_context: bool = False, instruction_prompt: Optional[str] = None) -> str:
+async def async_call_claude_api_with_pagination(query: str, include_context: bool = False, instruction_prompt: Optional[str] = None) -> str:
     api_key = get_api_key()
     headers = get_headers(api_key)
 
-    mime_type, image_data = convert_to_base64(image_path)
+    data = {
+        'model': get_model(),
+        'system': build_system_prompt(instruction_prompt),
+        'messages': [{'role': 'user', 'content': build_user_content(query)}],
+        'max_tokens': MAX_TOKENS
+    }
+    continuation = Continuation(data['messages'])
+
+    while True:
+        response = await async_make_api_call(data, headers)
+        resp = response.json()
+        record_usage(resp.get('usage'))
+        continuation.add(resp['content'][0]['text'])
+
+        if not continuation.should_continue(resp.get('stop_reason') == 'max_tokens'):
+            break
+        data['messages'] = continuation.next_messages()
+
+    return parse_response(continuation.text)
+
+
+def build_vision_content(query: str, image_path: Union[str, Sequence[str]]) -> List[Dict[str, Any]]:
+    content = [
+        {
+            'type': 'image',
+            'source': {
+                'type': 'base64',
+                'media_type': image.mime_type,
+                'data': image.data
+            }
+        }
+        for image in prepare_images(image_path)
+    ]
+    content.append({
+        'type': 'text',
+        'text': query
+    })
+    return content
+
+
+def call_claude_vision_api_with_pagination(query: str, image_path: Union[str, Sequence[str]], include_context: bool = False, instruction_prompt: Optional[str] = None) -> str:
+    api_key = get_api_key()
+    headers = get_headers(api_key)
 
-    full_response = ""
     data = {
-        'model': MODEL,
-        'system': instruction_prompt or "",
+        'model': get_model(),
+        'system': build_system_prompt(instruction_prompt),
         'messages': [
             {
                 'role': 'user',
-                'content': [
-                    {
-                        'type': 'image',
-                        'source': {
-                            'type': 'base64',
-                            'media_type': mime_type,
-                            'data': image_data
-                        }
-                    },
-                    {
-                        'type': 'text',
-                        'text': query
-                    }
-                ]
+                'content': build_vision_content(query, image_path)
             }
         ],
         'max_tokens': MAX_TOKENS
     }
+    continuation = Continuation(data['messages'])
 
     while True:
         response = make_api_call(data, headers)
         resp = response.json()
-        full_response += resp['content'][0]['text']
-
-        if 'stop_reason' in resp and resp['stop_reason'] == 'max_tokens':
-            # If the response was truncated, continue the conversation
-            data['messages'].append(
-                {'role': 'assistant', 'content': full_response})
-            data['messages'].append(
-                {'role': 'user', 'content': 'Please continue.'})
-        else:
+        record_usage(resp.get('usage'))
+        continuation.add(resp['content'][0]['text'])
+
+        if not continuation.should_continue(resp.get('stop_reason') == 'max_tokens'):
             break
+        data['messages'] = continuation.next_messages()
 
-    return parse_response(full_response)
+    return parse_response(continuation.text)
 
 
-def stream_claude_response(query: str, instruction_prompt: Optional[str] = None) -> Generator[str, None, None]:
+def iter_stream_text(response, stop: Dict[str, Any]) -> Generator[str, None, None]:
+    first_token = True
+    for _, payload in iter_response_events(response):
+        event_type = payload.get('type')
+        if event_type == 'content_block_delta':
+            text = payload['delta'].get('text')
+            if text:
+                if first_token:
+                    mark_first_token()
+                    first_token = False
+                yield text
+        elif event_type == 'message_start':
+            # output tokens are reported cumulatively by message_delta
+            usage = payload['message'].get('usage') or {}
+            record_usage(
+                {k: v for k, v in usage.items() if k != 'output_tokens'})
+        elif event_type == 'message_delta':
+            record_usage(payload.get('usage'))
+            stop['reason'] = payload.get('delta', {}).get('stop_reason')
+        elif event_type == 'error':
+            error = payload.get('error') or {}
+            raise StreamError(error.get('type', 'error'),
+                              error.get('message', ''))
+        elif event_type == 'message_stop':
+            break
+
+
+def stream_claude_content(content: Any, instruction_prompt: Optional[str] = None) -> Generator[str, None, None]:
     api_key = get_api_key()
     headers = get_headers(api_key)
     headers['Accept'] = 'text/event-stream'
 
     data = {
-        'model': MODEL,
-        'system': instruction_prompt or "",
-        'messages': [{'role': 'user', 'content': query}],
+        'model': get_model(),
+        'system': build_system_prompt(instruction_prompt),
+        'messages': [{'role': 'user', 'content': content}],
         'max_tokens': MAX_TOKENS,
         'stream': True
     }
+    continuation = Continuation(data['messages'])
+
+    while True:
+        response = make_api_call(data, headers, stream=True)
+        stop = {}
+        yield from continuation.stream(iter_stream_text(response, stop))
+
+        if not continuation.should_continue(stop.get('reason') == 'max_tokens'):
+            break
+        data['messages'] = continuation.next_messages()
+
+
+def stream_claude_response(query: str, instruction_prompt: Optional[str] = None) -> Generator[str, None, None]:
+    yield from stream_claude_content(build_user_content(query), instruction_prompt)
+
 
-    response = make_api_call(data, headers, stream=True)
-
-    for line in response.iter_lines():
-        if line:
-            line = line.decode('utf-8')
-            if line.startswith('data: '):
-                data = json.loads(line[6:])
-                if data['type'] == 'content_block_delta':
-                    chunk = data['delta']['text']
-                    yield chunk
-                elif data['type'] == 'message_stop':
-                    break
+def stream_claude_vision_response(query: str, image_path: Union[str, Sequence[str]], instruction_prompt: Optional[str] = None) -> Generator[str, None, None]:
+    yield from stream_claude_content(build_vision_content(query, image_path), instruction_prompt)
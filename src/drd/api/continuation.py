@@ -0,0 +1,107 @@
+from typing import Any, Dict, Iterable, Iterator, List
+from .telemetry import count_continuation
+
+MAX_CONTINUATIONS = 10
+PREFILL_TAIL_CHARS = 2000
+MAX_OVERLAP_CHARS = 500
+MIN_OVERLAP_CHARS = 16
+CONTINUE_PROMPT = (
+    "Your previous message was cut off. Continue exactly where it stopped, "
+    "without repeating any text that was already written."
+)
+
+
+def tail_segment(text: str, size: int = PREFILL_TAIL_CHARS) -> str:
+    # Anthropic rejects an assistant prefill that ends in whitespace
+    return text[-size:].rstrip()
+
+
+def find_overlap(previous: str, continuation: str, max_overlap: int = MAX_OVERLAP_CHARS) -> int:
+    # Length of the longest prefix of `continuation` that is also a suffix of
+    # `previous`, using the KMP failure function over head + sentinel + tail.
+    head = continuation[:max_overlap]
+    combined = head + '\x00' + previous[-max_overlap:]
+    failure = [0] * len(combined)
+    for i in range(1, len(combined)):
+        k = failure[i - 1]
+        while k and combined[i] != combined[k]:
+            k = failure[k - 1]
+        if combined[i] == combined[k]:
+            k += 1
+        failure[i] = k
+    return failure[-1]
+
+
+class Continuation:
+    def __init__(self, messages: List[Dict[str, Any]], prefill: bool = True):
+        self.base_messages = list(messages)
+        self.prefill = prefill
+        self.count = 0
+        self.text = ""
+
+    def trim(self, segment: str) -> str:
+        if not self.count:
+            return segment
+        if self.prefill:
+            # The model picks up exactly where the prefill ends, so nothing is
+            # repeated; text that merely looks like the previous tail (rows of
+            # a fixture, say) is new output. Only the prefill's trailing
+            # whitespace, which had to be left out, is usually written again.
+            whitespace = self.text[len(self.text.rstrip()):]
+            if whitespace and segment.startswith(whitespace):
+                segment = segment[len(whitespace):]
+            return segment
+        overlap = find_overlap(self.text, segment)
+        if overlap >= MIN_OVERLAP_CHARS:
+            segment = segment[overlap:]
+        return segment
+
+    def head_chars(self) -> int:
+        # how much of a continuation trim() needs to see
+        if self.prefill:
+            return len(self.text) - len(self.text.rstrip())
+        return MAX_OVERLAP_CHARS
+
+    def add(self, segment: str) -> str:
+        segment = self.trim(segment)
+        self.text += segment
+        return segment
+
+    def stream(self, chunks: Iterable[str]) -> Iterator[str]:
+        if not self.count:
+            for chunk in chunks:
+                self.text += chunk
+                yield chunk
+            return
+
+        # Hold back the start of a continuation until there is enough of it
+        # to decide how much overlaps with what was already streamed.
+        head = ""
+        head_chars = self.head_chars()
+        for chunk in chunks:
+            if head is None:
+                self.text += chunk
+                yield chunk
+                continue
+            head += chunk
+            if len(head) >= head_chars:
+                head = self.add(head)
+                if head:
+                    yield head
+                head = None
+        if head:
+            head = self.add(head)
+            if head:
+                yield head
+
+    def should_continue(self, truncated: bool) -> bool:
+        return truncated and self.count < MAX_CONTINUATIONS
+
+    def next_messages(self) -> List[Dict[str, Any]]:
+        self.count += 1
+        count_continuation()
+        messages = self.base_messages + \
+            [{'role': 'assistant', 'content': tail_segment(self.text)}]
+        if not self.prefill:
+            messages.append({'role': 'user', 'content': CONTINUE_PROMPT})
+        return messages
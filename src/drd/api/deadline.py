@@ -0,0 +1,140 @@
+import os
+import time
+import asyncio
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Awaitable, Iterator, Optional, Tuple
+import httpx
+
+DO = 'do'
+FIX = 'fix'
+META_INIT = 'meta_init'
+
+# seconds each top-level operation may take, LLM calls and retries included
+DEFAULT_BUDGETS = {
+    DO: 900.0,
+    FIX: 300.0,
+    META_INIT: 3600.0,
+}
+DEFAULT_CONNECT_TIMEOUT = 10.0
+# a non-streamed response only arrives once the whole answer is generated
+DEFAULT_READ_TIMEOUT = 300.0
+# longest silence tolerated between two chunks of a stream
+DEFAULT_STREAM_IDLE_TIMEOUT = 60.0
+
+_current_deadline = contextvars.ContextVar('dravid_deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    def __init__(self, operation: str, budget: float):
+        super().__init__(f"'{operation}' did not finish within its time budget of {budget:g}s")
+        self.operation = operation
+        self.budget = budget
+
+
+class Deadline:
+    def __init__(self, operation: str, budget: float):
+        self.operation = operation
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def check(self):
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(self.operation, self.budget)
+
+
+def _get_seconds(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def get_budget(operation: str) -> Optional[float]:
+    # 0 turns the deadline off
+    budget = _get_seconds(f'DRAVID_DEADLINE_{operation.upper()}', DEFAULT_BUDGETS.get(operation, 0))
+    return budget if budget > 0 else None
+
+
+def get_connect_timeout() -> float:
+    return _get_seconds('DRAVID_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT)
+
+
+def get_read_timeout() -> float:
+    return _get_seconds('DRAVID_READ_TIMEOUT', DEFAULT_READ_TIMEOUT)
+
+
+def get_stream_idle_timeout() -> float:
+    return _get_seconds('DRAVID_STREAM_IDLE_TIMEOUT', DEFAULT_STREAM_IDLE_TIMEOUT)
+
+
+@contextmanager
+def deadline_scope(operation: str, budget: Optional[float] = None):
+    budget = budget or get_budget(operation)
+    deadline = Deadline(operation, budget) if budget else None
+    current = _current_deadline.get()
+    # an operation started inside another one cannot outlive it
+    if current is not None and (deadline is None or current.expires_at <= deadline.expires_at):
+        deadline = current
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def get_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def remaining_time() -> Optional[float]:
+    deadline = _current_deadline.get()
+    return None if deadline is None else deadline.remaining()
+
+
+def check_deadline():
+    deadline = _current_deadline.get()
+    if deadline is not None:
+        deadline.check()
+
+
+def bound_wait(wait: Optional[float]) -> Optional[float]:
+    # clamps a wait to what is left of the budget, which must not be used up
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return wait
+    deadline.check()
+    return deadline.remaining() if wait is None else min(wait, deadline.remaining())
+
+
+def request_timeout(stream: bool = False) -> Tuple[float, float]:
+    # (connect, read) as requests takes it; for a stream the read timeout
+    # applies between chunks
+    read = get_stream_idle_timeout() if stream else get_read_timeout()
+    return bound_wait(get_connect_timeout()), bound_wait(read)
+
+
+def httpx_timeout(stream: bool = False) -> httpx.Timeout:
+    connect, read = request_timeout(stream)
+    return httpx.Timeout(read, connect=connect)
+
+
+def guard_stream(chunks: Iterator[Any]) -> Iterator[Any]:
+    # read timeouts only bound the gaps between chunks, not the whole stream
+    for chunk in chunks:
+        check_deadline()
+        yield chunk
+
+
+async def wait_with_deadline(awaitable: Awaitable[Any]) -> Any:
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return await awaitable
+    try:
+        # a zero timeout still cancels the awaitable cleanly
+        return await asyncio.wait_for(awaitable, deadline.remaining())
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(deadline.operation, deadline.budget) from None
@@ -0,0 +1,212 @@
+import os
+import time
+import queue
+import threading
+import contextvars
+from collections import defaultdict, deque
+from typing import Callable, Iterable, Iterator, Optional
+from .routing import Route, route_scope, parse_route, is_provider
+from .transport import CancelScope, cancel_scope
+
+DEFAULT_HEDGE_PERCENTILE = 95
+DEFAULT_HEDGE_DEADLINE = 5.0
+MIN_TTFT_SAMPLES = 20
+TTFT_SAMPLES = 200
+# the first thing a valid XML answer writes; a refusal or an error message
+# never contains it
+RESPONSE_MARKER = '<response'
+
+CHUNK = 'chunk'
+DONE = 'done'
+ERROR = 'error'
+
+_ttft_samples = defaultdict(lambda: deque(maxlen=TTFT_SAMPLES))
+_ttft_lock = threading.Lock()
+hedge_stats = defaultdict(int)
+
+
+def get_hedge_route() -> Optional[Route]:
+    value = os.getenv('DRAVID_HEDGE_PROVIDER', '').strip()
+    if not value:
+        return None
+    if is_provider(value):
+        return Route(value.lower())
+    return parse_route(value)
+
+
+def get_hedge_percentile() -> float:
+    try:
+        return min(100.0, max(0.0, float(os.getenv('DRAVID_HEDGE_PERCENTILE', DEFAULT_HEDGE_PERCENTILE))))
+    except ValueError:
+        return DEFAULT_HEDGE_PERCENTILE
+
+
+def get_default_deadline() -> float:
+    try:
+        return float(os.getenv('DRAVID_HEDGE_DEADLINE', DEFAULT_HEDGE_DEADLINE))
+    except ValueError:
+        return DEFAULT_HEDGE_DEADLINE
+
+
+def record_ttft(provider: str, ttft: float):
+    with _ttft_lock:
+        _ttft_samples[provider].append(ttft)
+
+
+def get_hedge_deadline(provider: str) -> float:
+    # Fire the backup once the primary is slower than it usually is; until
+    # enough first tokens have been seen, fall back to a fixed deadline.
+    with _ttft_lock:
+        samples = sorted(_ttft_samples[provider])
+    if len(samples) < MIN_TTFT_SAMPLES:
+        return get_default_deadline()
+    index = int(len(samples) * get_hedge_percentile() / 100)
+    return samples[min(index, len(samples) - 1)]
+
+
+def reset_hedging():
+    with _ttft_lock:
+        _ttft_samples.clear()
+    hedge_stats.clear()
+
+
+def get_hedge_stats():
+    return dict(hedge_stats)
+
+
+class Attempt:
+    def __init__(self, name: str, open_stream: Callable[[], Iterable[str]], events: queue.Queue,
+                 route: Optional[Route] = None):
+        self.name = name
+        self.open_stream = open_stream
+        self.events = events
+        self.route = route
+        self.chunks = []
+        self.text = ''
+        self.started = time.perf_counter()
+        self.finished = False
+        self.error = None
+        self.cancelled = threading.Event()
+        # aborts the attempt's HTTP request, even before its first byte
+        self.scope = CancelScope()
+        # the attempt keeps the caller's phase, telemetry and cache context
+        context = contextvars.copy_context()
+        self.thread = threading.Thread(
+            target=context.run, args=(self._run,), daemon=True)
+
+    @property
+    def running(self) -> bool:
+        return not self.finished and self.error is None
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.cancelled.set()
+        self.scope.cancel()
+
+    def _run(self):
+        stream = None
+        try:
+            with cancel_scope(self.scope):
+                if self.route is not None:
+                    with route_scope(self.route):
+                        stream = self.open_stream()
+                        self._pump(stream)
+                else:
+                    stream = self.open_stream()
+                    self._pump(stream)
+            self.events.put((self, DONE, None))
+        except Exception as e:
+            self.events.put((self, ERROR, e))
+        finally:
+            close = getattr(stream, 'close', None)
+            if close is not None:
+                # releases the loser's scheduler slot and HTTP response
+                close()
+
+    def _pump(self, stream: Iterable[str]):
+        for chunk in stream:
+            if self.cancelled.is_set():
+                return
+            self.events.put((self, CHUNK, chunk))
+
+
+def hedged_stream(open_stream: Callable[[], Iterable[str]], provider: str,
+                  backup_route: Optional[Route] = None, marker: Optional[str] = RESPONSE_MARKER) -> Iterator[str]:
+    # The backup is sent only while the primary has produced no token; the
+    # first attempt whose output contains `marker` (or, without one, any
+    # non-blank output) wins and the other is cancelled.
+    backup_route = backup_route or get_hedge_route()
+    if backup_route is None:
+        yield from open_stream()
+        return
+
+    def is_valid(text):
+        return marker in text if marker else bool(text.strip())
+
+    events = queue.Queue()
+    primary = Attempt('primary', open_stream, events).start()
+    attempts = [primary]
+    deadline = primary.started + get_hedge_deadline(provider)
+    winner = None
+
+    def start_backup(reason):
+        hedge_stats[reason] += 1
+        attempts.append(
+            Attempt('backup', open_stream, events, backup_route).start())
+
+    try:
+        while winner is None:
+            waiting_for_deadline = len(attempts) == 1 and primary.running and not primary.text.strip()
+            timeout = max(0.0, deadline - time.perf_counter()
+                          ) if waiting_for_deadline else None
+            try:
+                attempt, kind, value = events.get(timeout=timeout)
+            except queue.Empty:
+                start_backup('hedged')
+                continue
+
+            if kind == CHUNK:
+                if attempt is primary and not primary.chunks:
+                    record_ttft(provider, time.perf_counter() -
+                                primary.started)
+                attempt.chunks.append(value)
+                attempt.text += value
+                if is_valid(attempt.text):
+                    winner = attempt
+            elif kind == DONE:
+                attempt.finished = True
+                if is_valid(attempt.text) or not any(a.running for a in attempts):
+                    winner = attempt
+            else:
+                attempt.error = value
+                if len(attempts) == 1:
+                    start_backup('failover')
+                elif not any(a.running for a in attempts):
+                    finished = [a for a in attempts if a.finished]
+                    if not finished:
+                        raise primary.error
+                    winner = finished[0]
+
+        for attempt in attempts:
+            if attempt is not winner:
+                attempt.cancel()
+        if winner is not primary:
+            hedge_stats['backup_wins'] += 1
+
+        yield from winner.chunks
+        while not winner.finished:
+            attempt, kind, value = events.get()
+            if attempt is not winner:
+                continue
+            if kind == CHUNK:
+                yield value
+            elif kind == DONE:
+                winner.finished = True
+            else:
+                raise value
+    finally:
+        for attempt in attempts:
+            attempt.cancel()
@@ -1,72 +1,359 @@
 import os
+import queue
+import threading
+import contextvars
 import click
-from .claude_api import call_claude_api_with_pagination, call_claude_vision_api_with_pagination, stream_claude_response
-from .openai_api import call_api_with_pagination, call_vision_api_with_pagination, stream_response
+from contextlib import contextmanager, asynccontextmanager
+from .providers import get_provider
+from .routing import get_routed_provider
+from .hedging import hedged_stream
+from .cache import get_response_cache, make_cache_key, replay_chunks
+from .telemetry import track_call, mark_cache_hit, mark_first_token, record_output, record_queue_wait, estimate_tokens
+from .scheduler import get_scheduler
+from .singleflight import single_flight, is_single_flight_enabled
+from .phases import get_lane
+from .deadline import guard_stream
 from ..utils import print_debug, print_info
 from ..utils.loader import Loader
 from ..utils.pretty_print_stream import pretty_print_xml_stream
-from ..utils.parser import parse_dravid_response
+from ..utils.parser import parse_dravid_response, ParsedResponse
+from ..utils.stream_parser import StreamParser
+from ..utils.spool import get_spool_threshold
 import xml.etree.ElementTree as ET
 
 
 def get_api_functions():
-    llm_type = os.getenv('DRAVID_LLM', 'claude').lower()
-    if llm_type == 'claude':
-        return call_claude_api_with_pagination, call_claude_vision_api_with_pagination, stream_claude_response
-    elif llm_type in ['openai', 'azure', 'custom', 'ollama']:
-        return call_api_with_pagination, call_vision_api_with_pagination, stream_response
-    else:
-        raise ValueError(f"Unsupported LLM type: {llm_type}")
+    provider = get_provider(get_provider_name())
+    return provider.call_api, provider.call_vision_api, provider.stream_response
+
+
+def get_async_api_function():
+    provider = get_provider(get_provider_name())
+    if provider.async_call_api is None:
+        raise ValueError(f"Async calls are not supported for LLM type: {provider.name}")
+    return provider.async_call_api
+
+
+def get_vision_stream_function():
+    provider = get_provider(get_provider_name())
+    if provider.stream_vision_response is not None:
+        return provider.stream_vision_response
+    call_vision_api = provider.call_vision_api
+
+    # providers without streaming vision still answer, just in one piece
+    def stream_vision_response(query, image_path, instruction_prompt=None):
+        yield call_vision_api(query, image_path, False, instruction_prompt)
+    return stream_vision_response
+
+
+def get_provider_name():
+    return get_routed_provider(os.getenv('DRAVID_LLM', 'claude').lower())
+
+
+def get_model_name():
+    provider = get_provider(get_provider_name())
+    if provider.get_model is None:
+        return None
+    return provider.get_model()
+
+
+def warm_up_provider():
+    # lets a local model load while the CLI is still building the prompt;
+    # an unknown provider is reported by the first real call
+    try:
+        provider = get_provider(get_provider_name())
+    except ValueError:
+        return None
+    if provider.warm_up is not None:
+        return provider.warm_up()
+    return None
+
+
+def track_dravid_call(kind, query, instruction_prompt):
+    try:
+        model = get_model_name()
+    except ValueError:
+        model = None
+    return track_call(get_provider_name(), model, kind, query, instruction_prompt)
+
+
+def get_request_cache_key(query, instruction_prompt, stream=False):
+    return make_cache_key(
+        get_provider_name(),
+        get_model_name(),
+        instruction_prompt,
+        [{'role': 'user', 'content': query}],
+        stream=stream
+    )
+
+
+def get_flight_key(query, instruction_prompt, stream=False):
+    if not is_single_flight_enabled():
+        return None
+    try:
+        return get_request_cache_key(query, instruction_prompt, stream=stream)
+    except ValueError:
+        return None
+
+
+def estimate_request_tokens(query, instruction_prompt):
+    return estimate_tokens(len(query) + len(instruction_prompt or ''))
+
+
+@contextmanager
+def scheduled_call(query, instruction_prompt):
+    lane = get_lane()
+    scheduler = get_scheduler(get_provider_name())
+    with scheduler.slot(estimate_request_tokens(query, instruction_prompt), lane=lane) as ticket:
+        record_queue_wait(lane, ticket.wait)
+        yield
+
+
+@asynccontextmanager
+async def async_scheduled_call(query, instruction_prompt):
+    lane = get_lane()
+    scheduler = get_scheduler(get_provider_name())
+    async with scheduler.async_slot(estimate_request_tokens(query, instruction_prompt), lane=lane) as ticket:
+        record_queue_wait(lane, ticket.wait)
+        yield
+
+
+def call_with_cache(call_api, query, include_context=False, instruction_prompt=None):
+    with track_dravid_call('call', query, instruction_prompt):
+        cache = get_response_cache()
+        if cache is not None:
+            key = get_request_cache_key(query, instruction_prompt)
+            cached = cache.get(key)
+            if cached is not None:
+                mark_cache_hit()
+                return ParsedResponse(cached)
+
+        def call():
+            with scheduled_call(query, instruction_prompt):
+                return call_api(query, include_context, instruction_prompt)
+
+        response = single_flight.do(
+            get_flight_key(query, instruction_prompt), call)
+        record_output(response)
+        if cache is not None:
+            cache.set(key, response)
+        return response
+
+
+async def async_call_with_cache(call_api, query, include_context=False, instruction_prompt=None):
+    with track_dravid_call('async', query, instruction_prompt):
+        cache = get_response_cache()
+        if cache is not None:
+            key = get_request_cache_key(query, instruction_prompt)
+            cached = cache.get(key)
+            if cached is not None:
+                mark_cache_hit()
+                return ParsedResponse(cached)
+
+        async def call():
+            async with async_scheduled_call(query, instruction_prompt):
+                return await call_api(query, include_context, instruction_prompt)
+
+        response = await single_flight.async_do(
+            get_flight_key(query, instruction_prompt), call)
+        record_output(response)
+        if cache is not None:
+            cache.set(key, response)
+        return response
+
+
+def track_chunks(chunks):
+    for chunk in guard_stream(chunks):
+        mark_first_token()
+        record_output(chunk)
+        yield chunk
 
 
-def stream_dravid_api(query, include_context=False, instruction_prompt=None, print_chunk=False):
-    _, _, stream_response = get_api_functions()
+def stream_with_cache(stream_response, query, instruction_prompt=None):
+    with track_dravid_call('stream', query, instruction_prompt):
+        cache = get_response_cache()
+        if cache is not None:
+            key = get_request_cache_key(query, instruction_prompt, stream=True)
+            cached = cache.get(key)
+            if cached is not None:
+                mark_cache_hit()
+                yield from track_chunks(replay_chunks(cached))
+                return
 
+        def scheduled_stream():
+            with scheduled_call(query, instruction_prompt):
+                yield from stream_response(query, instruction_prompt)
+
+        chunks = []
+        flight = single_flight.stream(
+            get_flight_key(query, instruction_prompt, stream=True), scheduled_stream,
+            replay_limit=get_spool_threshold())
+        for chunk in track_chunks(flight):
+            if cache is not None:
+                chunks.append(chunk)
+            yield chunk
+        if cache is not None:
+            cache.set(key, ''.join(chunks))
+
+
+def render_stream(open_stream, print_chunk=False, parser=None):
     if print_chunk:
         print_info("DRAVID: ")
-        for chunk in stream_response(query, instruction_prompt):
+        for chunk in hedged_stream(open_stream, get_provider_name(), marker=None):
             click.echo(chunk, nl=False)
         return None
     else:
-        xml_buffer = ""
+        chunks = []
         loader = Loader("Gathering responses from API...")
         state = {
             'buffer': '',
             'in_step': False,
         }
         try:
-            for chunk in stream_response(query, instruction_prompt):
-                if print_chunk:
-                    click.echo(chunk, nl=False)
+            for chunk in hedged_stream(open_stream, get_provider_name()):
+                pretty_print_xml_stream(chunk, state)
+                # with a parser the commands come from it, the text is not kept
+                if parser is not None:
+                    parser.feed(chunk)
                 else:
-                    pretty_print_xml_stream(chunk, state)
-                xml_buffer += chunk
+                    chunks.append(chunk)
         finally:
             loader.stop()
-        return xml_buffer
+        return None if parser is not None else ''.join(chunks)
+
+
+def read_ahead(open_chunks):
+    # Drains the stream on its own thread, so the response keeps arriving
+    # while the consumer is busy, e.g. running the steps received so far.
+    events = queue.Queue()
+    cancelled = threading.Event()
+
+    def pump():
+        chunks = None
+        try:
+            chunks = open_chunks()
+            for chunk in chunks:
+                if cancelled.is_set():
+                    return
+                events.put(('chunk', chunk))
+            events.put(('done', None))
+        except Exception as e:
+            events.put(('error', e))
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+
+    # the stream keeps the caller's phase, deadline and telemetry context
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(pump,), daemon=True).start()
+
+    def read():
+        try:
+            while True:
+                kind, value = events.get()
+                if kind == 'chunk':
+                    yield value
+                elif kind == 'done':
+                    return
+                else:
+                    raise value
+        finally:
+            cancelled.set()
+    return read()
+
+
+def render_commands(open_stream, parser=None):
+    parser = parser or StreamParser()
+    chunks = read_ahead(lambda: hedged_stream(open_stream, get_provider_name()))
+
+    def render():
+        state = {
+            'buffer': '',
+            'in_step': False,
+        }
+        try:
+            for chunk in chunks:
+                pretty_print_xml_stream(chunk, state)
+                yield from parser.feed(chunk)
+        finally:
+            chunks.close()
+        received = len(parser.received)
+        parser.close()
+        yield from parser.received[received:]
+    return render()
+
+
+def stream_dravid_api(query, include_context=False, instruction_prompt=None, print_chunk=False, parser=None):
+    def open_stream():
+        # resolved per attempt, so a hedged backup gets its own provider
+        _, _, stream_response = get_api_functions()
+        return stream_with_cache(stream_response, query, instruction_prompt)
+
+    return render_stream(open_stream, print_chunk, parser)
+
+
+def stream_dravid_commands(query, include_context=False, instruction_prompt=None, parser=None):
+    # yields each step as soon as it is complete; the request is sent
+    # right away, not on the first iteration
+    def open_stream():
+        _, _, stream_response = get_api_functions()
+        return stream_with_cache(stream_response, query, instruction_prompt)
+
+    return render_commands(open_stream, parser)
+
+
+def stream_vision(stream_vision_response, query, image_path, instruction_prompt=None):
+    with track_dravid_call('vision', query, instruction_prompt), scheduled_call(query, instruction_prompt):
+        yield from track_chunks(stream_vision_response(query, image_path, instruction_prompt))
+
+
+def stream_dravid_vision_api(query, image_path, include_context=False, instruction_prompt=None, print_chunk=False, parser=None):
+    def open_stream():
+        return stream_vision(get_vision_stream_function(), query, image_path, instruction_prompt)
+
+    return render_stream(open_stream, print_chunk, parser)
+
+
+def stream_dravid_vision_commands(query, image_path, include_context=False, instruction_prompt=None, parser=None):
+    def open_stream():
+        return stream_vision(get_vision_stream_function(), query, image_path, instruction_prompt)
+
+    return render_commands(open_stream, parser)
 
 
 def call_dravid_api(query, include_context=False, instruction_prompt=None):
     call_api, _, _ = get_api_functions()
-    response = call_api(query, include_context, instruction_prompt)
+    response = call_with_cache(
+        call_api, query, include_context, instruction_prompt)
     return parse_dravid_response(response)
 
 
 def call_dravid_vision_api(query, image_path, include_context=False, instruction_prompt=None):
     _, call_vision_api, _ = get_api_functions()
-    response = call_vision_api(
-        query, image_path, include_context, instruction_prompt)
+    with track_dravid_call('vision', query, instruction_prompt), scheduled_call(query, instruction_prompt):
+        response = call_vision_api(
+            query, image_path, include_context, instruction_prompt)
+        record_output(response)
     return parse_dravid_response(response)
 
 
 def call_dravid_api_with_pagination(query, include_context=False, instruction_prompt=None):
     call_api, _, _ = get_api_functions()
-    response = call_api(query, include_context, instruction_prompt)
+    response = call_with_cache(
+        call_api, query, include_context, instruction_prompt)
     return response
 
 
 def call_dravid_vision_api_with_pagination(query, image_path, include_context=False, instruction_prompt=None):
     _, call_vision_api, _ = get_api_functions()
-    response = call_vision_api(
-        query, image_path, include_context, instruction_prompt)
+    with track_dravid_call('vision', query, instruction_prompt), scheduled_call(query, instruction_prompt):
+        response = call_vision_api(
+            query, image_path, include_context, instruction_prompt)
+        record_output(response)
     return response
+
+
+async def async_call_dravid_api_with_pagination(query, include_context=False, instruction_prompt=None):
+    call_api = get_async_api_function()
+    return await async_call_with_cache(call_api, query, include_context, instruction_prompt)
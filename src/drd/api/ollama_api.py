@@ -1,8 +1,22 @@
-import requests
-from typing import Dict, Any, Generator, Optional
+import os
 import json
+import threading
+import requests
+from typing import Dict, Any, Generator, List, Optional
+from .transport import get_session, async_post
+from .continuation import Continuation
+from .retry import call_with_retries, async_call_with_retries
+from .telemetry import record_call_usage, record_server_timings, estimate_tokens
+from .scheduler import observe_response
+from .cassette import CassetteMissError
+from .deadline import request_timeout
 
 OLLAMA_ENDPOINT = "http://localhost:11434/api"
+DEFAULT_KEEP_ALIVE = "30m"
+NUM_PREDICT = 4096
+MIN_NUM_CTX = 8192
+DEFAULT_MAX_NUM_CTX = 32768
+NANOSECONDS = 1e9
 
 
 def get_ollama_client():
@@ -11,40 +25,174 @@ def get_ollama_client():
     return None
 
 
-def call_ollama_api(model: str, prompt: str, system_prompt: str = "") -> str:
-    data = {
-        "model": model,
-        "prompt": prompt,
-        "system": system_prompt,
-        "stream": False
-    }
-    response = requests.post(f"{OLLAMA_ENDPOINT}/generate", json=data)
-    response.raise_for_status()
-    return response.json()["response"]
+def get_ollama_endpoint() -> str:
+    # OLLAMA_HOST is what the ollama CLI itself uses, e.g. "127.0.0.1:11434"
+    host = os.getenv('OLLAMA_HOST')
+    if not host:
+        return OLLAMA_ENDPOINT
+    if '://' not in host:
+        host = f"http://{host}"
+    return f"{host.rstrip('/')}/api"
 
 
-def stream_ollama_response(model: str, prompt: str, system_prompt: str = "") -> Generator[str, None, None]:
-    data = {
+def get_keep_alive() -> str:
+    return os.getenv('DRAVID_OLLAMA_KEEP_ALIVE', DEFAULT_KEEP_ALIVE)
+
+
+def get_max_num_ctx() -> int:
+    try:
+        return max(MIN_NUM_CTX, int(os.getenv('DRAVID_OLLAMA_MAX_CTX', DEFAULT_MAX_NUM_CTX)))
+    except ValueError:
+        return DEFAULT_MAX_NUM_CTX
+
+
+def get_num_ctx(messages: List[Dict[str, Any]]) -> int:
+    # Ollama's default 2048-token window silently drops the start of longer
+    # prompts, and every new num_ctx value reloads the model, so the window
+    # grows in powers of two from a floor that covers most prompts.
+    needed = estimate_tokens(sum(len(m['content']) for m in messages)) + NUM_PREDICT
+    num_ctx = MIN_NUM_CTX
+    while num_ctx < needed:
+        num_ctx *= 2
+    return min(num_ctx, get_max_num_ctx())
+
+
+def build_chat_request(model: str, messages: List[Dict[str, Any]], stream: bool = False) -> Dict[str, Any]:
+    return {
         "model": model,
-        "prompt": prompt,
-        "system": system_prompt,
-        "stream": True
+        "messages": messages,
+        "stream": stream,
+        "keep_alive": get_keep_alive(),
+        "options": {"num_ctx": get_num_ctx(messages), "num_predict": NUM_PREDICT}
     }
-    response = requests.post(
-        f"{OLLAMA_ENDPOINT}/generate", json=data, stream=True)
+
+
+def build_messages(prompt: str, system_prompt: str = "") -> List[Dict[str, Any]]:
+    messages = [{"role": "user", "content": prompt}]
+    if system_prompt:
+        messages.insert(0, {"role": "system", "content": system_prompt})
+    return messages
+
+
+def post_request(url: str, **kwargs) -> requests.Response:
+    response = get_session().post(url, timeout=request_timeout(kwargs.get('stream', False)), **kwargs)
+    observe_response('ollama', response.status_code, response.headers)
     response.raise_for_status()
+    return response
+
+
+def observe_ollama_response(status_code: int, headers: Any):
+    observe_response('ollama', status_code, headers)
+
+
+def record_ollama_result(result: Dict[str, Any]):
+    record_call_usage(result)
+    record_server_timings(
+        load=(result.get("load_duration") or 0) / NANOSECONDS,
+        prompt_eval=(result.get("prompt_eval_duration") or 0) / NANOSECONDS,
+        eval=(result.get("eval_duration") or 0) / NANOSECONDS
+    )
+
+
+def is_truncated(result: Dict[str, Any]) -> bool:
+    return result.get("done_reason") == "length"
 
+
+def call_ollama_api(model: str, prompt: str, system_prompt: str = "") -> str:
+    continuation = Continuation(build_messages(prompt, system_prompt), prefill=False)
+    messages = continuation.base_messages
+
+    while True:
+        response = call_with_retries(
+            'ollama', post_request, f"{get_ollama_endpoint()}/chat", json=build_chat_request(model, messages))
+        result = response.json()
+        record_ollama_result(result)
+        continuation.add(result["message"]["content"])
+
+        if not continuation.should_continue(is_truncated(result)):
+            break
+        messages = continuation.next_messages()
+
+    return continuation.text
+
+
+async def async_call_ollama_api(model: str, prompt: str, system_prompt: str = "") -> str:
+    continuation = Continuation(build_messages(prompt, system_prompt), prefill=False)
+    messages = continuation.base_messages
+
+    while True:
+        response = await async_call_with_retries(
+            'ollama', async_post, f"{get_ollama_endpoint()}/chat", json=build_chat_request(model, messages),
+            on_response=observe_ollama_response)
+        result = response.json()
+        record_ollama_result(result)
+        continuation.add(result["message"]["content"])
+
+        if not continuation.should_continue(is_truncated(result)):
+            break
+        messages = continuation.next_messages()
+
+    return continuation.text
+
+
+def iter_chat_chunks(response, stop: Dict[str, Any]) -> Generator[str, None, None]:
     for line in response.iter_lines():
-        if line:
-            chunk = json.loads(line)
-            if chunk.get("response"):
-                yield chunk["response"]
+        if not line:
+            continue
+        chunk = json.loads(line)
+        content = chunk.get("message", {}).get("content")
+        if content:
+            yield content
+        if chunk.get("done"):
+            record_ollama_result(chunk)
+            stop['reason'] = chunk.get("done_reason")
+            break
+
+
+def stream_ollama_response(model: str, prompt: str, system_prompt: str = "") -> Generator[str, None, None]:
+    continuation = Continuation(build_messages(prompt, system_prompt), prefill=False)
+    messages = continuation.base_messages
+
+    while True:
+        response = call_with_retries(
+            'ollama', post_request, f"{get_ollama_endpoint()}/chat",
+            json=build_chat_request(model, messages, stream=True), stream=True)
+        stop = {}
+        try:
+            yield from continuation.stream(iter_chat_chunks(response, stop))
+        finally:
+            response.close()
+
+        if not continuation.should_continue(stop.get('reason') == 'length'):
+            break
+        messages = continuation.next_messages()
+
+
+def warm_up_ollama(model: str):
+    # A chat request without messages only loads the model, with the same
+    # window the first real request will most likely ask for.
+    data = build_chat_request(model, [])
+    try:
+        post_request(f"{get_ollama_endpoint()}/chat", json=data).close()
+    except (requests.RequestException, CassetteMissError):
+        # the real request reports an unreachable server properly
+        pass
+
+
+def start_ollama_warm_up(model: str) -> threading.Thread:
+    thread = threading.Thread(target=warm_up_ollama, args=(model,), daemon=True)
+    thread.start()
+    return thread
 
 
 def call_ollama_api_with_pagination(query: str, model: str, include_context: bool = False, instruction_prompt: Optional[str] = None) -> str:
     full_response = call_ollama_api(model, query, instruction_prompt or "")
     return full_response
 
+
+async def async_call_ollama_api_with_pagination(query: str, model: str, include_context: bool = False, instruction_prompt: Optional[str] = None) -> str:
+    return await async_call_ollama_api(model, query, instruction_prompt or "")
+
 # Note: Ollama doesn't have built-in support for image input like OpenAI.
 # For vision-related tasks, we'd need to use a different approach or model.
 
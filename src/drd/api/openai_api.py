@@ -1,17 +1,29 @@
 import os
 import json
 import base64
-from typing import Dict, Any, Optional, List, Generator
-from openai import OpenAI, AzureOpenAI
-from ..utils.parser import extract_and_parse_xml, parse_dravid_response
-from ..utils.file_utils import convert_to_base64
-import xml.etree.ElementTree as ET
+import asyncio
+import weakref
+from typing import Callable, Dict, Any, Optional, List, Generator, Sequence, Union
+from openai import OpenAI, AzureOpenAI, AsyncOpenAI, AsyncAzureOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+from ..utils.parser import extract_and_parse_xml, parse_dravid_response, ParsedResponse
+from ..utils.image_utils import prepare_images
 import click
-from .ollama_api import get_ollama_client, call_ollama_api_with_pagination, stream_ollama_response
+from .continuation import Continuation
+from .retry import call_with_retries, async_call_with_retries
+from .telemetry import record_call_usage
+from .scheduler import observe_response
+from .providers import get_cached_client
+from .routing import get_routed_provider, get_routed_model
+from .cassette import get_transport_mode, get_httpx_transport, get_async_httpx_transport
+from .deadline import httpx_timeout
+from .transport import on_cancel, abort_httpx_response
+from .ollama_api import get_ollama_client, call_ollama_api_with_pagination, async_call_ollama_api_with_pagination, stream_ollama_response, start_ollama_warm_up
 
 DEFAULT_MODEL = "gpt-4o-2024-05-13"
 MAX_TOKENS = 4000
 
+_async_clients = weakref.WeakKeyDictionary()
+
 
 def get_env_variable(name: str, default: Optional[str] = None) -> str:
     value = os.getenv(name, default)
@@ -20,29 +32,89 @@ def get_env_variable(name: str, default: Optional[str] = None) -> str:
     return value
 
 
-def get_client():
-    llm_type = get_env_variable('DRAVID_LLM', 'openai').lower()
+def create_http_client(llm_type: str):
+    # lets the scheduler see rate-limit headers on every response, 429s included
+    def on_response(response):
+        observe_response(llm_type, response.status_code, response.headers)
+    return DefaultHttpxClient(event_hooks={'response': [on_response]}, transport=get_httpx_transport())
+
+
+def create_async_http_client(llm_type: str):
+    async def on_response(response):
+        observe_response(llm_type, response.status_code, response.headers)
+    return DefaultAsyncHttpxClient(event_hooks={'response': [on_response]}, transport=get_async_httpx_transport())
+
 
+def get_llm_type() -> str:
+    return get_routed_provider(os.getenv('DRAVID_LLM', 'openai').lower())
+
+
+def get_client_settings(llm_type: str) -> Dict[str, Any]:
     if llm_type == 'azure':
-        return AzureOpenAI(
-            api_key=get_env_variable("AZURE_OPENAI_API_KEY"),
-            api_version=get_env_variable("AZURE_OPENAI_API_VERSION"),
-            azure_endpoint=get_env_variable("AZURE_OPENAI_ENDPOINT")
-        )
+        return {
+            'api_key': get_env_variable("AZURE_OPENAI_API_KEY"),
+            'api_version': get_env_variable("AZURE_OPENAI_API_VERSION"),
+            'azure_endpoint': get_env_variable("AZURE_OPENAI_ENDPOINT"),
+        }
     elif llm_type == 'openai':
-        return OpenAI()
+        # the SDK falls back to these when they are not passed in
+        return {
+            'api_key': os.getenv("OPENAI_API_KEY"),
+            'base_url': os.getenv("OPENAI_BASE_URL"),
+        }
     elif llm_type == 'custom':
-        api_key = get_env_variable("DRAVID_LLM_API_KEY")
-        api_base = get_env_variable("DRAVID_LLM_ENDPOINT")
-        return OpenAI(api_key=api_key, base_url=api_base)
-    elif llm_type == 'ollama':
-        return get_ollama_client()
+        return {
+            'api_key': get_env_variable("DRAVID_LLM_API_KEY"),
+            'base_url': get_env_variable("DRAVID_LLM_ENDPOINT"),
+        }
     else:
         raise ValueError(f"Unsupported LLM type: {llm_type}")
 
 
+def get_client_key(llm_type: str, settings: Dict[str, Any]) -> tuple:
+    # recording and replaying clients are kept apart from live ones
+    return (llm_type, get_transport_mode()) + tuple(sorted(settings.items()))
+
+
+def create_client(llm_type: str, settings: Dict[str, Any]):
+    client_class = AzureOpenAI if llm_type == 'azure' else OpenAI
+    return client_class(**settings, max_retries=0, http_client=create_http_client(llm_type))
+
+
+def create_async_client(llm_type: str, settings: Dict[str, Any]):
+    client_class = AsyncAzureOpenAI if llm_type == 'azure' else AsyncOpenAI
+    return client_class(**settings, max_retries=0, http_client=create_async_http_client(llm_type))
+
+
+def get_client():
+    llm_type = get_llm_type()
+    if llm_type == 'ollama':
+        return get_ollama_client()
+
+    settings = get_client_settings(llm_type)
+    return get_cached_client(get_client_key(llm_type, settings),
+                             lambda: create_client(llm_type, settings))
+
+
+def get_async_client():
+    llm_type = get_llm_type()
+    if llm_type == 'ollama':
+        raise ValueError(f"Unsupported LLM type for async client: {llm_type}")
+
+    # async clients are bound to the loop their connections were opened on
+    settings = get_client_settings(llm_type)
+    key = get_client_key(llm_type, settings)
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    if key not in clients:
+        clients[key] = create_async_client(llm_type, settings)
+    return clients[key]
+
+
 def get_model():
-    llm_type = get_env_variable('DRAVID_LLM', 'openai').lower()
+    llm_type = get_llm_type()
+    routed_model = get_routed_model(llm_type)
+    if routed_model:
+        return routed_model
     if llm_type == 'azure':
         return get_env_variable("AZURE_OPENAI_DEPLOYMENT_NAME")
     elif llm_type == 'custom' or llm_type == 'ollama':
@@ -51,48 +123,101 @@ def get_model():
         return get_env_variable("OPENAI_MODEL", DEFAULT_MODEL)
 
 
+def warm_up_ollama_model():
+    if get_llm_type() == 'ollama':
+        return start_ollama_warm_up(get_model())
+
+
+def with_timeout(create: Callable[..., Any], stream: bool = False) -> Callable[..., Any]:
+    # worked out per attempt, from what is left of the operation's budget
+    return lambda **kwargs: create(timeout=httpx_timeout(stream), **kwargs)
+
+
 def parse_response(response: str) -> str:
     try:
-        root = extract_and_parse_xml(response)
-        return ET.tostring(root, encoding='unicode')
+        # callers read the tree from the response instead of parsing it again
+        return ParsedResponse(response, extract_and_parse_xml(response))
     except Exception as e:
         click.echo(f"Error parsing XML response: {e}", err=True)
         return response
 
 
 def call_api_with_pagination(query: str, include_context: bool = False, instruction_prompt: Optional[str] = None) -> str:
-    llm_type = get_env_variable('DRAVID_LLM', 'openai').lower()
+    llm_type = get_llm_type()
     model = get_model()
 
     if llm_type == 'ollama':
         return call_ollama_api_with_pagination(query, model, include_context, instruction_prompt)
 
     client = get_client()
-    full_response = ""
     messages = [
         {"role": "system", "content": instruction_prompt or ""},
         {"role": "user", "content": query}
     ]
 
+    continuation = Continuation(messages, prefill=False)
+
+    while True:
+        response = call_with_retries(
+            llm_type, with_timeout(client.chat.completions.create),
+            model=model,
+            messages=messages,
+            max_tokens=MAX_TOKENS
+        )
+        record_call_usage(response.usage.model_dump() if response.usage else None)
+        continuation.add(response.choices[0].message.content)
+
+        if not continuation.should_continue(response.choices[0].finish_reason == 'length'):
+            break
+        messages = continuation.next_messages()
+
+    return parse_response(continuation.text)
+
+
+async def async_call_api_with_pagination(query: str, include_context: bool = False, instruction_prompt: Optional[str] = None) -> str:
+    llm_type = get_llm_type()
+    model = get_model()
+
+    if llm_type == 'ollama':
+        return await async_call_ollama_api_with_pagination(query, model, include_context, instruction_prompt)
+
+    client = get_async_client()
+    messages = [
+        {"role": "system", "content": instruction_prompt or ""},
+        {"role": "user", "content": query}
+    ]
+
+    continuation = Continuation(messages, prefill=False)
+
     while True:
-        response = client.chat.completions.create(
+        response = await async_call_with_retries(
+            llm_type, with_timeout(client.chat.completions.create),
             model=model,
             messages=messages,
             max_tokens=MAX_TOKENS
         )
-        full_response += response.choices[0].message.content
+        record_call_usage(response.usage.model_dump() if response.usage else None)
+        continuation.add(response.choices[0].message.content)
 
-        if response.choices[0].finish_reason != 'length':
+        if not continuation.should_continue(response.choices[0].finish_reason == 'length'):
             break
+        messages = continuation.next_messages()
 
-        messages.append({"role": "assistant", "content": full_response})
-        messages.append({"role": "user", "content": "Please continue."})
+    return parse_response(continuation.text)
 
-    return parse_response(full_response)
+
+def build_vision_content(query: str, image_path: Union[str, Sequence[str]]) -> List[Dict[str, Any]]:
+    content = [{"type": "text", "text": query}]
+    content += [
+        {"type": "image_url", "image_url": {
+            "url": f"data:{image.mime_type};base64,{image.data}"}}
+        for image in prepare_images(image_path)
+    ]
+    return content
 
 
-def call_vision_api_with_pagination(query: str, image_path: str, include_context: bool = False, instruction_prompt: Optional[str] = None) -> str:
-    llm_type = get_env_variable('DRAVID_LLM', 'openai').lower()
+def call_vision_api_with_pagination(query: str, image_path: Union[str, Sequence[str]], include_context: bool = False, instruction_prompt: Optional[str] = None) -> str:
+    llm_type = get_llm_type()
     if llm_type == 'ollama':
         raise NotImplementedError(
             "Vision API is not supported for Ollama models")
@@ -100,58 +225,84 @@ def call_vision_api_with_pagination(query: str, image_path: str, include_context
     client = get_client()
     model = get_model()
 
-    mime_type, image_data = convert_to_base64(image_path)
-    full_response = ""
     messages = [
         {"role": "system", "content": instruction_prompt or ""},
-        {
-            "role": "user",
-            "content": [
-                {"type": "text", "text": query},
-                {"type": "image_url", "image_url": {
-                    "url": f"data:image/{mime_type};base64,{image_data}"}}
-            ]
-        }
+        {"role": "user", "content": build_vision_content(query, image_path)}
     ]
 
+    continuation = Continuation(messages, prefill=False)
+
     while True:
-        response = client.chat.completions.create(
+        response = call_with_retries(
+            llm_type, with_timeout(client.chat.completions.create),
             model=model,
             messages=messages,
             max_tokens=MAX_TOKENS
         )
-        full_response += response.choices[0].message.content
+        record_call_usage(response.usage.model_dump() if response.usage else None)
+        continuation.add(response.choices[0].message.content)
 
-        if response.choices[0].finish_reason != 'length':
+        if not continuation.should_continue(response.choices[0].finish_reason == 'length'):
             break
+        messages = continuation.next_messages()
 
-        messages.append({"role": "assistant", "content": full_response})
-        messages.append({"role": "user", "content": "Please continue."})
+    return parse_response(continuation.text)
 
-    return parse_response(full_response)
+
+def stream_messages(llm_type: str, model: str, messages: List[Dict[str, Any]]) -> Generator[str, None, None]:
+    client = get_client()
+    continuation = Continuation(messages, prefill=False)
+
+    while True:
+        response = call_with_retries(
+            llm_type, with_timeout(client.chat.completions.create, stream=True),
+            model=model,
+            messages=messages,
+            max_tokens=MAX_TOKENS,
+            stream=True
+        )
+        on_cancel(lambda: abort_httpx_response(response.response))
+        stop = {}
+        yield from continuation.stream(iter_stream_text(response, stop))
+
+        if not continuation.should_continue(stop.get('reason') == 'length'):
+            break
+        messages = continuation.next_messages()
 
 
 def stream_response(query: str, instruction_prompt: Optional[str] = None) -> Generator[str, None, None]:
-    llm_type = get_env_variable('DRAVID_LLM', 'openai').lower()
+    llm_type = get_llm_type()
     model = get_model()
 
     if llm_type == 'ollama':
         yield from stream_ollama_response(model, query, instruction_prompt or "")
         return
 
-    client = get_client()
     messages = [
         {"role": "system", "content": instruction_prompt or ""},
         {"role": "user", "content": query}
     ]
+    yield from stream_messages(llm_type, model, messages)
+
+
+def stream_vision_response(query: str, image_path: Union[str, Sequence[str]], instruction_prompt: Optional[str] = None) -> Generator[str, None, None]:
+    llm_type = get_llm_type()
+    if llm_type == 'ollama':
+        raise NotImplementedError(
+            "Vision API is not supported for Ollama models")
+
+    messages = [
+        {"role": "system", "content": instruction_prompt or ""},
+        {"role": "user", "content": build_vision_content(query, image_path)}
+    ]
+    yield from stream_messages(llm_type, get_model(), messages)
 
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        max_tokens=MAX_TOKENS,
-        stream=True
-    )
 
+def iter_stream_text(response, stop: Dict[str, Any]) -> Generator[str, None, None]:
     for chunk in response:
-        if chunk.choices and chunk.choices[0].delta.content is not None:
+        if not chunk.choices:
+            continue
+        if chunk.choices[0].finish_reason:
+            stop['reason'] = chunk.choices[0].finish_reason
+        if chunk.choices[0].delta.content is not None:
             yield chunk.choices[0].delta.content
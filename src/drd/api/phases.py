@@ -0,0 +1,43 @@
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+
+FILE_IDENTIFICATION = 'file_identification'
+MAIN_QUERY = 'main_query'
+ERROR_FIX = 'error_fix'
+METADATA = 'metadata'
+
+PHASES = (FILE_IDENTIFICATION, MAIN_QUERY, ERROR_FIX, METADATA)
+
+INTERACTIVE = 'interactive'
+FIX = 'fix'
+BACKGROUND = 'background'
+
+# highest priority first
+LANES = (INTERACTIVE, FIX, BACKGROUND)
+PHASE_LANES = {
+    FILE_IDENTIFICATION: INTERACTIVE,
+    MAIN_QUERY: INTERACTIVE,
+    ERROR_FIX: FIX,
+    METADATA: BACKGROUND,
+}
+
+_current_phase = contextvars.ContextVar('dravid_phase', default=None)
+
+
+def get_phase() -> Optional[str]:
+    return _current_phase.get()
+
+
+def get_lane(phase: Optional[str] = None) -> str:
+    # calls made outside any phase come straight from the user
+    return PHASE_LANES.get(phase or get_phase(), INTERACTIVE)
+
+
+@contextmanager
+def phase_scope(phase: str):
+    token = _current_phase.set(phase)
+    try:
+        yield
+    finally:
+        _current_phase.reset(token)
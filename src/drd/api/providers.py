@@ -0,0 +1,139 @@
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional
+from ..utils import print_warning
+
+ENTRY_POINT_GROUP = 'drd.providers'
+
+_providers = {}
+_providers_lock = threading.Lock()
+_builtins_registered = False
+_entry_points_loaded = False
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Provider:
+    name: str
+    call_api: Callable
+    call_vision_api: Callable
+    stream_response: Callable
+    async_call_api: Optional[Callable] = None
+    get_model: Optional[Callable[[], str]] = None
+    # started before the first request, e.g. to load a local model
+    warm_up: Optional[Callable[[], Any]] = None
+    stream_vision_response: Optional[Callable] = None
+
+
+def register_provider(name: str, call_api: Callable, call_vision_api: Callable, stream_response: Callable,
+                      async_call_api: Optional[Callable] = None, get_model: Optional[Callable[[], str]] = None,
+                      warm_up: Optional[Callable[[], Any]] = None,
+                      stream_vision_response: Optional[Callable] = None) -> Provider:
+    provider = Provider(name.lower(), call_api, call_vision_api,
+                        stream_response, async_call_api, get_model, warm_up, stream_vision_response)
+    with _providers_lock:
+        _providers[provider.name] = provider
+    return provider
+
+
+def unregister_provider(name: str):
+    with _providers_lock:
+        _providers.pop(name.lower(), None)
+
+
+def register_builtin_providers():
+    # imported here because the provider modules use the client cache below
+    global _builtins_registered
+    if _builtins_registered:
+        return
+    from .claude_api import (call_claude_api_with_pagination, call_claude_vision_api_with_pagination,
+                             stream_claude_response, async_call_claude_api_with_pagination,
+                             stream_claude_vision_response)
+    from .claude_api import get_model as get_claude_model
+    from .openai_api import (call_api_with_pagination, call_vision_api_with_pagination, stream_response,
+                             async_call_api_with_pagination, get_model, warm_up_ollama_model,
+                             stream_vision_response)
+
+    builtins = [Provider('claude', call_claude_api_with_pagination, call_claude_vision_api_with_pagination,
+                         stream_claude_response, async_call_claude_api_with_pagination, get_claude_model,
+                         stream_vision_response=stream_claude_vision_response)]
+    builtins += [Provider(name, call_api_with_pagination, call_vision_api_with_pagination,
+                          stream_response, async_call_api_with_pagination, get_model,
+                          stream_vision_response=stream_vision_response)
+                 for name in ('openai', 'azure', 'custom')]
+    builtins.append(Provider('ollama', call_api_with_pagination, call_vision_api_with_pagination,
+                             stream_response, async_call_api_with_pagination, get_model, warm_up_ollama_model))
+    with _providers_lock:
+        # a provider registered under a built-in name replaces the built-in
+        for provider in builtins:
+            _providers.setdefault(provider.name, provider)
+        _builtins_registered = True
+
+
+def get_entry_points(group: str):
+    from importlib.metadata import entry_points
+    found = entry_points()
+    if hasattr(found, 'select'):
+        return found.select(group=group)
+    # Python 3.8 and 3.9 return a dict of groups and take no `group=`
+    return found.get(group, [])
+
+
+def load_entry_point_providers():
+    # Third-party packages can ship a provider by exposing a callable in the
+    # `drd.providers` entry point group that calls register_provider().
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+    for entry_point in get_entry_points(ENTRY_POINT_GROUP):
+        try:
+            entry_point.load()()
+        except Exception as e:
+            print_warning(
+                f"Failed to load LLM provider plugin {entry_point.name}: {e}")
+
+
+def get_provider(name: Optional[str] = None) -> Provider:
+    register_builtin_providers()
+    name = (name or os.getenv('DRAVID_LLM', 'claude')).lower()
+    provider = _providers.get(name)
+    if provider is None:
+        load_entry_point_providers()
+        provider = _providers.get(name)
+    if provider is None:
+        raise ValueError(f"Unsupported LLM type: {name}")
+    return provider
+
+
+def get_cached_client(key: Hashable, factory: Callable[[], Any]) -> Any:
+    # Clients own their connection pools, so one is kept per distinct
+    # configuration for the life of the process instead of one per call.
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = factory()
+    return client
+
+
+def reset_clients():
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        close = getattr(client, 'close', None)
+        if close is not None:
+            close()
+
+
+def get_client_count() -> int:
+    return len(_clients)
+
+
+def get_registered_providers() -> Dict[str, Provider]:
+    register_builtin_providers()
+    return dict(_providers)
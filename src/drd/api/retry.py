@@ -0,0 +1,319 @@
+import os
+import re
+import time
+import random
+import asyncio
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+import httpx
+import openai
+import requests
+from .phases import get_phase, FILE_IDENTIFICATION, MAIN_QUERY, ERROR_FIX, METADATA
+from .telemetry import count_retry
+from .cassette import is_cassette_miss
+from .deadline import DeadlineExceeded, get_deadline, check_deadline, remaining_time, wait_with_deadline
+from .transport import is_cancelled
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+DEFAULT_MAX_ATTEMPTS = 6
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+DEFAULT_RETRY_DEADLINE = 120.0
+PHASE_RETRY_DEADLINES = {
+    FILE_IDENTIFICATION: 60.0,
+    MAIN_QUERY: 180.0,
+    ERROR_FIX: 120.0,
+    # metadata runs unattended, so it can afford to wait out long rate limits
+    METADATA: 600.0,
+}
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 30.0
+
+RATE_LIMIT_RESET_HEADERS = (
+    'anthropic-ratelimit-requests-reset',
+    'anthropic-ratelimit-tokens-reset',
+    'anthropic-ratelimit-input-tokens-reset',
+    'anthropic-ratelimit-output-tokens-reset',
+    'x-ratelimit-reset-requests',
+    'x-ratelimit-reset-tokens',
+)
+DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+retry_stats = defaultdict(Counter)
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(
+            f"{provider} is failing repeatedly; not sending requests for another {retry_in:.0f}s")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def retry_in(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        return self.acquire() is not None
+
+    def acquire(self) -> Optional[bool]:
+        # None if the call may not be made, True if it is the half-open probe
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return False
+            if state == 'half_open' and not self.probing:
+                # let a single request through to find out if the provider recovered
+                self.probing = True
+                return True
+            return None
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    def release_probe(self):
+        # the probe ended without saying whether the provider recovered
+        # (rate limited, out of time, cancelled); the next call probes again
+        with self._lock:
+            self.probing = False
+
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker()
+        return _breakers[provider]
+
+
+def reset_circuit_breakers():
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def get_retry_stats() -> Dict[str, Dict[str, int]]:
+    return {provider: dict(counts) for provider, counts in retry_stats.items()}
+
+
+def get_max_attempts() -> int:
+    try:
+        return max(1, int(os.getenv('DRAVID_RETRY_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)))
+    except ValueError:
+        return DEFAULT_MAX_ATTEMPTS
+
+
+def get_retry_deadline(phase: Optional[str] = None) -> float:
+    phase = phase or get_phase()
+    default = PHASE_RETRY_DEADLINES.get(phase, DEFAULT_RETRY_DEADLINE)
+    if not phase:
+        return default
+    try:
+        return float(os.getenv(f'DRAVID_RETRY_DEADLINE_{phase.upper()}', default))
+    except ValueError:
+        return default
+
+
+def get_status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, 'status_code', None)
+    if isinstance(status, int):
+        return status
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error: Exception) -> bool:
+    if is_cassette_miss(error):
+        # replaying cannot produce a response that was never recorded
+        return False
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, httpx.TransportError, openai.APIConnectionError)):
+        return True
+    status = get_status_code(error)
+    return status is not None and (status in RETRYABLE_STATUS_CODES or status >= 500)
+
+
+def parse_duration(value: str) -> Optional[float]:
+    # OpenAI sends resets as Go durations ("1s", "6m0s", "20ms"),
+    # Anthropic as RFC 3339 timestamps.
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PART.findall(value)
+    if parts and ''.join(number + unit for number, unit in parts) == value:
+        return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts)
+    try:
+        reset_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if reset_at.tzinfo is None:
+        reset_at = reset_at.replace(tzinfo=timezone.utc)
+    return (reset_at - datetime.now(timezone.utc)).total_seconds()
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+
+    if get_status_code(error) != 429:
+        return None
+    resets = [parse_duration(headers[name])
+              for name in RATE_LIMIT_RESET_HEADERS if headers.get(name)]
+    resets = [reset for reset in resets if reset is not None]
+    return max(0.0, max(resets)) if resets else None
+
+
+def backoff_delay(attempt: int) -> float:
+    # full jitter keeps a batch of failed calls from retrying in lockstep
+    return random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt))
+
+
+def next_delay(error: Exception, attempt: int, started: float, deadline: float) -> Optional[float]:
+    if attempt + 1 >= get_max_attempts() or not is_retryable(error):
+        return None
+    delay = get_retry_after(error)
+    if delay is None:
+        delay = backoff_delay(attempt)
+    delay = min(delay, MAX_BACKOFF)
+    if time.monotonic() - started + delay > deadline:
+        return None
+    remaining = remaining_time()
+    if remaining is not None and delay >= remaining:
+        return None
+    return delay
+
+
+def _before_attempt(provider: str, breaker: CircuitBreaker, attempt: int) -> bool:
+    check_deadline()
+    probe = breaker.acquire()
+    if probe is None:
+        retry_stats[provider]['rejected'] += 1
+        raise CircuitOpenError(provider, breaker.retry_in())
+    retry_stats[provider]['attempts'] += 1
+    if attempt:
+        retry_stats[provider]['retries'] += 1
+        count_retry()
+    return probe
+
+
+def _after_failure(provider: str, breaker: CircuitBreaker, error: Exception, attempt: int, started: float, deadline: float) -> float:
+    if is_cancelled():
+        # the caller aborted the request (e.g. a hedged stream that lost)
+        raise error
+    if isinstance(error, DeadlineExceeded):
+        retry_stats[provider]['deadline_exceeded'] += 1
+        raise error
+    operation = get_deadline()
+    if operation is not None and operation.remaining() <= 0:
+        # most likely a timeout cut short to fit the budget
+        retry_stats[provider]['deadline_exceeded'] += 1
+        raise DeadlineExceeded(operation.operation, operation.budget) from error
+    if not is_retryable(error):
+        # the provider answered, it just didn't like the request
+        breaker.record_success()
+        retry_stats[provider]['errors'] += 1
+        raise error
+    if get_status_code(error) != 429:
+        # being rate limited says nothing about the provider's health
+        breaker.record_failure()
+    delay = next_delay(error, attempt, started, deadline)
+    if delay is None:
+        retry_stats[provider]['exhausted'] += 1
+        raise error
+    if get_status_code(error) == 429:
+        retry_stats[provider]['rate_limited'] += 1
+    return delay
+
+
+def call_with_retries(provider: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    breaker = get_circuit_breaker(provider)
+    deadline = get_retry_deadline()
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        probe = _before_attempt(provider, breaker, attempt)
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            delay = _after_failure(provider, breaker, e, attempt, started, deadline)
+        else:
+            breaker.record_success()
+            return result
+        finally:
+            if probe:
+                breaker.release_probe()
+        time.sleep(delay)
+        attempt += 1
+
+
+async def async_call_with_retries(provider: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    breaker = get_circuit_breaker(provider)
+    deadline = get_retry_deadline()
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        probe = _before_attempt(provider, breaker, attempt)
+        try:
+            result = await wait_with_deadline(func(*args, **kwargs))
+        except Exception as e:
+            delay = _after_failure(provider, breaker, e, attempt, started, deadline)
+        else:
+            breaker.record_success()
+            return result
+        finally:
+            if probe:
+                breaker.release_probe()
+        await asyncio.sleep(delay)
+        attempt += 1
@@ -0,0 +1,81 @@
+import os
+import contextvars
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import NamedTuple, Optional
+from .phases import get_phase, FILE_IDENTIFICATION, METADATA
+from .providers import get_provider
+
+# Phases whose output is short and structured, so a small model does them
+# well at a fraction of the latency and cost.
+CHEAP_PHASES = (FILE_IDENTIFICATION, METADATA)
+FAST_MODELS = {
+    'claude': 'claude-3-haiku-20240307',
+    'openai': 'gpt-4o-mini',
+}
+
+
+class Route(NamedTuple):
+    # None means whatever DRAVID_LLM and the provider's own settings pick
+    provider: Optional[str] = None
+    model: Optional[str] = None
+
+
+_route_override = contextvars.ContextVar('dravid_route_override', default=None)
+
+
+def is_provider(name: str) -> bool:
+    try:
+        get_provider(name)
+        return True
+    except ValueError:
+        return False
+
+
+@lru_cache(maxsize=64)
+def parse_route(value: str) -> Route:
+    # "provider:model", or just "model" for the configured provider; model
+    # names may contain colons themselves (e.g. Ollama's "llama3:8b")
+    value = value.strip()
+    provider, sep, model = value.partition(':')
+    if sep and is_provider(provider):
+        return Route(provider.lower(), model or None)
+    return Route(None, value or None)
+
+
+def is_fast_routing_enabled() -> bool:
+    return os.getenv('DRAVID_ROUTING', '').lower() == 'fast'
+
+
+def get_route(phase: Optional[str] = None) -> Route:
+    override = _route_override.get()
+    if override is not None:
+        return override
+    phase = phase or get_phase()
+    if phase:
+        value = os.getenv(f'DRAVID_ROUTE_{phase.upper()}')
+        if value:
+            return parse_route(value)
+        if phase in CHEAP_PHASES and is_fast_routing_enabled():
+            return Route(None, FAST_MODELS.get(os.getenv('DRAVID_LLM', 'claude').lower()))
+    return Route()
+
+
+def get_routed_provider(default: str) -> str:
+    return get_route().provider or default
+
+
+def get_routed_model(provider: str) -> Optional[str]:
+    route = get_route()
+    if route.provider in (None, provider):
+        return route.model
+    return None
+
+
+@contextmanager
+def route_scope(route: Route):
+    token = _route_override.set(route)
+    try:
+        yield
+    finally:
+        _route_override.reset(token)
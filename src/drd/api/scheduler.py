@@ -0,0 +1,467 @@
+import os
+import time
+import asyncio
+import threading
+import itertools
+import contextvars
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from typing import Any, Dict, Optional
+from .phases import LANES, INTERACTIVE, BACKGROUND
+from .cassette import get_transport_mode, REPLAY
+from .deadline import bound_wait
+
+# Published tier 1 limits; replaced by the real ones as soon as a response
+# carries rate-limit headers.
+DEFAULT_LIMITS = {
+    'claude': {'rpm': 50, 'input_tpm': 40000, 'output_tpm': 8000},
+    'openai': {'rpm': 500, 'input_tpm': 30000, 'output_tpm': None},
+    'azure': {'rpm': 500, 'input_tpm': 30000, 'output_tpm': None},
+    'custom': {'rpm': None, 'input_tpm': None, 'output_tpm': None},
+    'ollama': {'rpm': None, 'input_tpm': None, 'output_tpm': None},
+}
+DEFAULT_INITIAL_CONCURRENCY = 4
+DEFAULT_MAX_CONCURRENCY = 64
+# what `ollama serve` picks on most machines when OLLAMA_NUM_PARALLEL is unset
+DEFAULT_OLLAMA_PARALLEL = 4
+MIN_CONCURRENCY = 1
+OUTPUT_TOKEN_RESERVATION = 1024
+DEFAULT_PAUSE = 1.0
+# stop growing concurrency when less than this share of the request quota is left
+LOW_REMAINING_RATIO = 0.1
+# slots interactive and fix calls may take on top of the limit while
+# background work is holding slots
+BORROWABLE_SLOTS = 2
+WAIT_SAMPLES = 1000
+
+LIMIT_HEADERS = {
+    'rpm': (('anthropic-ratelimit-requests-limit', 'anthropic-ratelimit-requests-remaining'),
+            ('x-ratelimit-limit-requests', 'x-ratelimit-remaining-requests')),
+    'input_tpm': (('anthropic-ratelimit-input-tokens-limit', 'anthropic-ratelimit-input-tokens-remaining'),
+                  ('x-ratelimit-limit-tokens', 'x-ratelimit-remaining-tokens')),
+    'output_tpm': (('anthropic-ratelimit-output-tokens-limit', 'anthropic-ratelimit-output-tokens-remaining'),),
+}
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+_current_ticket = contextvars.ContextVar('dravid_scheduler_ticket', default=None)
+
+
+def _get_env_number(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+
+def _header_number(headers, name: str) -> Optional[float]:
+    try:
+        value = headers.get(name)
+        return float(value) if value is not None else None
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.level = per_minute
+        self.rate = per_minute / 60
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level +
+                         (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self.refill(now)
+        # a single request bigger than the whole budget waits for a full bucket
+        needed = min(amount, self.capacity)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def sync(self, limit: float, remaining: Optional[float], now: float, pending: float = 0):
+        self.refill(now)
+        self.capacity = limit
+        self.rate = limit / 60
+        if remaining is not None:
+            # the provider's count may not include requests still in flight
+            self.level = min(limit, remaining - pending)
+
+
+class Ticket:
+    def __init__(self, scheduler: 'ProviderScheduler', input_tokens: float, output_tokens: float,
+                 lane: str = INTERACTIVE, wait: float = 0.0):
+        self.scheduler = scheduler
+        self.lane = lane
+        self.wait = wait
+        self.charged_input = input_tokens
+        self.charged_output = output_tokens
+        self.used_input = 0
+        self.used_output = 0
+        self.released = False
+
+
+class Waiter:
+    def __init__(self, seq: int, input_tokens: float, output_tokens: float, lane: str = INTERACTIVE, loop=None):
+        self.seq = seq
+        self.lane = lane
+        self.enqueued = time.monotonic()
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.loop = loop
+        self.ticket = None
+        self.event = asyncio.Event() if loop is not None else threading.Event()
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self.event.set)
+
+
+class LaneWaits:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=WAIT_SAMPLES)
+
+    def add(self, wait: float):
+        self.count += 1
+        self.total += wait
+        self.max = max(self.max, wait)
+        self.samples.append(wait)
+
+    def percentile(self, fraction: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 4) if self.count else 0.0,
+            'p50': round(self.percentile(0.5), 4),
+            'p95': round(self.percentile(0.95), 4),
+            'max': round(self.max, 4),
+        }
+
+
+class ProviderScheduler:
+    def __init__(self, provider: str, rpm: Optional[float] = None, input_tpm: Optional[float] = None,
+                 output_tpm: Optional[float] = None, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 initial_concurrency: int = DEFAULT_INITIAL_CONCURRENCY):
+        self.provider = provider
+        self.buckets = {
+            'rpm': TokenBucket(rpm) if rpm else None,
+            'input_tpm': TokenBucket(input_tpm) if input_tpm else None,
+            'output_tpm': TokenBucket(output_tpm) if output_tpm else None,
+        }
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(min(initial_concurrency, max_concurrency))
+        self.in_flight = 0
+        self.lane_in_flight = dict.fromkeys(LANES, 0)
+        self.lane_waits = {lane: LaneWaits() for lane in LANES}
+        self.reserved = {'rpm': 0, 'input_tpm': 0, 'output_tpm': 0}
+        self.paused_until = 0.0
+        self.waiters = {lane: deque() for lane in LANES}
+        self.admitted = 0
+        self.throttled = 0
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(waiters) for waiters in self.waiters.values())
+
+    def _head(self) -> Optional[Waiter]:
+        for lane in LANES:
+            if self.waiters[lane]:
+                return self.waiters[lane][0]
+        return None
+
+    def _lane_limit(self, lane: str) -> int:
+        limit = max(MIN_CONCURRENCY, int(self.concurrency))
+        if lane == BACKGROUND:
+            return limit
+        return limit + min(BORROWABLE_SLOTS, self.lane_in_flight[BACKGROUND])
+
+    def _budget_wait(self, waiter: Waiter, now: float) -> float:
+        wait = max(0.0, self.paused_until - now)
+        amounts = {'rpm': 1, 'input_tpm': waiter.input_tokens,
+                   'output_tpm': waiter.output_tokens}
+        for name, bucket in self.buckets.items():
+            if bucket is not None:
+                wait = max(wait, bucket.wait_time(amounts[name], now))
+        return wait
+
+    def _admit(self, waiter: Waiter):
+        for name, amount in (('rpm', 1), ('input_tpm', waiter.input_tokens), ('output_tpm', waiter.output_tokens)):
+            self.reserved[name] += amount
+            if self.buckets[name] is not None:
+                self.buckets[name].take(amount)
+        self.in_flight += 1
+        self.lane_in_flight[waiter.lane] += 1
+        self.admitted += 1
+        wait = time.monotonic() - waiter.enqueued
+        self.lane_waits[waiter.lane].add(wait)
+        waiter.ticket = Ticket(self, waiter.input_tokens,
+                               waiter.output_tokens, waiter.lane, wait)
+
+    def _dispatch(self, caller: Optional[Waiter] = None) -> Optional[float]:
+        # Admits waiters by lane priority, then arrival order, while there is
+        # room. Returns how long the head of the queue has to wait for budget,
+        # or None if it is waiting for a concurrency slot instead.
+        now = time.monotonic()
+        while True:
+            head = self._head()
+            if head is None:
+                return None
+            if self.in_flight >= self._lane_limit(head.lane):
+                return None
+            wait = self._budget_wait(head, now)
+            if wait > 0:
+                if head is not caller:
+                    head.wake()
+                return wait
+            self.waiters[head.lane].popleft()
+            self._admit(head)
+            if head is not caller:
+                head.wake()
+
+    def _enqueue(self, input_tokens: float, output_tokens: float, lane: str, loop=None) -> Waiter:
+        if lane not in self.waiters:
+            raise ValueError(f"Unknown priority lane: {lane}")
+        waiter = Waiter(next(self._seq), input_tokens,
+                        output_tokens, lane, loop)
+        self.waiters[lane].append(waiter)
+        return waiter
+
+    def _abandon(self, waiter: Waiter):
+        with self._lock:
+            if waiter.ticket is not None:
+                self._release(waiter.ticket)
+            elif waiter in self.waiters[waiter.lane]:
+                self.waiters[waiter.lane].remove(waiter)
+                self._dispatch()
+
+    def acquire(self, input_tokens: float = 0, output_tokens: float = OUTPUT_TOKEN_RESERVATION,
+                lane: str = INTERACTIVE) -> Ticket:
+        with self._lock:
+            waiter = self._enqueue(input_tokens, output_tokens, lane)
+        try:
+            while True:
+                with self._lock:
+                    waiter.event.clear()
+                    wait = self._dispatch(waiter)
+                    if waiter.ticket is not None:
+                        return waiter.ticket
+                    if self._head() is not waiter:
+                        wait = None
+                waiter.event.wait(bound_wait(wait))
+        except BaseException:
+            self._abandon(waiter)
+            raise
+
+    async def async_acquire(self, input_tokens: float = 0, output_tokens: float = OUTPUT_TOKEN_RESERVATION,
+                            lane: str = INTERACTIVE) -> Ticket:
+        with self._lock:
+            waiter = self._enqueue(
+                input_tokens, output_tokens, lane, asyncio.get_running_loop())
+        try:
+            while True:
+                with self._lock:
+                    waiter.event.clear()
+                    wait = self._dispatch(waiter)
+                    if waiter.ticket is not None:
+                        return waiter.ticket
+                    if self._head() is not waiter:
+                        wait = None
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), bound_wait(wait))
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self._abandon(waiter)
+            raise
+
+    def _release(self, ticket: Ticket):
+        if ticket.released:
+            return
+        ticket.released = True
+        self.in_flight -= 1
+        self.lane_in_flight[ticket.lane] -= 1
+        self.reserved['rpm'] -= 1
+        self.reserved['input_tpm'] -= ticket.charged_input
+        self.reserved['output_tpm'] -= ticket.charged_output
+        # hand back whatever was reserved but not used
+        for name, charged, used in (('input_tpm', ticket.charged_input, ticket.used_input),
+                                    ('output_tpm', ticket.charged_output, ticket.used_output)):
+            if used and self.buckets[name] is not None and charged > used:
+                self.buckets[name].take(used - charged)
+        self._dispatch()
+
+    def release(self, ticket: Ticket):
+        with self._lock:
+            self._release(ticket)
+
+    def record_usage(self, ticket: Ticket, input_tokens: int, output_tokens: int):
+        with self._lock:
+            ticket.used_input += input_tokens
+            ticket.used_output += output_tokens
+            for name, charged, used in (('input_tpm', 'charged_input', ticket.used_input),
+                                        ('output_tpm', 'charged_output', ticket.used_output)):
+                extra = used - getattr(ticket, charged)
+                if extra > 0:
+                    if self.buckets[name] is not None:
+                        self.buckets[name].take(extra)
+                    self.reserved[name] += extra
+                    setattr(ticket, charged, used)
+
+    def observe(self, status_code: Any, headers: Any):
+        if not isinstance(status_code, int):
+            return
+        with self._lock:
+            now = time.monotonic()
+            for name, pairs in LIMIT_HEADERS.items():
+                for limit_header, remaining_header in pairs:
+                    limit = _header_number(headers, limit_header)
+                    if not limit:
+                        continue
+                    remaining = _header_number(headers, remaining_header)
+                    if self.buckets[name] is None:
+                        self.buckets[name] = TokenBucket(limit)
+                    self.buckets[name].sync(
+                        limit, remaining, now, self.reserved[name])
+                    break
+
+            if status_code in (429, 529):
+                # multiplicative decrease, and stop admitting until the provider says so
+                self.throttled += 1
+                self.concurrency = max(MIN_CONCURRENCY, self.concurrency / 2)
+                pause = _header_number(headers, 'retry-after')
+                self.paused_until = max(
+                    self.paused_until, now + (pause if pause is not None else DEFAULT_PAUSE))
+            elif status_code < 400:
+                requests_bucket = self.buckets['rpm']
+                if requests_bucket is None or requests_bucket.level > requests_bucket.capacity * LOW_REMAINING_RATIO:
+                    # additive increase: about one extra slot per window of calls
+                    self.concurrency = min(
+                        self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, input_tokens: float = 0, output_tokens: float = OUTPUT_TOKEN_RESERVATION, lane: str = INTERACTIVE):
+        ticket = self.acquire(input_tokens, output_tokens, lane)
+        token = _current_ticket.set(ticket)
+        try:
+            yield ticket
+        finally:
+            _current_ticket.reset(token)
+            self.release(ticket)
+
+    @asynccontextmanager
+    async def async_slot(self, input_tokens: float = 0, output_tokens: float = OUTPUT_TOKEN_RESERVATION,
+                         lane: str = INTERACTIVE):
+        ticket = await self.async_acquire(input_tokens, output_tokens, lane)
+        token = _current_ticket.set(ticket)
+        try:
+            yield ticket
+        finally:
+            _current_ticket.reset(token)
+            self.release(ticket)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            budgets = {}
+            for name, bucket in self.buckets.items():
+                if bucket is not None:
+                    bucket.refill(now)
+                    budgets[name] = {'limit': bucket.capacity,
+                                     'available': round(bucket.level)}
+            return {
+                'queue_depth': self.queue_depth,
+                'in_flight': self.in_flight,
+                'concurrency': round(self.concurrency, 2),
+                'admitted': self.admitted,
+                'throttled': self.throttled,
+                'budgets': budgets,
+                'lanes': {
+                    lane: {
+                        'queued': len(self.waiters[lane]),
+                        'in_flight': self.lane_in_flight[lane],
+                        'wait': self.lane_waits[lane].summary(),
+                    }
+                    for lane in LANES
+                },
+            }
+
+
+def get_max_concurrency(provider: str) -> int:
+    default = DEFAULT_MAX_CONCURRENCY
+    if provider == 'ollama':
+        # a local server only decodes OLLAMA_NUM_PARALLEL requests at once and
+        # queues the rest, so sending more just adds latency to each of them
+        default = _get_env_number('OLLAMA_NUM_PARALLEL', DEFAULT_OLLAMA_PARALLEL)
+    return max(MIN_CONCURRENCY, int(_get_env_number('DRAVID_MAX_CONCURRENCY', default)))
+
+
+def create_scheduler(provider: str) -> ProviderScheduler:
+    max_concurrency = get_max_concurrency(provider)
+    if get_transport_mode() == REPLAY:
+        # replayed responses use no provider quota
+        return ProviderScheduler(provider, max_concurrency=max_concurrency, initial_concurrency=max_concurrency)
+    limits = DEFAULT_LIMITS.get(provider, DEFAULT_LIMITS['custom'])
+    return ProviderScheduler(
+        provider,
+        rpm=_get_env_number('DRAVID_RPM', limits['rpm']),
+        input_tpm=_get_env_number('DRAVID_INPUT_TPM', limits['input_tpm']),
+        output_tpm=_get_env_number('DRAVID_OUTPUT_TPM', limits['output_tpm']),
+        max_concurrency=max_concurrency,
+        # nothing to probe on a local server, start at its parallelism
+        initial_concurrency=max_concurrency if provider == 'ollama' else DEFAULT_INITIAL_CONCURRENCY,
+    )
+
+
+def get_scheduler(provider: str) -> ProviderScheduler:
+    with _schedulers_lock:
+        if provider not in _schedulers:
+            _schedulers[provider] = create_scheduler(provider)
+        return _schedulers[provider]
+
+
+def reset_schedulers():
+    with _schedulers_lock:
+        _schedulers.clear()
+
+
+def get_scheduler_stats() -> Dict[str, Dict[str, Any]]:
+    with _schedulers_lock:
+        schedulers = dict(_schedulers)
+    return {provider: scheduler.stats() for provider, scheduler in schedulers.items()}
+
+
+def observe_response(provider: str, status_code: Any, headers: Any):
+    with _schedulers_lock:
+        scheduler = _schedulers.get(provider)
+    # providers nobody scheduled through yet have nothing to adapt, and
+    # replayed rate-limit headers describe a quota that is not being used
+    if scheduler is not None and get_transport_mode() != REPLAY:
+        scheduler.observe(status_code, headers)
+
+
+def record_ticket_usage(input_tokens: int, output_tokens: int):
+    ticket = _current_ticket.get()
+    if ticket is not None and not ticket.released:
+        ticket.scheduler.record_usage(ticket, input_tokens, output_tokens)
@@ -0,0 +1,283 @@
+import os
+import asyncio
+import threading
+import weakref
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, Optional
+from .telemetry import mark_dedup_hit
+from .deadline import bound_wait, wait_with_deadline
+from .transport import CancelScope, RequestCancelled, cancel_scope, on_cancel
+
+
+class FlightAbandoned(Exception):
+    pass
+
+
+def is_single_flight_enabled() -> bool:
+    return os.getenv('DRAVID_SINGLE_FLIGHT', 'true').lower() not in ('0', 'false', 'no')
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class StreamFlight:
+    # Output of one streamed request, read by every caller that asked for it.
+    # The source runs in its own thread, so callers can stop reading at any
+    # time; it is only stopped once none of them is left.
+    def __init__(self):
+        self.chunks = []
+        # chunks dropped from the front once every reader is past them
+        self.offset = 0
+        self.size = 0
+        # reader -> index of the next chunk it reads
+        self.positions = {}
+        self.cancelled = set()
+        self.retired = False
+        self.abandoned = False
+        self.finished = False
+        self.error = None
+        self.condition = threading.Condition()
+        self.scope = CancelScope()
+
+    def publish(self, chunk: str):
+        with self.condition:
+            self.chunks.append(chunk)
+            self.size += len(chunk)
+            self.condition.notify_all()
+
+    def finish(self, error: BaseException = None):
+        with self.condition:
+            self.finished = True
+            self.error = error
+            self.condition.notify_all()
+
+    def join(self) -> object:
+        reader = object()
+        with self.condition:
+            self.positions[reader] = self.offset
+        return reader
+
+    def leave(self, reader: object) -> bool:
+        # True when this was the last reader of a stream still running
+        with self.condition:
+            self.positions.pop(reader, None)
+            self.cancelled.discard(reader)
+            if not self.positions and not self.finished:
+                self.abandoned = True
+            self._trim()
+            return self.abandoned
+
+    def cancel_reader(self, reader: object):
+        with self.condition:
+            self.cancelled.add(reader)
+            self.condition.notify_all()
+
+    def retire(self):
+        # no new readers will join; what all readers have seen can go
+        with self.condition:
+            self.retired = True
+            self._trim()
+
+    def _trim(self):
+        if not self.retired:
+            return
+        low = min(self.positions.values(), default=self.offset + len(self.chunks))
+        if low > self.offset:
+            del self.chunks[:low - self.offset]
+            self.offset = low
+
+    def follow(self, reader: object) -> Iterator[str]:
+        while True:
+            with self.condition:
+                index = self.positions[reader]
+                while index >= self.offset + len(self.chunks) and not self.finished:
+                    if reader in self.cancelled:
+                        raise RequestCancelled("The request was cancelled")
+                    self.condition.wait(bound_wait(None))
+                chunks = self.chunks[index - self.offset:]
+                self.positions[reader] = index + len(chunks)
+                finished, error = self.finished, self.error
+                self._trim()
+            yield from chunks
+            if finished and not chunks:
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    # Identical requests issued while one is already in flight wait for it
+    # and share its result instead of making their own call.
+    def __init__(self):
+        self.hits = 0
+        self.leaders = 0
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._streams = {}
+        self._async_flights = weakref.WeakKeyDictionary()
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'leaders': self.leaders}
+
+    def do(self, key: Optional[str], func: Callable[[], Any]) -> Any:
+        if key is None:
+            return func()
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+                self.leaders += 1
+            else:
+                self.hits += 1
+        if not leader:
+            mark_dedup_hit()
+            # the operation's deadline still applies while waiting
+            while not flight.done.wait(bound_wait(None)):
+                pass
+            if isinstance(flight.error, FlightAbandoned):
+                return func()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        except BaseException:
+            flight.error = FlightAbandoned()
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stream(self, key: Optional[str], source: Callable[[], Iterable[str]],
+               replay_limit: Optional[int] = None) -> Iterator[str]:
+        if key is None:
+            yield from source()
+            return
+        with self._lock:
+            flight = self._streams.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._streams[key] = StreamFlight()
+                self.leaders += 1
+            else:
+                self.hits += 1
+            reader = flight.join()
+        if leader:
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(self._produce, key, flight, source, replay_limit),
+                             daemon=True).start()
+        else:
+            mark_dedup_hit()
+        # a hedged attempt that lost stops reading instead of waiting on
+        on_cancel(lambda: flight.cancel_reader(reader))
+
+        received = False
+        try:
+            for chunk in flight.follow(reader):
+                received = True
+                yield chunk
+        except FlightAbandoned:
+            # the source was interrupted; start over on our own unless part
+            # of its output has already been passed on
+            if leader or received:
+                raise
+            yield from source()
+        finally:
+            with self._lock:
+                abandoned = flight.leave(reader)
+                if abandoned and self._streams.get(key) is flight:
+                    del self._streams[key]
+            if abandoned:
+                # nobody is reading any more; stop the request
+                flight.scope.cancel()
+
+    def _produce(self, key: str, flight: StreamFlight, source: Callable[[], Iterable[str]],
+                 replay_limit: Optional[int]):
+        error = FlightAbandoned()
+        stream = None
+        try:
+            with cancel_scope(flight.scope):
+                stream = source()
+                for chunk in stream:
+                    if flight.abandoned:
+                        break
+                    flight.publish(chunk)
+                    if replay_limit and not flight.retired and flight.size > replay_limit:
+                        self._retire(key, flight)
+            error = None
+        except Exception as e:
+            error = e
+        except BaseException:
+            # readers that got nothing yet make their own call
+            pass
+        finally:
+            close = getattr(stream, 'close', None)
+            if close is not None:
+                close()
+            with self._lock:
+                if self._streams.get(key) is flight:
+                    del self._streams[key]
+            flight.finish(error)
+
+    def _retire(self, key: str, flight: StreamFlight):
+        # A long stream stops being shared with requests that come later, so
+        # its chunks are not held for a reader that may never come.
+        with self._lock:
+            if self._streams.get(key) is flight:
+                del self._streams[key]
+        flight.retire()
+
+    async def async_do(self, key: Optional[str], func: Callable[[], Awaitable[Any]]) -> Any:
+        if key is None:
+            return await func()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            flights = self._async_flights.setdefault(loop, {})
+            future = flights.get(key)
+            leader = future is None
+            if leader:
+                future = flights[key] = loop.create_future()
+                self.leaders += 1
+            else:
+                self.hits += 1
+        if not leader:
+            mark_dedup_hit()
+            try:
+                return await wait_with_deadline(asyncio.shield(future))
+            except FlightAbandoned:
+                return await func()
+
+        try:
+            result = await func()
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except BaseException:
+            future.set_exception(FlightAbandoned())
+            raise
+        finally:
+            with self._lock:
+                del flights[key]
+            if future.done() and not future.cancelled():
+                # nobody may be waiting; mark any error as seen
+                future.exception()
+
+
+single_flight = SingleFlight()
+
+
+def get_dedup_stats() -> Dict[str, int]:
+    return single_flight.stats()
@@ -0,0 +1,146 @@
+import re
+import json
+from typing import Any, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+DONE = '[DONE]'
+
+# A run of events that only use `event:` and single `data:` lines, which is
+# all Anthropic and OpenAI-compatible servers send in practice.
+SIMPLE_BLOCK = re.compile(r'(?:(?:event: [^\n]*\n)?data: [^\n]*(?:\n\n|\Z))*')
+SIMPLE_EVENT = re.compile(r'(?:event: ([^\n]*)\n)?data: ([^\n]*)')
+
+_decode_json = json.JSONDecoder().decode
+
+
+class StreamError(Exception):
+    def __init__(self, error_type: str, message: str):
+        super().__init__(f"{error_type}: {message}")
+        self.error_type = error_type
+        self.message = message
+
+
+class ServerSentEvent(NamedTuple):
+    event: str
+    data: str
+    id: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        # OpenAI-compatible streams end with `data: [DONE]`
+        return self.data == DONE
+
+    def json(self) -> Any:
+        return _decode_json(self.data)
+
+
+class SSEDecoder:
+    # Buffers raw bytes and only decodes once a read completes at least one
+    # event. Complete events are then split with one regex pass over the whole
+    # block rather than a decode and a Python-level check per line.
+    def __init__(self):
+        self._buffer = bytearray()
+        self._pending_cr = False
+        self.last_event_id = None
+        self.retry = None
+
+    def feed(self, chunk: bytes) -> List[ServerSentEvent]:
+        if self._pending_cr:
+            chunk = b'\r' + chunk
+            self._pending_cr = False
+        if chunk.endswith(b'\r'):
+            # could be the first half of a \r\n split across reads
+            chunk = chunk[:-1]
+            self._pending_cr = True
+        if b'\r' in chunk:
+            chunk = chunk.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+        self._buffer += chunk
+
+        end = self._buffer.rfind(b'\n\n')
+        if end < 0:
+            return []
+        # a multi-byte UTF-8 sequence never contains \n, so the block decodes
+        block = self._buffer[:end].decode('utf-8')
+        del self._buffer[:end + 2]
+        return self._decode_block(block)
+
+    def flush(self) -> List[ServerSentEvent]:
+        # tolerate servers that close the stream without a final blank line
+        block = self._buffer.decode('utf-8')
+        self._buffer.clear()
+        self._pending_cr = False
+        return self._decode_block(block)
+
+    def _decode_block(self, block: str) -> List[ServerSentEvent]:
+        if SIMPLE_BLOCK.fullmatch(block):
+            event_id = self.last_event_id
+            return [ServerSentEvent(event or 'message', data, event_id)
+                    for event, data in SIMPLE_EVENT.findall(block)]
+        return [event for event in map(self._decode_event, block.split('\n\n')) if event]
+
+    def _decode_event(self, block: str) -> Optional[ServerSentEvent]:
+        event_type = 'message'
+        data = []
+        for line in block.split('\n'):
+            if not line or line[0] == ':':  # blank or comment
+                continue
+            name, _, value = line.partition(':')
+            if value[:1] == ' ':
+                value = value[1:]
+            if name == 'data':
+                data.append(value)
+            elif name == 'event':
+                event_type = value
+            elif name == 'id':
+                self.last_event_id = value
+            elif name == 'retry' and value.isdigit():
+                self.retry = int(value)
+        if not data:
+            return None
+        return ServerSentEvent(event_type, '\n'.join(data), self.last_event_id)
+
+
+def decode_payloads(events: List[ServerSentEvent]) -> List[Any]:
+    # One JSON parse per network read instead of one per event; anything
+    # that is not JSON (such as [DONE]) is passed through as a string.
+    try:
+        payloads = _decode_json('[' + ','.join(event.data for event in events) + ']')
+        if len(payloads) == len(events):
+            return payloads
+    except ValueError:
+        pass
+    return [decode_payload(event.data) for event in events]
+
+
+def decode_payload(data: str) -> Any:
+    try:
+        return _decode_json(data)
+    except ValueError:
+        return data
+
+
+def iter_sse(chunks: Iterable[bytes]) -> Iterator[ServerSentEvent]:
+    decoder = SSEDecoder()
+    for chunk in chunks:
+        if chunk:
+            yield from decoder.feed(chunk)
+    yield from decoder.flush()
+
+
+def iter_json_events(chunks: Iterable[bytes], skip: Tuple[str, ...] = ('ping',)) -> Iterator[Tuple[str, Any]]:
+    decoder = SSEDecoder()
+    for chunk in chunks:
+        if chunk:
+            yield from _with_payloads(decoder.feed(chunk), skip)
+    yield from _with_payloads(decoder.flush(), skip)
+
+
+def _with_payloads(events: List[ServerSentEvent], skip: Tuple[str, ...]) -> List[Tuple[str, Any]]:
+    events = [event for event in events if event.event not in skip]
+    if not events:
+        return []
+    return list(zip([event.event for event in events], decode_payloads(events)))
+
+
+def iter_response_events(response) -> Iterator[Tuple[str, Any]]:
+    # chunk_size=None hands over each network read as it arrives
+    return iter_json_events(response.iter_content(chunk_size=None))
@@ -0,0 +1,334 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional
+from .phases import get_phase
+from .scheduler import record_ticket_usage
+
+# USD per million tokens: input, output, cache write, cache read
+MODEL_PRICES = {
+    'claude-3-5-sonnet-20240620': (3.00, 15.00, 3.75, 0.30),
+    'claude-3-haiku-20240307': (0.25, 1.25, 0.30, 0.03),
+    'gpt-4o-2024-05-13': (5.00, 15.00, 5.00, 5.00),
+    'gpt-4o': (5.00, 15.00, 5.00, 5.00),
+    'gpt-4o-mini': (0.15, 0.60, 0.15, 0.15),
+}
+FREE_PROVIDERS = ('ollama',)
+CHARS_PER_TOKEN = 4
+LATENCY_BUCKETS = (0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_current_call = contextvars.ContextVar('dravid_call_metrics', default=None)
+_write_lock = threading.Lock()
+_aggregates = defaultdict(lambda: defaultdict(float))
+_latency_histograms = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+_ttft_histograms = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+_queue_wait_histograms = defaultdict(
+    lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+
+
+@dataclass
+class CallMetrics:
+    provider: str
+    model: Optional[str]
+    kind: str
+    phase: Optional[str] = None
+    request_bytes: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    tokens_estimated: bool = False
+    output_chars: int = 0
+    ttft: Optional[float] = None
+    latency: Optional[float] = None
+    tokens_per_second: Optional[float] = None
+    load_duration: Optional[float] = None
+    prompt_eval_duration: Optional[float] = None
+    eval_duration: Optional[float] = None
+    cache_hit: bool = False
+    dedup_hit: bool = False
+    continuations: int = 0
+    retries: int = 0
+    lane: Optional[str] = None
+    queue_wait: Optional[float] = None
+    cost: Optional[float] = None
+    error: Optional[str] = None
+    timestamp: float = field(default_factory=time.time)
+    started: float = field(default_factory=time.perf_counter, repr=False)
+
+
+def estimate_tokens(chars: int) -> int:
+    return (chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def current_call() -> Optional[CallMetrics]:
+    return _current_call.get()
+
+
+def record_call_usage(usage: Optional[Dict[str, Any]]):
+    if not usage:
+        return
+    # Anthropic names, then OpenAI, then Ollama
+    input_tokens = usage.get('input_tokens') or usage.get(
+        'prompt_tokens') or usage.get('prompt_eval_count') or 0
+    output_tokens = usage.get('output_tokens') or usage.get(
+        'completion_tokens') or usage.get('eval_count') or 0
+    cache_creation_tokens = usage.get('cache_creation_input_tokens') or 0
+    record_ticket_usage(input_tokens + cache_creation_tokens, output_tokens)
+
+    metrics = _current_call.get()
+    if metrics is None:
+        return
+    metrics.input_tokens += input_tokens
+    metrics.output_tokens += output_tokens
+    metrics.cache_creation_input_tokens += cache_creation_tokens
+    metrics.cache_read_input_tokens += usage.get('cache_read_input_tokens') or 0
+
+
+def record_server_timings(load: float = 0.0, prompt_eval: float = 0.0, eval: float = 0.0):
+    # time the provider itself reports spending on model load, prompt
+    # processing and generation, summed over continuations
+    metrics = _current_call.get()
+    if metrics is None:
+        return
+    metrics.load_duration = (metrics.load_duration or 0.0) + load
+    metrics.prompt_eval_duration = (metrics.prompt_eval_duration or 0.0) + prompt_eval
+    metrics.eval_duration = (metrics.eval_duration or 0.0) + eval
+
+
+def record_output(text: str):
+    metrics = _current_call.get()
+    if metrics is not None and text:
+        metrics.output_chars += len(text)
+
+
+def mark_first_token():
+    metrics = _current_call.get()
+    if metrics is not None and metrics.ttft is None:
+        metrics.ttft = time.perf_counter() - metrics.started
+
+
+def record_queue_wait(lane: str, wait: float):
+    metrics = _current_call.get()
+    if metrics is not None:
+        metrics.lane = lane
+        metrics.queue_wait = wait
+
+
+def mark_cache_hit():
+    metrics = _current_call.get()
+    if metrics is not None:
+        metrics.cache_hit = True
+
+
+def mark_dedup_hit():
+    metrics = _current_call.get()
+    if metrics is not None:
+        metrics.dedup_hit = True
+
+
+def count_continuation():
+    metrics = _current_call.get()
+    if metrics is not None:
+        metrics.continuations += 1
+
+
+def count_retry():
+    metrics = _current_call.get()
+    if metrics is not None:
+        metrics.retries += 1
+
+
+def estimate_cost(metrics: CallMetrics) -> Optional[float]:
+    if metrics.provider in FREE_PROVIDERS:
+        return 0.0
+    prices = MODEL_PRICES.get(metrics.model)
+    if prices is None:
+        return None
+    input_price, output_price, write_price, read_price = prices
+    return (metrics.input_tokens * input_price
+            + metrics.output_tokens * output_price
+            + metrics.cache_creation_input_tokens * write_price
+            + metrics.cache_read_input_tokens * read_price) / 1_000_000
+
+
+def finish_call(metrics: CallMetrics):
+    metrics.latency = time.perf_counter() - metrics.started
+    if metrics.cache_hit or metrics.dedup_hit:
+        # served locally or by another in-flight call, nothing was billed
+        metrics.input_tokens = metrics.output_tokens = 0
+        metrics.cache_creation_input_tokens = metrics.cache_read_input_tokens = 0
+    elif not (metrics.input_tokens or metrics.output_tokens):
+        metrics.tokens_estimated = True
+        metrics.input_tokens = estimate_tokens(metrics.request_bytes)
+        metrics.output_tokens = estimate_tokens(metrics.output_chars)
+    generation_time = metrics.eval_duration or metrics.latency - (metrics.ttft or 0)
+    if metrics.output_tokens and generation_time > 0:
+        metrics.tokens_per_second = metrics.output_tokens / generation_time
+    metrics.cost = 0.0 if metrics.cache_hit or metrics.dedup_hit else estimate_cost(metrics)
+
+
+@contextmanager
+def track_call(provider: str, model: Optional[str], kind: str, *texts: Optional[str]):
+    metrics = CallMetrics(
+        provider=provider,
+        model=model,
+        kind=kind,
+        phase=get_phase(),
+        request_bytes=sum(len(text.encode('utf-8')) for text in texts if text)
+    )
+    token = _current_call.set(metrics)
+    try:
+        yield metrics
+    except BaseException as e:
+        metrics.error = type(e).__name__
+        raise
+    finally:
+        _current_call.reset(token)
+        finish_call(metrics)
+        emit(metrics)
+
+
+def emit(metrics: CallMetrics):
+    event = asdict(metrics)
+    del event['started']
+    labels = (metrics.phase or 'none', metrics.provider, metrics.model or 'unknown')
+    with _write_lock:
+        update_aggregates(labels, metrics)
+        metrics_file = os.getenv('DRAVID_METRICS_FILE')
+        if metrics_file:
+            with open(metrics_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(event) + '\n')
+        prometheus_file = os.getenv('DRAVID_PROMETHEUS_FILE')
+        if prometheus_file:
+            write_prometheus(prometheus_file)
+
+
+def observe(histogram, value: float):
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if value <= bound:
+            histogram[i] += 1
+            return
+    histogram[-1] += 1
+
+
+def update_aggregates(labels, metrics: CallMetrics):
+    totals = _aggregates[labels]
+    totals['calls'] += 1
+    totals['errors'] += 1 if metrics.error else 0
+    totals['cache_hits'] += 1 if metrics.cache_hit else 0
+    totals['dedup_hits'] += 1 if metrics.dedup_hit else 0
+    totals['input_tokens'] += metrics.input_tokens + \
+        metrics.cache_creation_input_tokens + metrics.cache_read_input_tokens
+    totals['output_tokens'] += metrics.output_tokens
+    totals['continuations'] += metrics.continuations
+    totals['retries'] += metrics.retries
+    totals['cost'] += metrics.cost or 0
+    totals['latency'] += metrics.latency
+    observe(_latency_histograms[labels], metrics.latency)
+    if metrics.ttft is not None:
+        totals['ttft'] += metrics.ttft
+        totals['ttft_count'] += 1
+        observe(_ttft_histograms[labels], metrics.ttft)
+    totals['load_duration'] += metrics.load_duration or 0
+    totals['prompt_eval_duration'] += metrics.prompt_eval_duration or 0
+    totals['eval_duration'] += metrics.eval_duration or 0
+    if metrics.queue_wait is not None:
+        totals['queue_wait'] += metrics.queue_wait
+        observe(_queue_wait_histograms[labels], metrics.queue_wait)
+
+
+def get_aggregates() -> Dict[tuple, Dict[str, float]]:
+    with _write_lock:
+        return {labels: dict(totals) for labels, totals in _aggregates.items()}
+
+
+def get_phase_summary() -> Dict[str, Dict[str, Any]]:
+    summary = {}
+    for (phase, provider, model), totals in get_aggregates().items():
+        entry = summary.setdefault(phase, {
+            'calls': 0, 'errors': 0, 'cache_hits': 0, 'latency': 0.0, 'cost': 0.0,
+            'input_tokens': 0, 'output_tokens': 0, 'models': []})
+        for key in ('calls', 'errors', 'cache_hits', 'latency', 'cost', 'input_tokens', 'output_tokens'):
+            entry[key] += totals.get(key, 0)
+        entry['models'].append(f'{provider}/{model}')
+    for entry in summary.values():
+        entry['mean_latency'] = entry['latency'] / \
+            entry['calls'] if entry['calls'] else 0.0
+    return summary
+
+
+def format_phase_summary() -> List[str]:
+    lines = []
+    for phase, entry in sorted(get_phase_summary().items()):
+        lines.append(
+            f"{phase}: {entry['calls']:g} calls, mean latency {entry['mean_latency']:.2f}s, "
+            f"cost ${entry['cost']:.4f} ({', '.join(sorted(entry['models']))})")
+    return lines
+
+
+def reset_aggregates():
+    with _write_lock:
+        _aggregates.clear()
+        _latency_histograms.clear()
+        _ttft_histograms.clear()
+        _queue_wait_histograms.clear()
+
+
+def format_labels(labels) -> str:
+    phase, provider, model = labels
+    return f'phase="{phase}",provider="{provider}",model="{model}"'
+
+
+def format_histogram(name: str, histograms, sums) -> list:
+    lines = [f'# TYPE {name} histogram']
+    for labels, counts in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, counts):
+            cumulative += count
+            lines.append(
+                f'{name}_bucket{{{format_labels(labels)},le="{bound}"}} {cumulative}')
+        cumulative += counts[-1]
+        lines.append(
+            f'{name}_bucket{{{format_labels(labels)},le="+Inf"}} {cumulative}')
+        lines.append(f'{name}_sum{{{format_labels(labels)}}} {sums[labels]}')
+        lines.append(f'{name}_count{{{format_labels(labels)}}} {cumulative}')
+    return lines
+
+
+def write_prometheus(path: str):
+    counters = (
+        ('dravid_llm_calls_total', 'calls'),
+        ('dravid_llm_errors_total', 'errors'),
+        ('dravid_llm_cache_hits_total', 'cache_hits'),
+        ('dravid_llm_dedup_hits_total', 'dedup_hits'),
+        ('dravid_llm_input_tokens_total', 'input_tokens'),
+        ('dravid_llm_output_tokens_total', 'output_tokens'),
+        ('dravid_llm_continuations_total', 'continuations'),
+        ('dravid_llm_retries_total', 'retries'),
+        ('dravid_llm_cost_usd_total', 'cost'),
+        ('dravid_llm_load_seconds_total', 'load_duration'),
+        ('dravid_llm_prompt_eval_seconds_total', 'prompt_eval_duration'),
+        ('dravid_llm_eval_seconds_total', 'eval_duration'),
+    )
+    lines = []
+    for name, key in counters:
+        lines.append(f'# TYPE {name} counter')
+        for labels, totals in sorted(_aggregates.items()):
+            lines.append(f'{name}{{{format_labels(labels)}}} {totals[key]:g}')
+    lines += format_histogram('dravid_llm_latency_seconds', _latency_histograms,
+                              {labels: totals['latency'] for labels, totals in _aggregates.items()})
+    lines += format_histogram('dravid_llm_ttft_seconds', _ttft_histograms,
+                              {labels: totals['ttft'] for labels, totals in _aggregates.items()})
+    lines += format_histogram('dravid_llm_queue_wait_seconds', _queue_wait_histograms,
+                              {labels: totals['queue_wait'] for labels, totals in _aggregates.items()})
+    # write then rename so a scraper never reads a half-written file
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
@@ -0,0 +1,292 @@
+import os
+import socket
+import asyncio
+import threading
+import weakref
+import itertools
+import contextvars
+from contextlib import contextmanager
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from typing import Any, Callable, Dict, Iterator, Optional
+from .cassette import get_cassette, CassetteSession, cassette_async_post
+from .deadline import httpx_timeout
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_ASYNC_POOL_SIZE = 100
+ASYNC_POOL_SHARD_SIZE = 10
+
+_session = None
+_session_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+_cancel_scope = contextvars.ContextVar('dravid_cancel_scope', default=None)
+
+
+class RequestCancelled(Exception):
+    pass
+
+
+class CancelScope:
+    # Lets another thread abort the requests made inside the scope, also one
+    # still waiting for its response headers: closing a stream only takes
+    # effect once its reader wakes up, shutting the socket down wakes it.
+    def __init__(self):
+        self.cancelled = False
+        self._closers = []
+        self._lock = threading.Lock()
+
+    def add(self, closer):
+        with self._lock:
+            if not self.cancelled:
+                self._closers.append(closer)
+                return
+        closer()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            closers, self._closers = self._closers, []
+        for closer in closers:
+            try:
+                closer()
+            except Exception:
+                pass
+
+
+@contextmanager
+def cancel_scope(scope: CancelScope):
+    token = _cancel_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _cancel_scope.reset(token)
+
+
+def on_cancel(closer: Callable[[], Any]):
+    scope = _cancel_scope.get()
+    if scope is not None:
+        scope.add(closer)
+
+
+def is_cancelled() -> bool:
+    scope = _cancel_scope.get()
+    return scope is not None and scope.cancelled
+
+
+def abort_httpx_response(response: httpx.Response):
+    # an HTTP/2 connection carries other streams, only this one is reset
+    network_stream = response.extensions.get('network_stream')
+    sock = network_stream.get_extra_info('socket') if network_stream is not None else None
+    if sock is None or response.http_version != 'HTTP/1.1':
+        response.close()
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class CancellableConnectionMixin:
+    def request(self, *args, **kwargs):
+        if is_cancelled():
+            raise RequestCancelled("The request was cancelled")
+        on_cancel(self.shutdown)
+        return super().request(*args, **kwargs)
+
+    def shutdown(self):
+        sock = self.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class CancellableHTTPConnection(CancellableConnectionMixin, HTTPConnection):
+    pass
+
+
+class CancellableHTTPSConnection(CancellableConnectionMixin, HTTPSConnection):
+    pass
+
+
+class CancellableHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = CancellableHTTPConnection
+
+
+class CancellableHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = CancellableHTTPSConnection
+
+
+class CancellableHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': CancellableHTTPConnectionPool,
+            'https': CancellableHTTPSConnectionPool,
+        }
+
+
+def get_pool_size() -> int:
+    try:
+        return max(1, int(os.getenv('DRAVID_HTTP_POOL_SIZE', DEFAULT_POOL_SIZE)))
+    except ValueError:
+        return DEFAULT_POOL_SIZE
+
+
+def get_async_pool_size() -> int:
+    try:
+        return max(1, int(os.getenv('DRAVID_ASYNC_POOL_SIZE', DEFAULT_ASYNC_POOL_SIZE)))
+    except ValueError:
+        return DEFAULT_ASYNC_POOL_SIZE
+
+
+def is_http2_enabled() -> bool:
+    return os.getenv('DRAVID_HTTP2', '').lower() in ('1', 'true', 'yes')
+
+
+class HttpxResponse:
+    # Gives an httpx response the subset of the requests.Response interface
+    # the API modules rely on, so callers don't care which client is active.
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            self._response.read()
+            raise requests.HTTPError(
+                f"{self.status_code} Error for url: {self._response.url}", response=self)
+
+    @property
+    def text(self) -> str:
+        return self._response.text
+
+    def json(self) -> Any:
+        return self._response.json()
+
+    def iter_content(self, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        return self._response.iter_bytes(chunk_size)
+
+    def iter_lines(self) -> Iterator[bytes]:
+        for line in self._response.iter_lines():
+            yield line.encode('utf-8')
+
+    def close(self):
+        self._response.close()
+
+
+class Http2Session:
+    def __init__(self, pool_size: int):
+        self._client = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_connections=pool_size,
+                                max_keepalive_connections=pool_size),
+            timeout=None
+        )
+
+    def post(self, url: str, json: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None,
+             stream: bool = False, timeout: Any = None) -> HttpxResponse:
+        if isinstance(timeout, tuple):
+            # requests' (connect, read) form
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        request = self._client.build_request(
+            'POST', url, json=json, headers=headers, timeout=timeout)
+        if is_cancelled():
+            raise RequestCancelled("The request was cancelled")
+        response = HttpxResponse(self._client.send(request, stream=stream))
+        on_cancel(response.close)
+        return response
+
+    def close(self):
+        self._client.close()
+
+
+def create_session():
+    pool_size = get_pool_size()
+    if is_http2_enabled() and has_h2():
+        return Http2Session(pool_size)
+
+    session = requests.Session()
+    adapter = CancellableHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Connection'] = 'keep-alive'
+    return session
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+                cassette = get_cassette()
+                if cassette is not None:
+                    _session = CassetteSession(_session, cassette)
+    return _session
+
+
+def reset_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def has_h2() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_async_http_client():
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        # httpcore scans its whole pool on every request, so one big pool
+        # slows down as fan-out grows; several small pools stay flat.
+        shard_size = min(ASYNC_POOL_SHARD_SIZE, get_async_pool_size())
+        http2 = is_http2_enabled() and has_h2()
+        clients = [
+            httpx.AsyncClient(
+                http2=http2,
+                limits=httpx.Limits(max_connections=shard_size,
+                                    max_keepalive_connections=shard_size),
+                timeout=None
+            )
+            for _ in range(max(1, get_async_pool_size() // shard_size))
+        ]
+        _async_clients[loop] = (clients, itertools.count())
+    clients, counter = _async_clients[loop]
+    return clients[next(counter) % len(clients)]
+
+
+async def async_post(url: str, json: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None,
+                     on_response: Optional[Callable[[int, Any], None]] = None) -> HttpxResponse:
+    timeout = httpx_timeout()
+    cassette = get_cassette()
+    if cassette is not None:
+        response = await cassette_async_post(
+            cassette, lambda *args, **kwargs: get_async_http_client().post(*args, timeout=timeout, **kwargs),
+            url, json, headers)
+    else:
+        response = HttpxResponse(await get_async_http_client().post(
+            url, json=json, headers=headers, timeout=timeout))
+    if on_response is not None:
+        on_response(response.status_code, response.headers)
+    response.raise_for_status()
+    return response
+
+
+async def close_async_http_client():
+    clients, _ = _async_clients.pop(
+        asyncio.get_running_loop(), ([], None))
+    for client in clients:
+        await client.aclose()
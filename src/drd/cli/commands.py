@@ -10,6 +10,7 @@ from .monitor import run_dev_server_with_monitoring
 from ..metadata.initializer import initialize_project_metadata
 from ..metadata.updater import update_metadata_with_dravid
 from ..utils.utils import print_error
+from ..api.main import warm_up_provider
 from .ask_handler import handle_ask_command
 
 VERSION = "0.13.9"  # Update this as you release new versions
@@ -43,6 +44,9 @@ def dravid_cli_logic(command, do, image, debug, meta_add, meta_init, ask, file,
         click.echo(f"Dravid CLI version {VERSION}")
         return
 
+    if meta_add or meta_init or ask or file or do is not None:
+        warm_up_provider()
+
     if meta_add:
         update_metadata_with_dravid(meta_add, os.getcwd())
     elif meta_init:
@@ -13,7 +13,7 @@ load_dotenv()
 @click.command()
 @click.argument('command', required=False)
 @click.option('--do', help='Execute a query or instruction')
-@click.option('--image', '--img', type=click.Path(exists=True), help='Path to an image file to include with the query')
+@click.option('--image', '--img', type=click.Path(exists=True), multiple=True, help='Path to an image file to include with the query (can be repeated)')
 @click.option('--debug', is_flag=True, help='Print more information on how this coding assistant executes your instruction')
 @click.option('--meta-add', '--a', help='Update metadata based on the provided description')
 @click.option('--meta-init', '--i', is_flag=True, help='Initialize project metadata')
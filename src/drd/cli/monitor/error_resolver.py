@@ -1,5 +1,8 @@
 import traceback
 from ...api.main import call_dravid_api
+from ...api.claude_api import prompt_cache_prefix
+from ...api.phases import phase_scope, ERROR_FIX
+from ...api.deadline import deadline_scope, DeadlineExceeded, FIX
 from ...utils.step_executor import Executor
 from ...utils.utils import print_error, print_success, print_info, print_prompt
 from ...utils.loader import run_with_loader
@@ -9,9 +12,7 @@ from ...utils.file_utils import get_file_content
 from ...utils.input import confirm_with_user
 
 
-def monitoring_handle_error_with_dravid(error, line, monitor):
-    print_error(f"Error detected: {error}")
-
+def request_fix_commands(error, line, monitor):
     error_message = str(error)
     error_type = type(error).__name__
     error_trace = ''.join(traceback.format_exception(
@@ -21,10 +22,11 @@ def monitoring_handle_error_with_dravid(error, line, monitor):
 
     print_info("Identifying relevant files for error context...")
     error_details = f"error_msg: {error_message}, error_type: {error_type}, error_trace: {error_trace}"
-    files_to_check = run_with_loader(
-        lambda: get_files_to_modify(error_details, project_context),
-        "Analyzing project files"
-    )
+    with prompt_cache_prefix(project_context):
+        files_to_check = run_with_loader(
+            lambda: get_files_to_modify(error_details, project_context),
+            "Analyzing project files"
+        )
 
     print_info(f"Found {len(files_to_check)} potentially relevant files.")
 
@@ -46,9 +48,24 @@ def monitoring_handle_error_with_dravid(error, line, monitor):
 
     print_info("🔍 Sending error information to Dravid for analysis...")
     try:
-        commands = call_dravid_api(error_query, include_context=True)
+        with prompt_cache_prefix(project_context), phase_scope(ERROR_FIX):
+            commands = call_dravid_api(error_query, include_context=True)
     except ValueError as e:
         print_error(f"Error parsing dravid's response: {str(e)}")
+        return None
+    return commands
+
+
+def monitoring_handle_error_with_dravid(error, line, monitor):
+    print_error(f"Error detected: {error}")
+
+    try:
+        with deadline_scope(FIX):
+            commands = request_fix_commands(error, line, monitor)
+    except DeadlineExceeded as e:
+        print_error(f"Gave up on the fix: {e}. Raise DRAVID_DEADLINE_FIX to allow more time.")
+        return False
+    if commands is None:
         return False
 
     requires_restart = False
@@ -1,6 +1,7 @@
 import traceback
 import click
 from ...api.main import call_dravid_api
+from ...api.phases import phase_scope, ERROR_FIX
 import xml.etree.ElementTree as ET
 from ...utils import print_error, print_success, print_info, print_step, print_debug
 from ...metadata.common_utils import generate_file_description
@@ -9,7 +10,9 @@ from ...prompts.error_resolution_prompt import get_error_resolution_prompt
 
 def execute_commands(commands, executor, metadata_manager, is_fix=False, debug=False):
     all_outputs = []
-    total_steps = len(commands)
+    # steps consumed while the response streams in have no total yet
+    total_steps = len(commands) if hasattr(commands, '__len__') else '?'
+    i = 0
 
     for i, cmd in enumerate(commands, 1):
         step_description = "fix" if is_fix else "command"
@@ -47,7 +50,7 @@ def execute_commands(commands, executor, metadata_manager, is_fix=False, debug=F
         if debug:
             print_debug(f"Completed step {i}/{total_steps}")
 
-    return True, total_steps, None, "\n".join(all_outputs)
+    return True, i, None, "\n".join(all_outputs)
 
 
 def handle_shell_command(cmd, executor):
@@ -172,8 +175,9 @@ def handle_error_with_dravid(error, cmd, executor, metadata_manager, depth=0, pr
         "🏏 Sending error information to dravid for analysis(1 LLM call)...\n")
 
     try:
-        fix_commands = call_dravid_api(
-            error_query, include_context=True)
+        with phase_scope(ERROR_FIX):
+            fix_commands = call_dravid_api(
+                error_query, include_context=True)
     except ValueError as e:
         print_error(f"Error parsing dravid's response: {str(e)}")
         return False
@@ -1,5 +1,6 @@
 import os
 from ...api import call_dravid_api_with_pagination
+from ...api.phases import phase_scope, FILE_IDENTIFICATION
 from ...utils import print_error, print_info
 from ...metadata.project_metadata import ProjectMetadataManager
 from ...prompts.file_operations import get_files_to_modify_prompt, find_file_prompt
@@ -8,8 +9,9 @@ from ...utils.parser import parse_file_list_response,  parse_find_file_response
 
 def get_files_to_modify(query, project_context):
     file_query = get_files_to_modify_prompt(query, project_context)
-    response = call_dravid_api_with_pagination(
-        file_query, include_context=True)
+    with phase_scope(FILE_IDENTIFICATION):
+        response = call_dravid_api_with_pagination(
+            file_query, include_context=True)
     return parse_file_list_response(response)
 
 
@@ -24,7 +26,8 @@ def find_file_with_dravid(filename, project_context, max_retries=2, current_retr
     project_metadata = metadata_manager.get_project_context()
     query = find_file_prompt(filename, project_context, project_metadata)
 
-    response = call_dravid_api_with_pagination(query, include_context=True)
+    with phase_scope(FILE_IDENTIFICATION):
+        response = call_dravid_api_with_pagination(query, include_context=True)
     suggested_file = parse_find_file_response(response)
 
     if suggested_file:
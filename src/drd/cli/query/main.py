@@ -1,12 +1,25 @@
+import os
 import click
-from ...api.main import stream_dravid_api, call_dravid_vision_api
+from ...api.main import stream_dravid_api, stream_dravid_vision_api, stream_dravid_commands, stream_dravid_vision_commands
+from ...api.claude_api import prompt_cache_prefix, get_prompt_cache_usage
+from ...api.phases import phase_scope, MAIN_QUERY
+from ...api.deadline import deadline_scope, DeadlineExceeded, DO
+from ...api.retry import get_retry_stats
+from ...api.singleflight import get_dedup_stats
+from ...api.telemetry import format_phase_summary
+from ...api.hedging import get_hedge_stats
 from ...utils.step_executor import Executor
 from ...metadata.project_metadata import ProjectMetadataManager
 from .dynamic_command_handler import handle_error_with_dravid, execute_commands
 from ...utils import print_error, print_success, print_info, print_debug, print_warning, print_step, print_header, run_with_loader
 from ...utils.file_utils import get_file_content, fetch_project_guidelines, is_directory_empty
+from ...utils.image_utils import as_image_paths
 from .file_operations import get_files_to_modify
-from ...utils.parser import parse_dravid_response
+from ...utils.stream_parser import StreamParser
+
+
+def is_pipeline_enabled():
+    return os.getenv('DRAVID_PIPELINE', 'false').lower() in ('1', 'true', 'yes')
 
 
 def execute_dravid_command(query, image_path, debug, instruction_prompt, warn=None, reference_files=None):
@@ -22,83 +35,116 @@ def execute_dravid_command(query, image_path, debug, instruction_prompt, warn=No
 
     try:
         project_context = metadata_manager.get_project_context()
-
-        files_info = None
-        if project_context:
-            print_info("🔍 Identifying related files to the query...", indent=2)
-            print_info("(1 LLM call)", indent=4)
-            files_info = run_with_loader(
-                lambda: get_files_to_modify(query, project_context),
-                "Analyzing project files"
-            )
-
-            if debug:
-                print_info("Files and dependencies analysis:", indent=4)
-                if files_info['main_file']:
-                    print_info(
-                        f"Main file to modify: {files_info['main_file']}", indent=6)
-                print_info("Dependencies:", indent=6)
-                for dep in files_info['dependencies']:
-                    print_info(f"- {dep['file']}", indent=8)
-                    for imp in dep['imports']:
-                        print_info(f"  Imports: {imp}", indent=10)
-                print_info("New files to create:", indent=6)
-                for new_file in files_info['new_files']:
-                    print_info(f"- {new_file['file']}", indent=8)
-                print_info("File contents to load:", indent=6)
-                for file in files_info['file_contents_to_load']:
-                    print_info(f"- {file}", indent=8)
-
-        full_query = construct_full_query(
-            query, executor, project_context, files_info, reference_files)
-
-        print_info("💡 Preparing to send query to LLM...", indent=2)
-        if image_path:
-            print_info(f"Processing image: {image_path}", indent=4)
-            print_info("(1 LLM call)", indent=4)
-            commands = run_with_loader(
-                lambda: call_dravid_vision_api(
-                    full_query, image_path, include_context=True, instruction_prompt=instruction_prompt),
-                "Analyzing image and generating response"
-            )
-        else:
-            print_info("💬 Streaming response from LLM...", indent=2)
-            print_info("(1 LLM call)", indent=4)
-            xml_result = stream_dravid_api(
-                full_query, include_context=True, instruction_prompt=instruction_prompt, print_chunk=False)
-            commands = parse_dravid_response(xml_result)
+        with deadline_scope(DO), prompt_cache_prefix(project_context):
+            files_info = None
+            if project_context:
+                print_info("🔍 Identifying related files to the query...", indent=2)
+                print_info("(1 LLM call)", indent=4)
+                files_info = run_with_loader(
+                    lambda: get_files_to_modify(query, project_context),
+                    "Analyzing project files"
+                )
+
+                if debug:
+                    print_info("Files and dependencies analysis:", indent=4)
+                    if files_info['main_file']:
+                        print_info(
+                            f"Main file to modify: {files_info['main_file']}", indent=6)
+                    print_info("Dependencies:", indent=6)
+                    for dep in files_info['dependencies']:
+                        print_info(f"- {dep['file']}", indent=8)
+                        for imp in dep['imports']:
+                            print_info(f"  Imports: {imp}", indent=10)
+                    print_info("New files to create:", indent=6)
+                    for new_file in files_info['new_files']:
+                        print_info(f"- {new_file['file']}", indent=8)
+                    print_info("File contents to load:", indent=6)
+                    for file in files_info['file_contents_to_load']:
+                        print_info(f"- {file}", indent=8)
+
+            full_query = construct_full_query(
+                query, executor, project_context, files_info, reference_files)
+
+            print_info("💡 Preparing to send query to LLM...", indent=2)
+            # steps are parsed as they stream in, the response is not parsed again
+            parser = StreamParser()
+            pipeline = is_pipeline_enabled()
+            if image_path:
+                print_info(f"Processing image: {', '.join(as_image_paths(image_path))}", indent=4)
+                print_info("(1 LLM call)", indent=4)
+                with phase_scope(MAIN_QUERY):
+                    if pipeline:
+                        steps = stream_dravid_vision_commands(
+                            full_query, image_path, include_context=True, instruction_prompt=instruction_prompt, parser=parser)
+                    else:
+                        stream_dravid_vision_api(
+                            full_query, image_path, include_context=True, instruction_prompt=instruction_prompt, print_chunk=False, parser=parser)
+            else:
+                print_info("💬 Streaming response from LLM...", indent=2)
+                print_info("(1 LLM call)", indent=4)
+                with phase_scope(MAIN_QUERY):
+                    if pipeline:
+                        steps = stream_dravid_commands(
+                            full_query, include_context=True, instruction_prompt=instruction_prompt, parser=parser)
+                    else:
+                        stream_dravid_api(
+                            full_query, include_context=True, instruction_prompt=instruction_prompt, print_chunk=False, parser=parser)
+
+            if pipeline:
+                # each step runs as soon as it is complete, while the later
+                # ones are still being generated
+                success, step_completed, error_message, all_outputs = execute_commands(
+                    steps, executor, metadata_manager, debug=debug)
+                # after a failure the rest of the response is still needed
+                for _ in steps:
+                    pass
+                commands = parser.received
+            else:
+                commands = parser.close()
             if debug:
                 print_debug(f"Received {len(commands)} new command(s)")
 
-        if not commands:
-            print_error(
-                "Failed to parse LLM's response or no commands to execute.")
-            print_debug("Actual result: " + str(xml_result))
-            return
-
-        success, step_completed, error_message, all_outputs = execute_commands(
-            commands, executor, metadata_manager, debug=debug)
-
-        if not success:
-            print_error(
-                f"Failed to execute command at step {step_completed}.")
-            print_error(f"Error message: {error_message}")
-            print_info("Attempting to fix the error...")
-            if handle_error_with_dravid(Exception(error_message), commands[step_completed-1], executor, metadata_manager, debug=debug):
-                print_info(
-                    "Fix applied successfully. Continuing with the remaining commands.", indent=2)
-                remaining_commands = commands[step_completed:]
-                success, _, error_message, additional_outputs = execute_commands(
-                    remaining_commands, executor, metadata_manager, debug=debug)
-                all_outputs += "\n" + additional_outputs
-            else:
+            if not commands:
                 print_error(
-                    "Unable to fix the error. Skipping this command and continuing with the next.")
+                    "Failed to parse LLM's response or no commands to execute.")
+                return
 
-        print_info("Execution details:", indent=2)
-        click.echo(all_outputs)
+            if not pipeline:
+                success, step_completed, error_message, all_outputs = execute_commands(
+                    commands, executor, metadata_manager, debug=debug)
 
-        print_success("Dravid CLI Tool execution completed.")
+            if not success:
+                print_error(
+                    f"Failed to execute command at step {step_completed}.")
+                print_error(f"Error message: {error_message}")
+                print_info("Attempting to fix the error...")
+                if handle_error_with_dravid(Exception(error_message), commands[step_completed-1], executor, metadata_manager, debug=debug):
+                    print_info(
+                        "Fix applied successfully. Continuing with the remaining commands.", indent=2)
+                    remaining_commands = commands[step_completed:]
+                    success, _, error_message, additional_outputs = execute_commands(
+                        remaining_commands, executor, metadata_manager, debug=debug)
+                    all_outputs += "\n" + additional_outputs
+                else:
+                    print_error(
+                        "Unable to fix the error. Skipping this command and continuing with the next.")
+
+            print_info("Execution details:", indent=2)
+            click.echo(all_outputs)
+
+            print_success("Dravid CLI Tool execution completed.")
+            if debug:
+                usage = get_prompt_cache_usage()
+                print_debug(
+                    f"Prompt cache tokens - read: {usage['cache_read_input_tokens']}, written: {usage['cache_creation_input_tokens']}, uncached: {usage['input_tokens']}")
+                for provider, stats in get_retry_stats().items():
+                    print_debug(f"Retries ({provider}): {stats}")
+                print_debug(f"Deduplicated requests: {get_dedup_stats()['hits']}")
+                print_debug(f"Hedged streams: {get_hedge_stats()}")
+                for line in format_phase_summary():
+                    print_debug(line)
+    except DeadlineExceeded as e:
+        print_error(f"Gave up: {e}. Raise DRAVID_DEADLINE_DO to allow more time.")
     except Exception as e:
         print_error(f"An unexpected error occurred: {str(e)}")
         if debug:
@@ -1,6 +1,7 @@
 import os
 import re
 from ..api.main import call_dravid_api_with_pagination
+from ..api.phases import phase_scope, METADATA
 from ..utils.parser import extract_and_parse_xml
 from ..prompts.file_metada_desc_prompts import get_file_metadata_prompt
 from ..prompts.metadata_update_prompts import get_file_suggestion_prompt
@@ -78,8 +79,9 @@ def generate_file_description(filename, content, project_context, folder_structu
     print_info(
         f"Getting description of {filename} to update metadata for future reference")
     print_info("LLM calls to be made: 1")
-    response = call_dravid_api_with_pagination(
-        metadata_query, include_context=True)
+    with phase_scope(METADATA):
+        response = call_dravid_api_with_pagination(
+            metadata_query, include_context=True)
     try:
         root = extract_and_parse_xml(response)
 
@@ -6,11 +6,24 @@ from .project_metadata import ProjectMetadataManager
 from ..utils.utils import print_info, print_success, print_error, print_warning
 from ..utils.loader import Loader
 from ..api.main import call_dravid_api_with_pagination
+from ..api.phases import phase_scope, METADATA
+from ..api.deadline import deadline_scope, DeadlineExceeded, META_INIT
+from ..api.transport import close_async_http_client
+from ..api.telemetry import format_phase_summary
 from ..utils.parser import extract_and_parse_xml
 from ..prompts.get_project_info_prompts import get_project_info_prompt
 
 
 async def initialize_project_metadata(project_dir):
+    try:
+        with deadline_scope(META_INIT):
+            return await build_project_metadata(project_dir)
+    except DeadlineExceeded as e:
+        print_error(f"Gave up: {e}. Raise DRAVID_DEADLINE_META_INIT to allow more time.")
+        return None
+
+
+async def build_project_metadata(project_dir):
     print_info("Initializing project metadata...")
     builder = ProjectMetadataManager(project_dir)
 
@@ -25,7 +38,9 @@ async def initialize_project_metadata(project_dir):
     loader = Loader("Analyzing project structure")
     loader.start()
     try:
-        response = call_dravid_api_with_pagination(query, include_context=True)
+        with phase_scope(METADATA):
+            response = call_dravid_api_with_pagination(
+                query, include_context=True)
         root = extract_and_parse_xml(response)
         project_info = root.find('.//project_info')
         if project_info is None:
@@ -53,6 +68,8 @@ async def initialize_project_metadata(project_dir):
                     dir_desc = dir_elem.find('description').text.strip()
                     builder.metadata['directory_structure'][dir_name] = dir_desc
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print_warning(f"Error fetching project information: {str(e)}")
         print_warning("Continuing with default values.")
@@ -67,6 +84,7 @@ async def initialize_project_metadata(project_dir):
         metadata = await builder.build_metadata(loader)
     finally:
         loader.stop()
+        await close_async_http_client()
 
     # Save metadata to drd.json
     drd_path = os.path.join(project_dir, 'drd.json')
@@ -75,6 +93,8 @@ async def initialize_project_metadata(project_dir):
 
     print_success(
         f"Project metadata initialized successfully. Saved to {drd_path}")
+    for line in format_phase_summary():
+        print_info(line)
     print_info("Generated metadata:")
     print_info(json.dumps(metadata, indent=2))
 
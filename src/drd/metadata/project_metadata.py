@@ -1,13 +1,20 @@
 import os
 import json
+import asyncio
 from datetime import datetime
 import fnmatch
-import xml.etree.ElementTree as ET
 import mimetypes
 from ..prompts.file_metada_desc_prompts import get_file_metadata_prompt
-from ..api import call_dravid_api_with_pagination
+from ..api import async_call_dravid_api_with_pagination
+from ..api.phases import phase_scope, METADATA
+from ..api.deadline import DeadlineExceeded
+from ..utils.parser import extract_and_parse_xml
 from ..utils.utils import print_info, print_warning
 
+# Bounds how many files are read and queued at once; the scheduler decides
+# how many requests are actually in flight.
+MAX_CONCURRENT_ANALYSES = 200
+
 
 class ProjectMetadataManager:
     def __init__(self, project_dir):
@@ -149,10 +156,11 @@ class ProjectMetadataManager:
 
             prompt = get_file_metadata_prompt(rel_path, content, json.dumps(
                 self.metadata), json.dumps(self.metadata['directory_structure']))
-            response = call_dravid_api_with_pagination(
-                prompt, include_context=True)
+            with phase_scope(METADATA):
+                response = await async_call_dravid_api_with_pagination(
+                    prompt, include_context=True)
 
-            root = ET.fromstring(response)
+            root = extract_and_parse_xml(response)
             metadata = root.find('metadata')
 
             file_info = {
@@ -168,6 +176,8 @@ class ProjectMetadataManager:
                 for dep in dependencies.findall('dependency'):
                     self.metadata['external_dependencies'].append(dep.text)
 
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print_warning(f"Error analyzing file {file_path}: {str(e)}")
             file_info = {
@@ -184,18 +194,28 @@ class ProjectMetadataManager:
         total_files = sum([len(files) for root, _, files in os.walk(
             self.project_dir) if not self.should_ignore(root)])
         processed_files = 0
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_ANALYSES)
+
+        async def analyze(file_path):
+            nonlocal processed_files
+            async with semaphore:
+                file_info = await self.analyze_file(file_path)
+            processed_files += 1
+            loader.message = f"Analyzing files ({processed_files}/{total_files})"
+            return file_info
 
+        file_paths = []
         for root, _, files in os.walk(self.project_dir):
             if self.should_ignore(root):
                 continue
             for file in files:
                 file_path = os.path.join(root, file)
                 if not self.should_ignore(file_path):
-                    file_info = await self.analyze_file(file_path)
-                    if file_info:
-                        self.metadata['key_files'].append(file_info)
-                    processed_files += 1
-                    loader.message = f"Analyzing files ({processed_files}/{total_files})"
+                    file_paths.append(file_path)
+
+        for file_info in await asyncio.gather(*(analyze(path) for path in file_paths)):
+            if file_info:
+                self.metadata['key_files'].append(file_info)
 
         # Determine languages
         all_languages = set(file['type'] for file in self.metadata['key_files']
@@ -1,53 +1,23 @@
-import functools
-import sys
 import asyncio
-import time
-from ..api.main import call_dravid_api_with_pagination
+from ..api.main import async_call_dravid_api_with_pagination, get_provider_name
+from ..api.phases import phase_scope, METADATA
+from ..api.deadline import DeadlineExceeded
+from ..api.scheduler import get_scheduler
 from ..utils.parser import extract_and_parse_xml
 from ..prompts.file_metada_desc_prompts import get_file_metadata_prompt
 from ..utils.utils import print_info, print_error, print_success, print_warning
 
-MAX_CONCURRENT_REQUESTS = 10
-MAX_CALLS_PER_MINUTE = 100
-RATE_LIMIT_PERIOD = 60  # seconds
-
-
-class RateLimiter:
-    def __init__(self, max_calls, period):
-        self.max_calls = max_calls
-        self.period = period
-        self.calls = asyncio.Queue(maxsize=max_calls)
-        self.semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
-
-    async def acquire(self):
-        while True:
-            if self.calls.full():
-                oldest_call = await self.calls.get()
-                time_since_oldest_call = time.time() - oldest_call
-                if time_since_oldest_call < self.period:
-                    await asyncio.sleep(self.period - time_since_oldest_call)
-            await self.calls.put(time.time())
-            return
-
-
-rate_limiter = RateLimiter(MAX_CALLS_PER_MINUTE, RATE_LIMIT_PERIOD)
-
-
-def to_thread(func, *args, **kwargs):
-    if sys.version_info >= (3, 9):
-        return asyncio.to_thread(func, *args, **kwargs)
-    else:
-        loop = asyncio.get_event_loop()
-        return loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+# Bounds how many files wait on the scheduler at once; the scheduler decides
+# how many requests are actually in flight.
+MAX_PENDING_FILES = 200
 
 
 async def process_single_file(filename, content, project_context, folder_structure):
     metadata_query = get_file_metadata_prompt(
         filename, content, project_context, folder_structure)
     try:
-        async with rate_limiter.semaphore:
-            await rate_limiter.acquire()
-            response = await to_thread(call_dravid_api_with_pagination, metadata_query, include_context=True)
+        with phase_scope(METADATA):
+            response = await async_call_dravid_api_with_pagination(metadata_query, include_context=True)
         root = extract_and_parse_xml(response)
         type_elem = root.find('.//type')
         summary_elem = root.find('.//summary')
@@ -64,6 +34,8 @@ async def process_single_file(filename, content, project_context, folder_structu
         print_success(f"Processed: {filename}")
         # Added imports to return tuple
         return filename, file_type, summary, exports, imports
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print_error(f"Error processing {filename}: {e}")
         # Added empty string for imports in error case
@@ -76,17 +48,20 @@ async def process_files(files, project_context, folder_structure):
         f"Processing {total_files} files to construct metadata per file")
     print_info(f"LLM calls to be made: {total_files}")
 
-    async def process_batch(batch):
-        tasks = [process_single_file(filename, content, project_context, folder_structure)
-                 for filename, content in batch]
-        return await asyncio.gather(*tasks)
+    scheduler = get_scheduler(get_provider_name())
+    pending = asyncio.Semaphore(MAX_PENDING_FILES)
+    processed = 0
 
-    batch_size = MAX_CONCURRENT_REQUESTS
-    results = []
-    for i in range(0, total_files, batch_size):
-        batch = files[i:i+batch_size]
-        batch_results = await process_batch(batch)
-        results.extend(batch_results)
-        print_info(f"Progress: {len(results)}/{total_files} files processed")
+    async def process(filename, content):
+        nonlocal processed
+        async with pending:
+            result = await process_single_file(filename, content, project_context, folder_structure)
+        processed += 1
+        if processed % 10 == 0 or processed == total_files:
+            stats = scheduler.stats()
+            print_info(
+                f"Progress: {processed}/{total_files} files processed "
+                f"(queued: {stats['queue_depth']}, in flight: {stats['in_flight']})")
+        return result
 
-    return results
+    return list(await asyncio.gather(*(process(filename, content) for filename, content in files)))
@@ -1,7 +1,10 @@
 # File: prompts/error_resolution_prompts.py
 
 def get_error_resolution_prompt(previous_context, cmd, error_type, error_message, error_trace, project_context):
+    # the project context comes first so it can be cached across errors
     return f"""
+{project_context}
+
 # Error Context
 Previous context: {previous_context}
 
@@ -14,9 +17,6 @@ Error message: {error_message}
 Error trace:
 {error_trace}
 
-Project context:
-{project_context}
-
 # Instructions for dravid: Error Resolution Assistant
 Analyze the error above and provide steps to fix it. 
 This is being run in a monitoring thread, so don't suggest server starting commands like npm run dev.
@@ -1,7 +1,10 @@
 # File: prompts/error_resolution_prompt.py
 
 def get_error_resolution_prompt(error_type, error_message, error_trace, line, project_context, file_context=None):
+    # the project context comes first so it can be cached across errors
     return f"""
+    {project_context}
+
     # Error Context
     An error occurred while running the server:
     Error type: {error_type}
@@ -10,8 +13,6 @@ def get_error_resolution_prompt(error_type, error_message, error_trace, line, pr
     {error_trace}
     Relevant output line:
     {line}
-    Project context:
-    {project_context}
 
     File context: {file_context}
     # Instructions for dravid: Error Resolution Assistant
@@ -0,0 +1,511 @@
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import threading
+import itertools
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Optional, Tuple
+import click
+
+DEFAULT_RESPONSE = (
+    "<response><explanation>Fake LLM response</explanation><steps>"
+    "<step><type>shell</type><command>echo fake</command></step>"
+    "</steps></response>"
+)
+CHARS_PER_TOKEN = 4
+# characters sent per streamed delta, about what real providers send
+CHUNK_CHARS = 16
+DEFAULT_MODEL = 'fake-model'
+RATE_LIMIT_MESSAGE = "Rate limit exceeded (injected by the fake LLM server)"
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 429: 'Too Many Requests'}
+
+
+@dataclass
+class FakeLLMConfig:
+    # seconds before the first byte of every response
+    latency: float = 0.0
+    # output tokens generated per second; None sends everything at once
+    tokens_per_second: Optional[float] = None
+    # share of requests answered with a 429 regardless of the quota
+    error_rate: float = 0.0
+    # requests per minute before requests are answered with a 429
+    rpm: Optional[float] = None
+    retry_after: float = 1.0
+    # served in turn, one per request
+    responses: List[str] = field(default_factory=lambda: [DEFAULT_RESPONSE])
+    seed: Optional[int] = None
+
+
+@dataclass
+class FakeRequest:
+    method: str
+    path: str
+    headers: Dict[str, str]
+    body: Dict[str, Any]
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def split_text(text: str) -> List[str]:
+    return [text[i:i + CHUNK_CHARS] for i in range(0, len(text), CHUNK_CHARS)] or ['']
+
+
+def prompt_text(body: Dict[str, Any]) -> str:
+    parts = [body.get('prompt') or '', body.get('system') or '']
+    for message in body.get('messages') or []:
+        content = message.get('content') or ''
+        parts.append(content if isinstance(content, str) else json.dumps(content))
+    return ''.join(part if isinstance(part, str) else json.dumps(part) for part in parts)
+
+
+class RequestQuota:
+    # continuously refilled requests-per-minute bucket, like Anthropic's
+    def __init__(self, rpm: float):
+        self.rpm = rpm
+        self.level = rpm
+        self.updated = time.monotonic()
+
+    def take(self) -> Tuple[bool, float]:
+        now = time.monotonic()
+        self.level = min(self.rpm, self.level + (now - self.updated) * self.rpm / 60)
+        self.updated = now
+        if self.level < 1:
+            return False, (1 - self.level) * 60 / self.rpm
+        self.level -= 1
+        return True, 0.0
+
+
+class FakeLLMServer:
+    def __init__(self, config: Optional[FakeLLMConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        self.host = host
+        self.port = port
+        self.requests = []
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._writers = set()
+        self.configure(config or FakeLLMConfig())
+
+    def configure(self, config: Optional[FakeLLMConfig] = None, **changes) -> FakeLLMConfig:
+        # takes effect from the next request, also while the server is running
+        config = replace(config or self.config, **changes)
+        with self._lock:
+            self.config = config
+            self._responses = itertools.cycle(config.responses)
+            self._random = random.Random(config.seed)
+            self._quota = RequestQuota(config.rpm) if config.rpm else None
+        return config
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def env(self) -> Dict[str, str]:
+        # environment that points every provider at this server
+        return {
+            'CLAUDE_API_URL': f"{self.url}/v1/messages",
+            'OPENAI_BASE_URL': f"{self.url}/v1",
+            'DRAVID_LLM_ENDPOINT': f"{self.url}/v1",
+            'OLLAMA_HOST': self.url,
+        }
+
+    def request_count(self, path: Optional[str] = None) -> int:
+        with self._lock:
+            return sum(1 for request in self.requests if path is None or request.path == path)
+
+    def next_response(self) -> str:
+        with self._lock:
+            return next(self._responses)
+
+    def check_rate_limit(self) -> Optional[float]:
+        # seconds to wait when the request is rejected, None when admitted
+        with self._lock:
+            if self.config.error_rate and self._random.random() < self.config.error_rate:
+                self.rate_limited += 1
+                return self.config.retry_after
+            if self._quota is not None:
+                allowed, wait = self._quota.take()
+                if not allowed:
+                    self.rate_limited += 1
+                    return max(wait, self.config.retry_after)
+        return None
+
+    def rate_limit_headers(self) -> Dict[str, str]:
+        if self._quota is None:
+            return {}
+        limit, remaining = str(int(self._quota.rpm)), str(int(self._quota.level))
+        return {
+            'anthropic-ratelimit-requests-limit': limit,
+            'anthropic-ratelimit-requests-remaining': remaining,
+            'x-ratelimit-limit-requests': limit,
+            'x-ratelimit-remaining-requests': remaining,
+        }
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                with self._lock:
+                    self.requests.append(request)
+                await self.respond(request, writer)
+                if request.headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def respond(self, request: FakeRequest, writer: asyncio.StreamWriter):
+        handler = find_handler(request.path)
+        if handler is None:
+            await send_json(writer, 404, {'error': f"Unknown path {request.path}"})
+            return
+
+        if self.config.latency:
+            await asyncio.sleep(self.config.latency)
+        retry_after = self.check_rate_limit()
+        headers = self.rate_limit_headers()
+        if retry_after is not None:
+            headers['retry-after'] = str(math.ceil(retry_after))
+            headers['retry-after-ms'] = str(int(retry_after * 1000))
+            await send_json(writer, 429, handler.error_body(RATE_LIMIT_MESSAGE), headers)
+            return
+
+        text = '' if handler.load_only(request.body) else self.next_response()
+        chunks = split_text(text)
+        delay = None
+        if self.config.tokens_per_second:
+            delay = CHUNK_CHARS / CHARS_PER_TOKEN / self.config.tokens_per_second
+        exchange = handler(request, text)
+        if not exchange.streaming:
+            if delay:
+                await asyncio.sleep(delay * len(chunks))
+            await send_json(writer, 200, exchange.body(), headers)
+            return
+
+        await send_stream_head(writer, exchange.content_type, headers)
+        for event in exchange.head():
+            await send_chunk(writer, event)
+        for chunk in chunks:
+            if delay:
+                await asyncio.sleep(delay)
+            await send_chunk(writer, exchange.delta(chunk))
+        for event in exchange.tail():
+            await send_chunk(writer, event)
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    def start(self) -> 'FakeLLMServer':
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self.handle_connection, self.host, self.port, backlog=1024))
+            self.port = self._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        if not ready.wait(10):
+            raise RuntimeError("Fake LLM server did not start")
+        return self
+
+    async def shutdown(self):
+        self._server.close()
+        # connections clients keep alive are still waiting for a request
+        for writer in list(self._writers):
+            writer.close()
+        # and some may still be sleeping out the configured latency
+        handlers = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in handlers:
+            task.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+    def stop(self):
+        if self._loop is not None and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.shutdown(), self._loop).result(5)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(5)
+
+    def serve_forever(self):
+        try:
+            self._thread.join()
+        except KeyboardInterrupt:
+            self.stop()
+
+    def __enter__(self) -> 'FakeLLMServer':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class Exchange:
+    content_type = 'text/event-stream'
+
+    def __init__(self, request: FakeRequest, text: str):
+        self.request = request
+        self.text = text
+        self.model = request.body.get('model') or DEFAULT_MODEL
+        self.streaming = bool(request.body.get('stream', False))
+        self.input_tokens = estimate_tokens(prompt_text(request.body))
+        self.output_tokens = estimate_tokens(text)
+
+    @staticmethod
+    def error_body(message: str) -> Dict[str, Any]:
+        return {'error': message}
+
+    @staticmethod
+    def load_only(body: Dict[str, Any]) -> bool:
+        return False
+
+    def head(self) -> List[bytes]:
+        return []
+
+    def tail(self) -> List[bytes]:
+        return []
+
+
+def sse(event: Optional[str], payload: Any) -> bytes:
+    data = payload if isinstance(payload, str) else json.dumps(payload)
+    prefix = f"event: {event}\n" if event else ''
+    return f"{prefix}data: {data}\n\n".encode('utf-8')
+
+
+class AnthropicHandler(Exchange):
+    @staticmethod
+    def error_body(message: str) -> Dict[str, Any]:
+        return {'type': 'error', 'error': {'type': 'rate_limit_error', 'message': message}}
+
+    def body(self) -> Dict[str, Any]:
+        return {
+            'id': f"msg_{uuid.uuid4().hex}", 'type': 'message', 'role': 'assistant', 'model': self.model,
+            'content': [{'type': 'text', 'text': self.text}],
+            'stop_reason': 'end_turn', 'stop_sequence': None,
+            'usage': {'input_tokens': self.input_tokens, 'output_tokens': self.output_tokens},
+        }
+
+    def head(self) -> List[bytes]:
+        message = dict(self.body(), content=[], stop_reason=None,
+                       usage={'input_tokens': self.input_tokens, 'output_tokens': 1})
+        return [
+            sse('message_start', {'type': 'message_start', 'message': message}),
+            sse('content_block_start', {'type': 'content_block_start', 'index': 0,
+                                        'content_block': {'type': 'text', 'text': ''}}),
+            sse('ping', {'type': 'ping'}),
+        ]
+
+    def delta(self, chunk: str) -> bytes:
+        return sse('content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                           'delta': {'type': 'text_delta', 'text': chunk}})
+
+    def tail(self) -> List[bytes]:
+        return [
+            sse('content_block_stop', {'type': 'content_block_stop', 'index': 0}),
+            sse('message_delta', {'type': 'message_delta',
+                                  'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+                                  'usage': {'output_tokens': self.output_tokens}}),
+            sse('message_stop', {'type': 'message_stop'}),
+        ]
+
+
+class OpenAIHandler(Exchange):
+    def __init__(self, request: FakeRequest, text: str):
+        super().__init__(request, text)
+        self.id = f"chatcmpl-{uuid.uuid4().hex}"
+        self.created = int(time.time())
+
+    @staticmethod
+    def error_body(message: str) -> Dict[str, Any]:
+        return {'error': {'message': message, 'type': 'rate_limit_error', 'code': 'rate_limit_exceeded'}}
+
+    def usage(self) -> Dict[str, int]:
+        return {'prompt_tokens': self.input_tokens, 'completion_tokens': self.output_tokens,
+                'total_tokens': self.input_tokens + self.output_tokens}
+
+    def body(self) -> Dict[str, Any]:
+        return {
+            'id': self.id, 'object': 'chat.completion', 'created': self.created, 'model': self.model,
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': self.text}}],
+            'usage': self.usage(),
+        }
+
+    def chunk(self, delta: Dict[str, Any], finish_reason: Optional[str] = None) -> Dict[str, Any]:
+        return {'id': self.id, 'object': 'chat.completion.chunk', 'created': self.created, 'model': self.model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+
+    def head(self) -> List[bytes]:
+        return [sse(None, self.chunk({'role': 'assistant', 'content': ''}))]
+
+    def delta(self, chunk: str) -> bytes:
+        return sse(None, self.chunk({'content': chunk}))
+
+    def tail(self) -> List[bytes]:
+        events = [sse(None, self.chunk({}, 'stop'))]
+        if (self.request.body.get('stream_options') or {}).get('include_usage'):
+            events.append(sse(None, dict(self.chunk({}), choices=[], usage=self.usage())))
+        return events + [sse(None, '[DONE]')]
+
+
+class OllamaChatHandler(Exchange):
+    content_type = 'application/x-ndjson'
+
+    def __init__(self, request: FakeRequest, text: str):
+        super().__init__(request, text)
+        # Ollama streams unless told otherwise
+        self.streaming = bool(request.body.get('stream', True))
+
+    @staticmethod
+    def load_only(body: Dict[str, Any]) -> bool:
+        # a chat request without messages only loads the model
+        return 'messages' in body and not body['messages']
+
+    def message(self, content: str) -> Dict[str, Any]:
+        return {'message': {'role': 'assistant', 'content': content}}
+
+    def line(self, payload: Dict[str, Any]) -> bytes:
+        return (json.dumps(payload) + '\n').encode('utf-8')
+
+    def base(self) -> Dict[str, Any]:
+        return {'model': self.model, 'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+
+    def final(self, content: str = '') -> Dict[str, Any]:
+        load_only = self.load_only(self.request.body)
+        final = dict(self.base(), **self.message(content), done=True, done_reason='load' if load_only else 'stop')
+        if not load_only:
+            final.update(prompt_eval_count=self.input_tokens, eval_count=self.output_tokens,
+                         load_duration=1_000_000, prompt_eval_duration=self.input_tokens * 100_000,
+                         eval_duration=self.output_tokens * 10_000_000,
+                         total_duration=1_000_000 + self.input_tokens * 100_000 + self.output_tokens * 10_000_000)
+        return final
+
+    def body(self) -> Dict[str, Any]:
+        return self.final(self.text)
+
+    def delta(self, chunk: str) -> bytes:
+        if not chunk:
+            return b''
+        return self.line(dict(self.base(), **self.message(chunk), done=False))
+
+    def tail(self) -> List[bytes]:
+        return [self.line(self.final())]
+
+
+class OllamaGenerateHandler(OllamaChatHandler):
+    def message(self, content: str) -> Dict[str, Any]:
+        return {'response': content}
+
+
+# matched on the end of the path, so that e.g. Azure's
+# /openai/deployments/<name>/chat/completions is served too
+ROUTES = {
+    '/v1/messages': AnthropicHandler,
+    '/chat/completions': OpenAIHandler,
+    '/api/chat': OllamaChatHandler,
+    '/api/generate': OllamaGenerateHandler,
+}
+
+
+def find_handler(path: str) -> Optional[type]:
+    path = path.split('?', 1)[0].rstrip('/')
+    for suffix, handler in ROUTES.items():
+        if path.endswith(suffix):
+            return handler
+    return None
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[FakeRequest]:
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError:
+        return None
+    request_line, *header_lines = head.decode('latin-1').split('\r\n')
+    method, path, _ = request_line.split(' ', 2)
+    headers = {}
+    for line in header_lines:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    raw = b''
+    if 'content-length' in headers:
+        raw = await reader.readexactly(int(headers['content-length']))
+    try:
+        body = json.loads(raw) if raw else {}
+    except ValueError:
+        body = {}
+    return FakeRequest(method, path, headers, body if isinstance(body, dict) else {})
+
+
+def format_head(status: int, headers: Dict[str, str]) -> bytes:
+    lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def send_json(writer: asyncio.StreamWriter, status: int, payload: Any, headers: Optional[Dict[str, str]] = None):
+    body = json.dumps(payload).encode('utf-8')
+    head = dict(headers or {}, **{'content-type': 'application/json', 'content-length': str(len(body))})
+    writer.write(format_head(status, head) + body)
+    await writer.drain()
+
+
+async def send_stream_head(writer: asyncio.StreamWriter, content_type: str, headers: Dict[str, str]):
+    writer.write(format_head(200, dict(headers, **{'content-type': content_type, 'transfer-encoding': 'chunked'})))
+    await writer.drain()
+
+
+async def send_chunk(writer: asyncio.StreamWriter, data: bytes):
+    # an empty chunk would end the response
+    if not data:
+        return
+    writer.write(f"{len(data):x}\r\n".encode() + data + b'\r\n')
+    await writer.drain()
+
+
+def start_fake_llm_server(config: Optional[FakeLLMConfig] = None, host: str = '127.0.0.1', port: int = 0) -> FakeLLMServer:
+    return FakeLLMServer(config, host, port).start()
+
+
+@click.command()
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', default=8765, show_default=True, type=int)
+@click.option('--latency', default=0.0, show_default=True, type=float, help='Seconds before the first byte')
+@click.option('--tokens-per-second', type=float, help='Output throughput; unlimited when omitted')
+@click.option('--error-rate', default=0.0, show_default=True, type=float, help='Share of requests answered with 429')
+@click.option('--rpm', type=float, help='Requests per minute before answering with 429')
+@click.option('--retry-after', default=1.0, show_default=True, type=float)
+@click.option('--response-file', type=click.Path(exists=True), multiple=True,
+              help='File holding a scripted response; repeat to serve several in turn')
+@click.option('--seed', type=int, help='Seed for the injected errors')
+def main(host, port, latency, tokens_per_second, error_rate, rpm, retry_after, response_file, seed):
+    responses = []
+    for path in response_file:
+        with open(path) as f:
+            responses.append(f.read())
+    config = FakeLLMConfig(latency=latency, tokens_per_second=tokens_per_second, error_rate=error_rate,
+                           rpm=rpm, retry_after=retry_after, responses=responses or [DEFAULT_RESPONSE], seed=seed)
+    server = start_fake_llm_server(config, host, port)
+    click.echo(f"Fake LLM server listening on {server.url}")
+    for name, value in server.env().items():
+        click.echo(f"export {name}={value}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+import io
+import os
+import json
+import base64
+import hashlib
+import mimetypes
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional, Sequence, Union
+from .file_utils import clean_path
+from .utils import print_warning
+
+# Claude downsizes anything with a longer edge than this before the model
+# sees it, so larger images only cost upload time and latency.
+DEFAULT_MAX_EDGE = 1568
+DEFAULT_QUALITY = 85
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+MAX_WORKERS = 4
+
+MAGIC_NUMBERS = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+
+_cache = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+_warned_missing_pillow = False
+
+
+class PreparedImage(NamedTuple):
+    mime_type: str
+    data: str
+    original_size: int
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+
+def has_pillow() -> bool:
+    try:
+        import PIL  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_max_edge() -> int:
+    try:
+        return max(1, int(os.getenv('DRAVID_IMAGE_MAX_EDGE', DEFAULT_MAX_EDGE)))
+    except ValueError:
+        return DEFAULT_MAX_EDGE
+
+
+def get_quality() -> int:
+    try:
+        return min(100, max(1, int(os.getenv('DRAVID_IMAGE_QUALITY', DEFAULT_QUALITY))))
+    except ValueError:
+        return DEFAULT_QUALITY
+
+
+def guess_mime_type(path: str, content: bytes) -> Optional[str]:
+    for magic, mime_type in MAGIC_NUMBERS:
+        if content.startswith(magic):
+            return mime_type
+    if content[:4] == b'RIFF' and content[8:12] == b'WEBP':
+        return 'image/webp'
+    return mimetypes.guess_type(path)[0]
+
+
+def warn_missing_pillow():
+    global _warned_missing_pillow
+    with _cache_lock:
+        if _warned_missing_pillow:
+            return
+        _warned_missing_pillow = True
+    print_warning("Pillow is not installed, so images are sent at full size. "
+                  "Install it with: pip install 'dravid[images]'")
+
+
+def has_webp() -> bool:
+    from PIL import features
+    return features.check('webp')
+
+
+def reencode(content: bytes, max_edge: int, quality: int):
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(content)) as image:
+        if getattr(image, 'is_animated', False):
+            return None
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_edge, max_edge), Image.BICUBIC)
+        output = io.BytesIO()
+        # lossy WebP is about half the size of a JPEG or PNG of the same
+        # screenshot, and keeps transparency; method 2 of 6 is the point
+        # past which encoding gets much slower for very little gain
+        if has_webp():
+            has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+            image.convert('RGBA' if has_alpha else 'RGB').save(
+                output, 'WEBP', quality=quality, method=2)
+            return 'image/webp', output.getvalue()
+        image.convert('RGB').save(output, 'JPEG', quality=quality, optimize=True)
+        return 'image/jpeg', output.getvalue()
+
+
+def encode_image(content: bytes, path: str, max_edge: int, quality: int) -> PreparedImage:
+    mime_type = guess_mime_type(path, content)
+    encoded = content
+    if has_pillow():
+        try:
+            result = reencode(content, max_edge, quality)
+        except (OSError, ValueError, KeyError):
+            # not something Pillow can decode; send it as it is
+            result = None
+        # a small screenshot can already be smaller as a PNG than as a JPEG
+        if result is not None and len(result[1]) < len(content):
+            mime_type, encoded = result
+    else:
+        warn_missing_pillow()
+    return PreparedImage(mime_type, base64.b64encode(encoded).decode('ascii'), len(content))
+
+
+def cache_image(key: str, image: PreparedImage):
+    global _cache_bytes
+    with _cache_lock:
+        if key in _cache:
+            return
+        _cache[key] = image
+        _cache_bytes += image.size
+        while _cache_bytes > MAX_CACHE_BYTES and len(_cache) > 1:
+            _, evicted = _cache.popitem(last=False)
+            _cache_bytes -= evicted.size
+
+
+def get_cached_image(key: str) -> Optional[PreparedImage]:
+    with _cache_lock:
+        image = _cache.get(key)
+        if image is not None:
+            _cache.move_to_end(key)
+        return image
+
+
+def clear_image_cache():
+    global _cache_bytes
+    with _cache_lock:
+        _cache.clear()
+        _cache_bytes = 0
+
+
+def make_image_key(image_path: str, max_edge: int, quality: int) -> str:
+    # a screenshot saved again under the same name changes its mtime, so the
+    # file only has to be read when it is not cached yet
+    stat = os.stat(image_path)
+    payload = json.dumps({
+        'image': os.path.abspath(image_path),
+        'mtime': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'max_edge': max_edge,
+        'quality': quality,
+        'pillow': has_pillow()
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_persisted_image(key: str) -> Optional[PreparedImage]:
+    from ..api.cache import get_response_cache
+    cache = get_response_cache()
+    if cache is None:
+        return None
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    try:
+        return PreparedImage(**json.loads(entry))
+    except (TypeError, ValueError):
+        return None
+
+
+def persist_image(key: str, image: PreparedImage):
+    from ..api.cache import get_response_cache
+    cache = get_response_cache()
+    if cache is not None:
+        cache.set(key, json.dumps(image._asdict()))
+
+
+def prepare_image(img_path: str) -> PreparedImage:
+    image_path = clean_path(img_path)
+    max_edge, quality = get_max_edge(), get_quality()
+    key = make_image_key(image_path, max_edge, quality)
+    image = get_cached_image(key)
+    if image is not None:
+        return image
+    image = get_persisted_image(key)
+    if image is None:
+        with open(image_path, 'rb') as image_file:
+            content = image_file.read()
+        image = encode_image(content, image_path, max_edge, quality)
+        persist_image(key, image)
+    cache_image(key, image)
+    return image
+
+
+def as_image_paths(image_path: Union[str, Sequence[str]]) -> List[str]:
+    if isinstance(image_path, str):
+        return [image_path]
+    return list(image_path)
+
+
+def prepare_images(image_path: Union[str, Sequence[str]]) -> List[PreparedImage]:
+    paths = as_image_paths(image_path)
+    if len(paths) == 1:
+        return [prepare_image(paths[0])]
+    # Pillow releases the GIL while decoding and encoding
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(paths))) as executor:
+        return list(executor.map(prepare_image, paths))
@@ -1,10 +1,99 @@
 import xml.etree.ElementTree as ET
 from lxml import etree
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import re
 from .utils import print_error
 
 
+SPECIAL_PATTERN = re.compile(r'[<&]')
+ENTITY_PATTERN = re.compile(r'&(?:#[0-9]+|#x[0-9a-fA-F]+|[A-Za-z_][\w.-]*);')
+PARTIAL_ENTITY_PATTERN = re.compile(r'&#?[\w.-]*$')
+TAG_START_PATTERN = re.compile(r'<[A-Za-z_/!?]')
+# sections whose content is passed through untouched, by opener
+RAW_SECTIONS = {'<![CDATA[': ']]>', '<!--': '-->'}
+MAX_ENTITY_LENGTH = 32
+
+
+class MarkupEscaper:
+    # LLMs write `cd app && npm i` or `a < b` without escaping; libxml2 drops
+    # such text and, when fed incrementally, stops reporting events after it.
+    # Stray `&` and `<` outside CDATA and comments are escaped instead. Text
+    # arrives in chunks, so a construct cut at the end is held back.
+    def __init__(self):
+        self.pending = ''
+        self.closer = None
+
+    def feed(self, chunk: str, final: bool = False) -> str:
+        text = self.pending + chunk
+        out = []
+        pos = 0
+        while pos < len(text):
+            if self.closer:
+                end = text.find(self.closer, pos)
+                if end == -1:
+                    # the closer itself may be split across chunks
+                    cut = len(text) if final else max(pos, len(text) - len(self.closer) + 1)
+                    out.append(self.section_text(text[pos:cut]))
+                    pos = cut
+                    break
+                out.append(self.section_text(text[pos:end]))
+                out.append(self.section_end(self.closer))
+                pos = end + len(self.closer)
+                self.closer = None
+                continue
+
+            match = SPECIAL_PATTERN.search(text, pos)
+            if not match:
+                out.append(text[pos:])
+                pos = len(text)
+                break
+            out.append(text[pos:match.start()])
+            pos = match.start()
+            rest = text[pos:pos + MAX_ENTITY_LENGTH]
+
+            if rest[0] == '<':
+                opener = next((o for o in RAW_SECTIONS if rest.startswith(o)), None)
+                if opener:
+                    out.append(self.section_start(opener))
+                    pos += len(opener)
+                    self.closer = RAW_SECTIONS[opener]
+                    continue
+                if not final and (len(rest) < 2 or any(o.startswith(rest) for o in RAW_SECTIONS)):
+                    break
+                out.append('<' if TAG_START_PATTERN.match(rest) else '&lt;')
+                pos += 1
+            else:
+                entity = ENTITY_PATTERN.match(rest)
+                if entity:
+                    out.append(entity.group())
+                    pos += entity.end()
+                    continue
+                if not final and len(rest) < MAX_ENTITY_LENGTH and PARTIAL_ENTITY_PATTERN.match(rest):
+                    break
+                out.append('&amp;')
+                pos += 1
+
+        self.pending = text[pos:]
+        return ''.join(out)
+
+    def close(self) -> str:
+        return self.feed('', final=True)
+
+    # CDATA sections and comments are passed on through these
+    def section_start(self, opener: str) -> str:
+        return opener
+
+    def section_text(self, text: str) -> str:
+        return text
+
+    def section_end(self, closer: str) -> str:
+        return closer
+
+
+def escape_stray_markup(text: str) -> str:
+    return MarkupEscaper().feed(text, final=True)
+
+
 def extract_outermost_xml(response: str) -> str:
     xml_start = response.find('<response>')
     xml_end = response.rfind('</response>')
@@ -13,10 +102,37 @@ def extract_outermost_xml(response: str) -> str:
     raise ValueError("No valid XML response found")
 
 
+class ParsedResponse(str):
+    # The text of a response together with its XML tree, so a response that
+    # is read by several callers is parsed once. The tree is built on first
+    # use unless the API layer already has it. Treat it as read-only.
+    def __new__(cls, text: str, root: Optional[etree.Element] = None):
+        response = super().__new__(cls, text)
+        response._root = root
+        return response
+
+    def __reduce__(self):
+        # the tree cannot be pickled; it is rebuilt when needed
+        return ParsedResponse, (str(self),)
+
+    @property
+    def root(self) -> etree.Element:
+        if self._root is None:
+            self._root = parse_xml(self)
+        return self._root
+
+
 def extract_and_parse_xml(response: str) -> etree.Element:
+    if isinstance(response, ParsedResponse):
+        return response.root
+    return parse_xml(response)
+
+
+def parse_xml(response: str) -> etree.Element:
     try:
-        xml_content = extract_outermost_xml(response)
-        parser = etree.XMLParser(recover=True, strip_cdata=False)
+        xml_content = escape_stray_markup(extract_outermost_xml(response))
+        # huge_tree: without it text over 10MB is silently cut short
+        parser = etree.XMLParser(recover=True, strip_cdata=False, huge_tree=True)
         return etree.fromstring(xml_content.encode('utf-8'), parser=parser)
     except etree.XMLSyntaxError as e:
         print(f"Error parsing XML: {e}")
@@ -27,38 +143,42 @@ def extract_and_parse_xml(response: str) -> etree.Element:
         raise
 
 
+STEP_TAGS = ['type', 'operation', 'filename', 'content', 'changes', 'command']
+
+
+def element_to_command(tag: str, element: etree.Element) -> Dict[str, Any]:
+    # explanation and requires_restart only carry their own text
+    if tag != 'step':
+        return {'type': tag, 'content': element.text.strip()} if element.text else {}
+    command = {}
+    for name in STEP_TAGS:
+        child = element.find(name)
+        if child is not None:
+            if name in ['content', 'changes']:
+                # Use tostring to preserve CDATA and nested elements
+                command[name] = etree.tostring(
+                    child, encoding='unicode', method='text').strip()
+            else:
+                command[name] = child.text.strip() if child.text else ''
+    return command
+
+
 def parse_dravid_response(response: str) -> List[Dict[str, Any]]:
     try:
         root = extract_and_parse_xml(response)
         commands = []
 
-        # Extract explanation
-        explanation = root.find('explanation')
-        if explanation is not None and explanation.text:
-            commands.append({
-                'type': 'explanation',
-                'content': explanation.text.strip()
-            })
-
-        requires_restart = root.find('requires_restart')
-        if requires_restart is not None and requires_restart.text:
-            commands.append({
-                'type': 'requires_restart',
-                'content': requires_restart.text.strip()
-            })
+        # Extract explanation and restart flag
+        for tag in ['explanation', 'requires_restart']:
+            element = root.find(tag)
+            if element is not None:
+                command = element_to_command(tag, element)
+                if command:
+                    commands.append(command)
+
         # Extract steps
         for step in root.findall('.//step'):
-            command = {}
-            for tag in ['type', 'operation', 'filename', 'content', 'changes', 'command']:
-                element = step.find(tag)
-                if element is not None:
-                    if tag in ['content', 'changes']:
-                        # Use tostring to preserve CDATA and nested elements
-                        command[tag] = etree.tostring(
-                            element, encoding='unicode', method='text').strip()
-                    else:
-                        command[tag] = element.text.strip(
-                        ) if element.text else ''
+            command = element_to_command('step', step)
             if command:
                 commands.append(command)
 
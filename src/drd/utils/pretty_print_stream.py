@@ -1,85 +1,164 @@
 import re
 import click
+from .spool import get_spool_threshold
+
+EXPLANATION_START = re.compile(r'<\s*explanation\s*>', re.IGNORECASE)
+EXPLANATION_END = re.compile(r'<\s*/\s*explanation\s*>', re.IGNORECASE)
+STEP_START = re.compile(r'<\s*step\s*>', re.IGNORECASE)
+STEP_END = re.compile(r'<\s*/\s*step\s*>', re.IGNORECASE)
+TYPE_PATTERN = re.compile(r'<\s*type\s*>(.*?)<\s*/\s*type\s*>', re.DOTALL | re.IGNORECASE)
+OPERATION_PATTERN = re.compile(r'<\s*operation\s*>(.*?)<\s*/\s*operation\s*>', re.DOTALL | re.IGNORECASE)
+FILENAME_PATTERN = re.compile(r'<\s*filename\s*>(.*?)<\s*/\s*filename\s*>', re.DOTALL | re.IGNORECASE)
+COMMAND_PATTERN = re.compile(r'<\s*command\s*>(.*?)<\s*/\s*command\s*>', re.DOTALL | re.IGNORECASE)
+# the tags above may be cut off at the end of a chunk; none contains another '<'
+PARTIAL_TAG = re.compile(r'<\s*/?\s*\w*\s*\Z')
+# kept from the end of an oversized step, enough to find where its CDATA ends
+STEP_TAIL_CHARS = 1024
+
+
+def print_explanation(explanation):
+    click.echo(click.style("\nExplanation:",
+               fg="green", bold=True), nl=False)
+    click.echo(f" {explanation.strip()}")
+
+
+def print_step(step_content):
+    type_match = TYPE_PATTERN.search(step_content)
+    if not type_match:
+        return
+    step_type = type_match.group(1).strip().lower()
+    if step_type == 'file':
+        operation_match = OPERATION_PATTERN.search(step_content)
+        filename_match = FILENAME_PATTERN.search(step_content)
+        if operation_match and filename_match:
+            operation = operation_match.group(1).strip()
+            filename = filename_match.group(1).strip()
+            click.echo(click.style("\n📂 File Operation:",
+                       fg="yellow", bold=True), nl=False)
+            click.echo(f" {operation} {filename}")
+
+        # Process CDATA content
+        cdata_start = step_content.find("<![CDATA[")
+        if cdata_start != -1:
+            cdata_end = step_content.rfind("]]>")
+            if cdata_end != -1:
+                cdata_content = step_content[cdata_start+9:cdata_end]
+                click.echo(click.style(
+                    "\n📄 File Content:", fg="cyan", bold=True))
+                click.echo(cdata_content)
+    elif step_type == 'shell':
+        command_match = COMMAND_PATTERN.search(step_content)
+        if command_match:
+            command = command_match.group(1).strip()
+            click.echo(click.style("\nShell Command:",
+                       fg="blue", bold=True), nl=False)
+            click.echo(f" {command}")
 
 
 def pretty_print_xml_stream(chunk, state):
-    state['buffer'] += chunk
-
-    max_iterations = 1000
-    iteration_count = 0
-
-    while iteration_count < max_iterations:
-        iteration_count += 1
-
-        if not state.get('in_step'):
-            # Process explanation tags
-            match = re.search(r'<\s*explanation\s*>(.*?)<\s*/\s*explanation\s*>',
-                              state['buffer'], re.DOTALL | re.IGNORECASE)
-            if match:
-                explanation = match.group(1).strip()
-                click.echo(click.style("\nExplanation:",
-                           fg="green", bold=True), nl=False)
-                click.echo(f" {explanation}")
-                state['buffer'] = state['buffer'][match.end():]
-                continue
-
-            # Look for step start
-            step_start = re.search(
-                r'<\s*step\s*>', state['buffer'], re.IGNORECASE)
+    # Every search resumes at state['scan'], so each character is looked at
+    # a bounded number of times however the text is chunked. Text before the
+    # scan position that is still needed (the body of the current step, or
+    # anything left over) is kept in state['parts'] instead of being copied
+    # into an ever longer buffer.
+    state.setdefault('scan', 0)
+    state.setdefault('parts', [])
+    # (start, content start) of an <explanation> still waiting for its end
+    state.setdefault('explanation', None)
+    # length of the parts, and what was left out of a step too large to keep
+    state.setdefault('kept', 0)
+    state.setdefault('omitted', 0)
+    if 'step_limit' not in state:
+        state['step_limit'] = get_spool_threshold()
+    buffer = state['buffer'] + chunk
+    # start of the text not consumed by a printed element
+    pos = 0
+    scan = state['scan']
+
+    while True:
+        if not state['in_step']:
+            explanation = state['explanation']
+            if explanation is None:
+                start = EXPLANATION_START.search(buffer, scan)
+                if start:
+                    explanation = state['explanation'] = (start.start(), start.end())
+            if explanation is not None:
+                end = EXPLANATION_END.search(buffer, max(scan, explanation[1]))
+                if end:
+                    print_explanation(buffer[explanation[1]:end.start()])
+                    state['explanation'] = None
+                    reset_parts(state)
+                    pos = scan = end.end()
+                    continue
+
+            step_start = STEP_START.search(buffer, scan)
             if step_start:
                 state['in_step'] = True
-                state['buffer'] = state['buffer'][step_start.end():]
+                state['explanation'] = None
+                reset_parts(state)
+                pos = scan = step_start.end()
                 continue
-
-        if state['in_step']:
-            step_end = re.search(r'<\s*/\s*step\s*>',
-                                 state['buffer'], re.IGNORECASE)
+        else:
+            step_end = STEP_END.search(buffer, scan)
             if step_end:
-                step_content = state['buffer'][:step_end.start()]
-                state['buffer'] = state['buffer'][step_end.end():]
+                print_step(get_step_content(state) + buffer[pos:step_end.start()])
                 state['in_step'] = False
-
-                # Process step content
-                type_match = re.search(
-                    r'<\s*type\s*>(.*?)<\s*/\s*type\s*>', step_content, re.DOTALL | re.IGNORECASE)
-                if type_match:
-                    step_type = type_match.group(1).strip().lower()
-                    if step_type == 'file':
-                        operation_match = re.search(
-                            r'<\s*operation\s*>(.*?)<\s*/\s*operation\s*>', step_content, re.DOTALL | re.IGNORECASE)
-                        filename_match = re.search(
-                            r'<\s*filename\s*>(.*?)<\s*/\s*filename\s*>', step_content, re.DOTALL | re.IGNORECASE)
-                        if operation_match and filename_match:
-                            operation = operation_match.group(1).strip()
-                            filename = filename_match.group(1).strip()
-                            click.echo(click.style("\n📂 File Operation:",
-                                       fg="yellow", bold=True), nl=False)
-                            click.echo(f" {operation} {filename}")
-
-                        # Process CDATA content
-                        cdata_start = step_content.find("<![CDATA[")
-                        if cdata_start != -1:
-                            cdata_end = step_content.rfind("]]>")
-                            if cdata_end != -1:
-                                cdata_content = step_content[cdata_start+9:cdata_end]
-                                click.echo(click.style(
-                                    "\n📄 File Content:", fg="cyan", bold=True))
-                                click.echo(cdata_content)
-                    elif step_type == 'shell':
-                        command_match = re.search(
-                            r'<\s*command\s*>(.*?)<\s*/\s*command\s*>', step_content, re.DOTALL | re.IGNORECASE)
-                        if command_match:
-                            command = command_match.group(1).strip()
-                            click.echo(click.style("\nShell Command:",
-                                       fg="blue", bold=True), nl=False)
-                            click.echo(f" {command}")
+                reset_parts(state)
+                pos = scan = step_end.end()
                 continue
-
-        # If we've reached this point, we couldn't process anything in this iteration
         break
 
-    if iteration_count == max_iterations:
-        print("Debug: Max iterations reached, possible infinite loop detected")
+    # the next search starts at a tag cut off by the end of this chunk, if any
+    last = buffer.rfind('<', scan)
+    scan = last if last != -1 and PARTIAL_TAG.match(buffer, last) else len(buffer)
+    keep = scan
+    if state['explanation'] is not None:
+        keep = min(keep, state['explanation'][0])
+        state['explanation'] = tuple(i - keep for i in state['explanation'])
+    if keep > pos:
+        state['parts'].append(buffer[pos:keep])
+        state['kept'] += keep - pos
+        if state['in_step'] and state['step_limit']:
+            limit_step_text(state)
+    state['buffer'] = buffer[keep:]
+    state['scan'] = scan - keep
+
+
+def reset_parts(state):
+    state['parts'] = []
+    state['kept'] = 0
+    state['omitted'] = 0
+
+
+def limit_step_text(state):
+    # A step whose body is spooled to disk is not held here either: past the
+    # spool threshold only its start and its last characters are kept.
+    limit = state['step_limit']
+    parts = state['parts']
+    # the tail is cut back once it has doubled, not on every chunk
+    if state['kept'] <= limit + 2 * STEP_TAIL_CHARS:
+        return
+    if state['omitted']:
+        tail = ''.join(parts[1:])[-STEP_TAIL_CHARS:]
+    else:
+        text = ''.join(parts)
+        parts[:] = [text[:limit]]
+        tail = text[-STEP_TAIL_CHARS:]
+    state['omitted'] += state['kept'] - limit - STEP_TAIL_CHARS
+    parts[1:] = [tail]
+    state['kept'] = limit + STEP_TAIL_CHARS
+
+
+def get_step_content(state):
+    parts = state['parts']
+    if not state.get('omitted'):
+        return ''.join(parts)
+    return (parts[0] + f"\n... ({state['omitted']} characters not shown)\n"
+            + ''.join(parts[1:]))
+
+
+def get_remaining_content(state):
+    return ''.join(state.get('parts', [])) + state['buffer']
 
 
 def stream_and_print_commands(chunks):
@@ -91,7 +170,8 @@ def stream_and_print_commands(chunks):
     for chunk in chunks:
         pretty_print_xml_stream(chunk, state)
 
-    if state['buffer'].strip():
-        click.echo(f"\nRemaining Content: {state['buffer'].strip()}")
+    remaining = get_remaining_content(state).strip()
+    if remaining:
+        click.echo(f"\nRemaining Content: {remaining}")
 
     click.echo()  # Final newline
@@ -0,0 +1,105 @@
+import os
+import atexit
+import shutil
+import tempfile
+import threading
+
+# characters; larger CDATA bodies are written to disk while they stream in
+DEFAULT_SPOOL_THRESHOLD = 1024 * 1024
+PREVIEW_CHARS = 2000
+
+_spools = set()
+_spools_lock = threading.Lock()
+
+
+def get_spool_threshold() -> int:
+    # 0 keeps every body in memory
+    try:
+        return max(0, int(os.getenv('DRAVID_SPOOL_THRESHOLD', DEFAULT_SPOOL_THRESHOLD)))
+    except ValueError:
+        return DEFAULT_SPOOL_THRESHOLD
+
+
+class SpooledContent:
+    # Handle to a file body that was written to a temporary file instead of
+    # being kept in memory. Like the inline content of a step it has no
+    # leading or trailing whitespace.
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+
+    def __repr__(self):
+        return f"SpooledContent({self.path!r}, size={self.size})"
+
+    def read(self) -> str:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def preview(self, limit: int = PREVIEW_CHARS) -> str:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            head = f.read(limit)
+        if self.size > len(head.encode('utf-8')):
+            head += f"\n... ({self.size} bytes in total)"
+        return head
+
+    def move_to(self, destination: str):
+        # a rename when the spool and the project share a file system
+        shutil.move(self.path, destination)
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(destination, 0o666 & ~umask)
+        forget_spool(self.path)
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        forget_spool(self.path)
+
+
+class SpoolWriter:
+    # Writes a body piece by piece, leaving out leading and trailing
+    # whitespace as str.strip() would.
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(prefix='drd-spool-')
+        self.file = os.fdopen(fd, 'wb')
+        self.size = 0
+        self.content_end = 0
+        with _spools_lock:
+            _spools.add(self.path)
+
+    def write(self, text: str):
+        if not self.size:
+            text = text.lstrip()
+        if not text:
+            return
+        data = text.encode('utf-8')
+        self.file.write(data)
+        self.size += len(data)
+        stripped = text.rstrip()
+        if stripped:
+            self.content_end = self.size - len(text[len(stripped):].encode('utf-8'))
+
+    def close(self) -> SpooledContent:
+        self.file.truncate(self.content_end)
+        self.file.close()
+        return SpooledContent(self.path, self.content_end)
+
+
+def forget_spool(path: str):
+    with _spools_lock:
+        _spools.discard(path)
+
+
+@atexit.register
+def discard_spools():
+    # bodies of steps that were never applied
+    with _spools_lock:
+        paths = list(_spools)
+        _spools.clear()
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
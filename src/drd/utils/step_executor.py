@@ -6,6 +6,7 @@ import time
 from .utils import print_error, print_success, print_info, print_warning, create_confirmation_box
 from .diff import preview_file_changes
 from .apply_file_changes import apply_changes
+from .spool import SpooledContent
 from ..metadata.common_utils import get_ignore_patterns, get_folder_structure
 
 
@@ -68,12 +69,17 @@ class Executor:
                 return False
             try:
                 os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                spooled = isinstance(content, SpooledContent)
                 preview = preview_file_changes(
-                    operation, filename, new_content=content)
+                    operation, filename, new_content=content.preview() if spooled else content)
                 print(preview)
                 if click.confirm("Confirm creation"):
-                    with open(full_path, 'w') as f:
-                        f.write(content)
+                    if spooled:
+                        # a large body streamed to disk is moved, not read back
+                        content.move_to(full_path)
+                    else:
+                        with open(full_path, 'w') as f:
+                            f.write(content)
                     print_success(f"File created successfully: {filename}")
                     return True
                 else:
@@ -91,6 +97,8 @@ class Executor:
                 with open(full_path, 'r') as f:
                     original_content = f.read()
 
+                if isinstance(content, SpooledContent):
+                    content = content.read()
                 if content:
                     updated_content = apply_changes(original_content, content)
                     preview = preview_file_changes(
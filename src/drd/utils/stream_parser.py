@@ -0,0 +1,175 @@
+import re
+import uuid
+from lxml import etree
+from typing import List, Dict, Any, Optional
+from .parser import MarkupEscaper, element_to_command
+from .spool import SpoolWriter, get_spool_threshold
+
+RESPONSE_OPEN = '<response>'
+RESPONSE_CLOSE = '</response>'
+CDATA_OPEN = '<![CDATA['
+HEADER_TAGS = ['explanation', 'requires_restart']
+SPOOL_MARKER_PATTERN = re.compile(r'drd-spool:[0-9a-f]{32}')
+
+
+class CdataSpooler(MarkupEscaper):
+    # A CDATA body that grows past the threshold goes to a spool file and
+    # only a marker reaches the XML parser, so the body is never held in
+    # the tree, the serialised text or the command.
+    def __init__(self, threshold: int):
+        super().__init__()
+        self.threshold = threshold
+        self.held = None
+        self.held_size = 0
+        self.writer = None
+        self.spooled = {}
+
+    def section_start(self, opener: str) -> str:
+        if opener == CDATA_OPEN and self.threshold:
+            self.held = []
+            self.held_size = 0
+        return opener
+
+    def section_text(self, text: str) -> str:
+        if self.held is None:
+            return text
+        if self.writer is not None:
+            self.writer.write(text)
+            return ''
+        self.held.append(text)
+        self.held_size += len(text)
+        if self.held_size > self.threshold:
+            self.writer = SpoolWriter()
+            for held in self.held:
+                self.writer.write(held)
+            self.held = []
+        return ''
+
+    def section_end(self, closer: str) -> str:
+        if self.held is None:
+            return closer
+        if self.writer is not None:
+            text = f"drd-spool:{uuid.uuid4().hex}"
+            self.spooled[text] = self.writer.close()
+            self.writer = None
+        else:
+            text = ''.join(self.held)
+        self.held = None
+        return text + closer
+
+    def take(self, value: str) -> Any:
+        if SPOOL_MARKER_PATTERN.fullmatch(value):
+            return self.spooled.pop(value)
+        # a spooled body mixed with other text has to be read back
+        return SPOOL_MARKER_PATTERN.sub(lambda m: self.spooled.pop(m.group()).read(), value)
+
+
+class StreamParser:
+    # Parses a dravid response while it streams in. feed() returns the
+    # commands whose closing tag arrived with that chunk and close() returns
+    # the full list, in the same order parse_dravid_response gives.
+    # `received` holds the commands in the order they were returned. Bodies
+    # above the spool threshold arrive as SpooledContent handles.
+    def __init__(self, spool_threshold: Optional[int] = None):
+        self.preamble = ''
+        self.tail = ''
+        self.started = False
+        self.finished = False
+        self.end_seen = False
+        self.root = None
+        self.headers = {}
+        # steps in document order, converted once their closing tag is read
+        self.step_elements = []
+        self.step_commands = {}
+        self.received = []
+        self.escaper = CdataSpooler(
+            get_spool_threshold() if spool_threshold is None else spool_threshold)
+        self.parser = etree.XMLPullParser(
+            events=('start', 'end'), recover=True, strip_cdata=False, huge_tree=True)
+
+    @property
+    def commands(self) -> List[Dict[str, Any]]:
+        headers = [self.headers[tag] for tag in HEADER_TAGS if tag in self.headers]
+        steps = [self.step_commands.get(id(element)) for element in self.step_elements]
+        return headers + [command for command in steps if command]
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        if self.finished:
+            return []
+        if not self.started:
+            # anything the model says before <response> is dropped
+            self.preamble += chunk
+            start = self.preamble.find(RESPONSE_OPEN)
+            if start == -1:
+                self.preamble = self.preamble[-(len(RESPONSE_OPEN) - 1):]
+                return []
+            chunk = self.preamble[start:]
+            self.preamble = ''
+            self.started = True
+
+        window = self.tail + chunk
+        self.end_seen = self.end_seen or RESPONSE_CLOSE in window
+        self.tail = window[-(len(RESPONSE_CLOSE) - 1):]
+        self.parser.feed(self.escaper.feed(chunk))
+        completed = self.read_events()
+        self.received += completed
+        return completed
+
+    def read_events(self) -> List[Dict[str, Any]]:
+        completed = []
+        for event, element in self.parser.read_events():
+            if self.root is None:
+                self.root = element
+            if event == 'start':
+                if element.tag == 'step':
+                    self.step_elements.append(element)
+                continue
+            if element is self.root:
+                self.finished = True
+                break
+            if element.tag == 'step':
+                completed += self.add_step(element)
+            elif element.tag in HEADER_TAGS and element.getparent() is self.root:
+                command = element_to_command(element.tag, element)
+                if command and element.tag not in self.headers:
+                    self.headers[element.tag] = command
+                    completed.append(command)
+        return completed
+
+    def add_step(self, element: etree.Element) -> List[Dict[str, Any]]:
+        command = element_to_command('step', element)
+        for key in ['content', 'changes']:
+            if self.escaper.spooled and key in command:
+                command[key] = self.escaper.take(command[key])
+        self.step_commands[id(element)] = command
+        return [command] if command else []
+
+    def close(self) -> List[Dict[str, Any]]:
+        if not self.started or self.finished:
+            return self.commands
+        self.parser.feed(self.escaper.close())
+        self.received += self.read_events()
+        if self.finished:
+            return self.commands
+        try:
+            root = self.parser.close()
+        except etree.XMLSyntaxError:
+            root = None
+        # libxml2 stops reporting events after a syntax error it recovered
+        # from, but keeps building the tree; steps past the error are taken
+        # from it, unless the stream was cut off and they may be incomplete
+        if root is not None and self.end_seen:
+            self.step_elements = list(root.iter('step'))
+            for element in self.step_elements:
+                if id(element) not in self.step_commands:
+                    self.received += self.add_step(element)
+            for tag in HEADER_TAGS:
+                element = root.find(tag)
+                if element is not None and tag not in self.headers:
+                    command = element_to_command(tag, element)
+                    if command:
+                        self.headers[tag] = command
+                        self.received.append(command)
+        self.finished = True
+        return self.commands
+
@@ -1,11 +1,20 @@
 import unittest
-from unittest.mock import patch, MagicMock, call
+from unittest.mock import patch, MagicMock, AsyncMock, call
+import os
+import time
+import pytest
 from drd.api.main import (
     stream_dravid_api,
+    stream_dravid_commands,
     call_dravid_api,
     call_dravid_vision_api,
-    get_api_functions
+    stream_dravid_vision_api,
+    get_api_functions,
+    get_async_api_function,
+    async_call_dravid_api_with_pagination
 )
+from drd.api.providers import register_provider, unregister_provider
+from drd.utils.stream_parser import StreamParser
 
 
 class TestDravidAPI(unittest.TestCase):
@@ -48,6 +57,24 @@ class TestDravidAPI(unittest.TestCase):
                           instruction_prompt="Test prompt", print_chunk=False)
         mock_stream_response.assert_called_with("test query", "Test prompt")
 
+    @patch('drd.api.main.get_api_functions')
+    @patch('drd.api.main.pretty_print_xml_stream')
+    @patch('drd.api.main.Loader')
+    def test_stream_dravid_api_feeds_parser(self, mock_loader, mock_pretty_print, mock_get_api_functions):
+        xml_res = [
+            "<response><steps><step><type>shell</type><comm",
+            "and>ls</command></step></steps></response>"
+        ]
+        mock_get_api_functions.return_value = (
+            None, None, MagicMock(return_value=xml_res))
+        parser = StreamParser()
+
+        result = stream_dravid_api("test query", parser=parser)
+
+        # the commands come from the parser, the text is not kept
+        self.assertIsNone(result)
+        self.assertEqual(parser.close(), [{'type': 'shell', 'command': 'ls'}])
+
     @patch('drd.api.main.get_api_functions')
     @patch('drd.api.main.parse_dravid_response')
     def test_call_dravid_api(self, mock_parse_response, mock_get_api_functions):
@@ -84,3 +111,104 @@ class TestDravidAPI(unittest.TestCase):
             "test query", "image.jpg", False, None)
         mock_parse_response.assert_called_once_with(
             "<response><step><type>shell</type><command>echo 'test'</command></step></response>")
+
+    @patch('drd.api.main.get_vision_stream_function')
+    @patch('drd.api.main.pretty_print_xml_stream')
+    @patch('drd.api.main.Loader')
+    def test_stream_dravid_vision_api(self, mock_loader, mock_pretty_print, mock_get_vision_stream_function):
+        xml_res = ["<response><step><type>shell</type>",
+                   "<command>echo 'test'</command></step></response>"]
+        mock_stream_vision_response = MagicMock(return_value=iter(xml_res))
+        mock_get_vision_stream_function.return_value = mock_stream_vision_response
+
+        result = stream_dravid_vision_api("test query", ["a.png", "b.png"], instruction_prompt="Test prompt")
+
+        self.assertEqual(result, "".join(xml_res))
+        self.assertEqual(mock_pretty_print.call_count, 2)
+        mock_stream_vision_response.assert_called_once_with(
+            "test query", ["a.png", "b.png"], "Test prompt")
+
+    @patch.dict(os.environ, {"DRAVID_LLM": "acme"})
+    @patch('drd.api.main.pretty_print_xml_stream')
+    @patch('drd.api.main.Loader')
+    def test_stream_dravid_vision_api_without_provider_streaming(self, mock_loader, mock_pretty_print):
+        call_vision_api = MagicMock(return_value="<response>whole</response>")
+        register_provider('acme', MagicMock(), call_vision_api, MagicMock())
+        try:
+            result = stream_dravid_vision_api("test query", "image.png")
+        finally:
+            unregister_provider('acme')
+
+        self.assertEqual(result, "<response>whole</response>")
+        call_vision_api.assert_called_once_with("test query", "image.png", False, None)
+
+
+PIPELINED_RESPONSE = (
+    "<response><steps>"
+    "<step><type>shell</type><command>mkdir app</command></step>"
+    "<step><type>file</type><operation>CREATE</operation><filename>app/data.txt</filename>"
+    "<content><![CDATA[" + "x" * 480 + "]]></content></step>"
+    "<step><type>shell</type><command>ls app</command></step>"
+    "</steps></response>"
+)
+
+
+@patch.dict(os.environ, {'CLAUDE_API_KEY': 'fake-key', 'DRAVID_LLM': 'claude'})
+class TestStreamDravidCommands(unittest.TestCase):
+
+    @pytest.fixture(autouse=True)
+    def use_server(self, fake_llm_server):
+        self.server = fake_llm_server
+        # 16 characters every 10ms, about 0.4s for the whole response
+        self.server.configure(responses=[PIPELINED_RESPONSE], tokens_per_second=400)
+
+    def test_steps_arrive_while_the_response_streams(self):
+        start = time.perf_counter()
+        steps = stream_dravid_commands("query")
+        first = next(steps)
+        first_at = time.perf_counter() - start
+        rest = list(steps)
+        done_at = time.perf_counter() - start
+
+        self.assertEqual(first, {'type': 'shell', 'command': 'mkdir app'})
+        self.assertEqual([step['type'] for step in rest], ['file', 'shell'])
+        self.assertGreater(done_at - first_at, 0.2)
+
+    def test_stream_is_read_while_a_step_runs(self):
+        parser = StreamParser()
+        steps = stream_dravid_commands("query", parser=parser)
+        next(steps)
+        # a long-running first step; the response keeps arriving meanwhile
+        time.sleep(0.6)
+        start = time.perf_counter()
+        list(steps)
+        self.assertLess(time.perf_counter() - start, 0.15)
+        self.assertEqual(len(parser.received), 3)
+
+
+class TestAsyncDravidAPI(unittest.IsolatedAsyncioTestCase):
+
+    @patch.dict(os.environ, {"DRAVID_LLM": "claude"})
+    def test_get_async_api_function_claude(self):
+        self.assertEqual(get_async_api_function().__name__,
+                         'async_call_claude_api_with_pagination')
+
+    @patch.dict(os.environ, {"DRAVID_LLM": "azure"})
+    def test_get_async_api_function_openai_compatible(self):
+        self.assertEqual(get_async_api_function().__name__,
+                         'async_call_api_with_pagination')
+
+    @patch.dict(os.environ, {"DRAVID_LLM": "unknown"})
+    def test_get_async_api_function_unsupported(self):
+        with self.assertRaises(ValueError):
+            get_async_api_function()
+
+    @patch('drd.api.main.get_async_api_function')
+    async def test_async_call_dravid_api_with_pagination(self, mock_get_async_api_function):
+        mock_call = AsyncMock(return_value="<response>ok</response>")
+        mock_get_async_api_function.return_value = mock_call
+
+        result = await async_call_dravid_api_with_pagination("query", True, "prompt")
+
+        self.assertEqual(result, "<response>ok</response>")
+        mock_call.assert_awaited_once_with("query", True, "prompt")
@@ -0,0 +1,132 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+import time
+import shutil
+import tempfile
+
+from drd.api.cache import (
+    ResponseCache,
+    make_cache_key,
+    get_response_cache,
+    replay_chunks,
+)
+from drd.api.main import call_dravid_api_with_pagination, stream_dravid_api
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.messages = [{'role': 'user', 'content': 'query'}]
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_make_cache_key_is_stable(self):
+        key1 = make_cache_key('claude', 'model', 'system', self.messages)
+        key2 = make_cache_key('claude', 'model', 'system', self.messages)
+        self.assertEqual(key1, key2)
+
+    def test_make_cache_key_changes_with_inputs(self):
+        base = make_cache_key('claude', 'model', 'system', self.messages)
+        self.assertNotEqual(base, make_cache_key(
+            'openai', 'model', 'system', self.messages))
+        self.assertNotEqual(base, make_cache_key(
+            'claude', 'other', 'system', self.messages))
+        self.assertNotEqual(base, make_cache_key(
+            'claude', 'model', 'other', self.messages))
+        self.assertNotEqual(base, make_cache_key(
+            'claude', 'model', 'system', self.messages, stream=True))
+
+    def test_set_and_get(self):
+        cache = ResponseCache(self.cache_dir)
+        cache.set('abc123', '<response>cached</response>')
+        self.assertEqual(cache.get('abc123'), '<response>cached</response>')
+        self.assertEqual(cache.hits, 1)
+
+    def test_get_missing(self):
+        cache = ResponseCache(self.cache_dir)
+        self.assertIsNone(cache.get('missing'))
+        self.assertEqual(cache.misses, 1)
+
+    def test_expired_entry_is_removed(self):
+        cache = ResponseCache(self.cache_dir, ttl=10)
+        cache.set('abc123', 'old')
+        with patch('drd.api.cache.time.time', return_value=time.time() + 60):
+            self.assertIsNone(cache.get('abc123'))
+        self.assertFalse(os.path.exists(cache._path('abc123')))
+
+    def test_lru_eviction_keeps_recently_used(self):
+        cache = ResponseCache(self.cache_dir, max_bytes=250)
+        cache.set('aa1', 'x' * 50)
+        cache.set('bb2', 'y' * 50)
+        past = time.time() - 100
+        os.utime(cache._path('aa1'), (past, past))
+        os.utime(cache._path('bb2'), (past + 1, past + 1))
+        cache.get('aa1')
+        cache.set('cc3', 'z' * 50)
+
+        self.assertIsNotNone(cache.get('aa1'))
+        self.assertIsNone(cache.get('bb2'))
+        self.assertIsNotNone(cache.get('cc3'))
+
+    def test_clear(self):
+        cache = ResponseCache(self.cache_dir)
+        cache.set('abc123', 'value')
+        cache.clear()
+        self.assertIsNone(cache.get('abc123'))
+
+    def test_replay_chunks(self):
+        self.assertEqual(list(replay_chunks('abcdefg', 3)),
+                         ['abc', 'def', 'g'])
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_cache_disabled_by_default(self):
+        self.assertIsNone(get_response_cache())
+
+
+class TestCachedApiCalls(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.env = patch.dict(os.environ, {
+            'DRAVID_LLM': 'claude',
+            'DRAVID_CACHE': '1',
+            'DRAVID_CACHE_DIR': self.cache_dir
+        })
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    @patch('drd.api.main.get_api_functions')
+    def test_call_is_served_from_cache(self, mock_get_api_functions):
+        mock_call_api = MagicMock(return_value="<response>ok</response>")
+        mock_get_api_functions.return_value = (mock_call_api, None, None)
+
+        first = call_dravid_api_with_pagination("same query")
+        second = call_dravid_api_with_pagination("same query")
+
+        self.assertEqual(first, second)
+        mock_call_api.assert_called_once()
+
+    @patch('drd.api.main.get_api_functions')
+    @patch('drd.api.main.pretty_print_xml_stream')
+    @patch('drd.api.main.Loader')
+    def test_stream_hit_is_replayed_as_chunks(self, mock_loader, mock_pretty_print, mock_get_api_functions):
+        mock_stream = MagicMock(
+            return_value=iter(["<response>", "<step>", "</step></response>"]))
+        mock_get_api_functions.return_value = (None, None, mock_stream)
+
+        first = stream_dravid_api("stream query")
+        second = stream_dravid_api("stream query")
+
+        self.assertEqual(first, second)
+        mock_stream.assert_called_once()
+        self.assertGreater(mock_pretty_print.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+import json
+import time
+import tempfile
+import httpx
+import requests
+
+from drd.api.cassette import (
+    Cassette,
+    CassetteSession,
+    CassetteTransport,
+    CassetteMissError,
+    get_cassette,
+    get_transport_mode,
+    get_replay_speed,
+    reset_cassette,
+    RECORD,
+    REPLAY,
+)
+from drd.api.retry import is_retryable
+from drd.api.scheduler import create_scheduler
+from drd.api.transport import get_session, reset_session, async_post
+
+SSE = [b'event: content_block_delta\ndata: {"delta": {"text": "Hi"}}\n\n',
+       b'event: message_stop\ndata: {"type": "message_stop"}\n\n']
+
+
+def live_session(chunks, status_code=200, delay=0.0):
+    session = MagicMock()
+
+    def iter_content(chunk_size=None):
+        for chunk in chunks:
+            time.sleep(delay)
+            yield chunk
+    session.post.return_value.status_code = status_code
+    session.post.return_value.headers = {'Content-Type': 'text/event-stream', 'Content-Encoding': 'gzip',
+                                         'anthropic-ratelimit-requests-limit': '50'}
+    session.post.return_value.iter_content.side_effect = iter_content
+    return session
+
+
+class TestCassette(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'cassette.jsonl')
+        reset_cassette()
+
+    def tearDown(self):
+        reset_cassette()
+        reset_session()
+        self.tmpdir.cleanup()
+
+    def record(self, chunks, body=None, delay=0.0):
+        session = CassetteSession(live_session(chunks, delay=delay), Cassette(self.path, RECORD))
+        response = session.post('https://api.example.com/v1/messages', json=body or {'q': 1},
+                                headers={'x-api-key': 'secret'}, stream=True)
+        return list(response.iter_content(chunk_size=None))
+
+    def replay(self, body=None):
+        session = CassetteSession(MagicMock(), Cassette(self.path, REPLAY))
+        return session.post('https://api.example.com/v1/messages', json=body or {'q': 1}, stream=True)
+
+    def test_stream_is_replayed_chunk_by_chunk(self):
+        self.assertEqual(self.record(SSE), SSE)
+
+        response = self.replay()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['anthropic-ratelimit-requests-limit'], '50')
+        self.assertNotIn('content-encoding', response.headers)
+        self.assertEqual(list(response.iter_content(chunk_size=None)), SSE)
+
+    def test_api_keys_are_not_recorded(self):
+        self.record(SSE)
+        with open(self.path) as f:
+            self.assertNotIn('secret', f.read())
+
+    def test_non_stream_response_is_recorded_whole(self):
+        session = CassetteSession(live_session([b'{"content": ', b'[]}']), Cassette(self.path, RECORD))
+        self.assertEqual(session.post('https://api.example.com/v1/messages', json={'q': 1}).json(), {'content': []})
+
+        self.assertEqual(self.replay().json(), {'content': []})
+
+    def test_iter_lines_on_replay(self):
+        self.record([b'{"a": 1}\n{"b"', b': 2}\n'])
+        self.assertEqual(list(self.replay().iter_lines()), [b'{"a": 1}', b'{"b": 2}'])
+
+    def test_identical_requests_replay_in_order_then_repeat(self):
+        self.record([b'first'])
+        self.record([b'second'])
+        cassette = Cassette(self.path, REPLAY)
+        session = CassetteSession(MagicMock(), cassette)
+        url = 'https://api.example.com/v1/messages'
+        self.assertEqual([session.post(url, json={'q': 1}).text for _ in range(3)],
+                         ['first', 'second', 'second'])
+
+    def test_timestamps_in_prompts_still_match(self):
+        self.record(SSE, body={'prompt': 'last_updated: 2026-10-18T05:47:32.712575'})
+        response = self.replay({'prompt': 'last_updated: 2026-10-19T09:00:01.000001'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_unrecorded_request_is_a_miss_and_not_retried(self):
+        self.record(SSE)
+        with self.assertRaises(CassetteMissError) as ctx:
+            self.replay({'q': 2})
+        self.assertFalse(is_retryable(ctx.exception))
+
+    def test_replay_timing(self):
+        self.record(SSE, delay=0.1)
+
+        start = time.perf_counter()
+        list(self.replay().iter_content())
+        self.assertLess(time.perf_counter() - start, 0.1)
+
+        with patch.dict(os.environ, {'DRAVID_REPLAY_TIMING': 'original'}):
+            start = time.perf_counter()
+            list(self.replay().iter_content())
+            self.assertGreaterEqual(time.perf_counter() - start, 0.18)
+
+    def test_get_replay_speed(self):
+        with patch.dict(os.environ, {'DRAVID_REPLAY_TIMING': '4'}):
+            self.assertEqual(get_replay_speed(), 4.0)
+        with patch.dict(os.environ, {'DRAVID_REPLAY_TIMING': 'fast'}):
+            self.assertIsNone(get_replay_speed())
+
+    @patch.dict(os.environ, {'DRAVID_TRANSPORT_MODE': 'rewind'})
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            get_transport_mode()
+
+    @patch.dict(os.environ, {'DRAVID_TRANSPORT_MODE': 'replay'})
+    def test_replay_is_not_rate_limited(self):
+        scheduler = create_scheduler('claude')
+        self.assertEqual(set(scheduler.buckets.values()), {None})
+        self.assertEqual(scheduler.concurrency, scheduler.max_concurrency)
+
+    def test_get_session_records_when_enabled(self):
+        with patch.dict(os.environ, {'DRAVID_TRANSPORT_MODE': 'record', 'DRAVID_CASSETTE': self.path}):
+            self.assertIsInstance(get_session(), CassetteSession)
+            self.assertEqual(get_cassette().mode, RECORD)
+
+    def test_openai_transport_round_trip(self):
+        def handler(request):
+            self.assertEqual(json.loads(request.content), {'model': 'gpt-4o'})
+            return httpx.Response(200, json={'choices': []})
+
+        with httpx.Client(transport=CassetteTransport(Cassette(self.path, RECORD),
+                                                      transport=httpx.MockTransport(handler))) as client:
+            self.assertEqual(client.post('https://api.openai.com/v1/chat/completions',
+                                         json={'model': 'gpt-4o'}).json(), {'choices': []})
+
+        with httpx.Client(transport=CassetteTransport(Cassette(self.path, REPLAY))) as client:
+            response = client.post('https://api.openai.com/v1/chat/completions', json={'model': 'gpt-4o'})
+        self.assertEqual(response.json(), {'choices': []})
+
+
+class TestAsyncCassette(unittest.IsolatedAsyncioTestCase):
+
+    async def test_async_post_replays_without_network(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'cassette.jsonl')
+            CassetteSession(live_session([b'{"ok": true}']), Cassette(path, RECORD)).post(
+                'https://api.example.com/v1/messages', json={'q': 1}).json()
+            reset_cassette()
+            with patch.dict(os.environ, {'DRAVID_TRANSPORT_MODE': 'replay', 'DRAVID_CASSETTE': path}), \
+                    patch('drd.api.transport.get_async_http_client') as mock_client:
+                response = await async_post('https://api.example.com/v1/messages', json={'q': 1})
+                mock_client.return_value.post.assert_not_called()
+            reset_cassette()
+        self.assertEqual(response.json(), {'ok': True})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 import os
 import xml.etree.ElementTree as ET
 from io import BytesIO
@@ -10,9 +10,20 @@ from drd.api.claude_api import (
     make_api_call,
     parse_response,
     call_claude_api_with_pagination,
+    async_call_claude_api_with_pagination,
     call_claude_vision_api_with_pagination,
     stream_claude_response,
+    stream_claude_vision_response,
+    build_system_prompt,
+    build_user_content,
+    prompt_cache_prefix,
+    record_usage,
+    get_prompt_cache_usage,
+    prompt_cache_usage,
 )
+from drd.api.sse import StreamError
+from drd.prompts.monitor_error_resolution import get_error_resolution_prompt
+from drd.utils.image_utils import PreparedImage
 
 
 class TestApiUtils(unittest.TestCase):
@@ -37,9 +48,10 @@ class TestApiUtils(unittest.TestCase):
         self.assertEqual(headers['Content-Type'], 'application/json')
         self.assertEqual(headers['Anthropic-Version'], '2023-06-01')
 
-    @patch('requests.post')
-    def test_make_api_call(self, mock_post):
+    @patch('drd.api.claude_api.get_session')
+    def test_make_api_call(self, mock_get_session):
         mock_response = MagicMock()
+        mock_post = mock_get_session.return_value.post
         mock_post.return_value = mock_response
         data = {"key": "value"}
         headers = {"header": "value"}
@@ -47,13 +59,15 @@ class TestApiUtils(unittest.TestCase):
         response = make_api_call(data, headers)
 
         mock_post.assert_called_once_with(
-            'https://api.anthropic.com/v1/messages', json=data, headers=headers, stream=False)
+            'https://api.anthropic.com/v1/messages', json=data, headers=headers, stream=False,
+            timeout=(10.0, 300.0))
         self.assertEqual(response, mock_response)
 
     def test_parse_response_valid_xml(self):
         xml_response = "<response><content>Test content</content></response>"
         parsed = parse_response(xml_response)
         self.assertEqual(parsed, xml_response)
+        self.assertEqual(parsed.root.find('content').text, "Test content")
 
     @patch('drd.api.claude_api.click.echo')
     def test_parse_response_invalid_xml(self, mock_echo):
@@ -78,11 +92,11 @@ class TestApiUtils(unittest.TestCase):
 
     @patch('drd.api.claude_api.get_api_key')
     @patch('drd.api.claude_api.make_api_call')
-    @patch('drd.api.claude_api.convert_to_base64')
-    def test_call_claude_vision_api_with_pagination(self, mock_convert_to_base64, mock_make_api_call, mock_get_api_key):
+    @patch('drd.api.claude_api.prepare_images')
+    def test_call_claude_vision_api_with_pagination(self, mock_prepare_images, mock_make_api_call, mock_get_api_key):
         mock_get_api_key.return_value = self.api_key
-        mock_convert_to_base64.return_value = (
-            'image/jpeg', 'base64encodedimagedata')
+        mock_prepare_images.return_value = [
+            PreparedImage('image/jpeg', 'base64encodedimagedata', 100)]
 
         mock_response = MagicMock()
         mock_response.json.return_value = {
@@ -96,8 +110,8 @@ class TestApiUtils(unittest.TestCase):
 
         self.assertEqual(response, "<response>Test vision response</response>")
 
-        # Check if the convert_to_base64 function was called with the correct argument
-        mock_convert_to_base64.assert_called_once_with(self.image_path)
+        # Check if the images were prepared from the given path
+        mock_prepare_images.assert_called_once_with(self.image_path)
 
         # Check if make_api_call was called with the correct arguments
         mock_make_api_call.assert_called_once()
@@ -120,12 +134,210 @@ class TestApiUtils(unittest.TestCase):
     def test_stream_claude_response(self, mock_make_api_call, mock_get_api_key):
         mock_get_api_key.return_value = self.api_key
         mock_response = MagicMock()
-        mock_response.iter_lines.return_value = [
-            b'data: {"type": "content_block_delta", "delta": {"text": "Test"}}',
-            b'data: {"type": "content_block_delta", "delta": {"text": " stream"}}',
-            b'data: {"type": "message_stop"}'
+        mock_response.iter_content.return_value = [
+            b'event: content_block_delta\ndata: {"type": "content_block_delta", "delta": {"text": "Test"}}\n\n',
+            b'event: content_block_delta\ndata: {"type": "content_block_delta", "delta": {"text": " stream"}}\n\n',
+            b'event: message_stop\ndata: {"type": "message_stop"}\n\n'
         ]
         mock_make_api_call.return_value = mock_response
 
         result = list(stream_claude_response(self.query))
         self.assertEqual(result, ["Test", " stream"])
+
+    @patch('drd.api.claude_api.get_api_key')
+    @patch('drd.api.claude_api.make_api_call')
+    @patch('drd.api.claude_api.prepare_images')
+    def test_stream_claude_vision_response(self, mock_prepare_images, mock_make_api_call, mock_get_api_key):
+        mock_get_api_key.return_value = self.api_key
+        mock_prepare_images.return_value = [PreparedImage('image/webp', 'imagedata', 100)]
+        mock_make_api_call.return_value.iter_content.return_value = [
+            b'event: content_block_delta\ndata: {"type": "content_block_delta", "delta": {"text": "Seen"}}\n\n',
+            b'event: message_stop\ndata: {"type": "message_stop"}\n\n'
+        ]
+
+        result = list(stream_claude_vision_response(self.query, self.image_path))
+
+        self.assertEqual(result, ["Seen"])
+        data = mock_make_api_call.call_args[0][0]
+        self.assertTrue(data['stream'])
+        self.assertEqual(data['messages'][0]['content'][0]['source']['media_type'], 'image/webp')
+        self.assertEqual(data['messages'][0]['content'][1]['text'], self.query)
+        self.assertTrue(mock_make_api_call.call_args[1]['stream'])
+
+    @patch('drd.api.claude_api.get_api_key')
+    @patch('drd.api.claude_api.make_api_call')
+    def test_stream_claude_response_skips_ping_and_raises_error_events(self, mock_make_api_call, mock_get_api_key):
+        mock_get_api_key.return_value = self.api_key
+        mock_make_api_call.return_value.iter_content.return_value = [
+            b'event: ping\ndata: {"type": "ping"}\n\nevent: content_block_delta\ndata: {"type": "content_block_',
+            b'delta", "delta": {"text": "Hi"}}\n\n',
+            b'event: error\ndata: {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}}\n\n'
+        ]
+
+        stream = stream_claude_response(self.query)
+        self.assertEqual(next(stream), "Hi")
+        with self.assertRaises(StreamError) as ctx:
+            next(stream)
+        self.assertEqual(ctx.exception.error_type, 'overloaded_error')
+
+    @patch('drd.api.claude_api.get_api_key')
+    @patch('drd.api.claude_api.make_api_call')
+    def test_pagination_prefills_last_segment(self, mock_make_api_call, mock_get_api_key):
+        mock_get_api_key.return_value = self.api_key
+        first, second = MagicMock(), MagicMock()
+        first.json.return_value = {
+            'content': [{'text': "<response><step><type>shell</type>"}],
+            'stop_reason': 'max_tokens'
+        }
+        second.json.return_value = {
+            'content': [{'text': "<command>ls</command></step></response>"}],
+            'stop_reason': 'end_turn'
+        }
+        sent = []
+        mock_make_api_call.side_effect = lambda data, headers: (
+            sent.append(list(data['messages'])), [first, second][len(sent) - 1])[1]
+
+        response = call_claude_api_with_pagination(self.query)
+
+        self.assertEqual(
+            response, "<response><step><type>shell</type><command>ls</command></step></response>")
+        self.assertEqual(len(sent[1]), 2)
+        self.assertEqual(sent[1][1], {'role': 'assistant',
+                                      'content': "<response><step><type>shell</type>"})
+
+    @patch('drd.api.claude_api.get_api_key')
+    @patch('drd.api.claude_api.make_api_call')
+    def test_stream_claude_response_continues_after_max_tokens(self, mock_make_api_call, mock_get_api_key):
+        mock_get_api_key.return_value = self.api_key
+        first, second = MagicMock(), MagicMock()
+        first.iter_content.return_value = [
+            b'data: {"type": "content_block_delta", "delta": {"text": "<response><step>"}}\n\n',
+            b'data: {"type": "message_delta", "delta": {"stop_reason": "max_tokens"}}\n\n',
+            b'data: {"type": "message_stop"}\n\n'
+        ]
+        second.iter_content.return_value = [
+            b'data: {"type": "content_block_delta", "delta": {"text": "</step></response>"}}\n\n',
+            b'data: {"type": "message_delta", "delta": {"stop_reason": "end_turn"}}\n\n',
+            b'data: {"type": "message_stop"}\n\n'
+        ]
+        mock_make_api_call.side_effect = [first, second]
+
+        result = "".join(stream_claude_response(self.query))
+
+        self.assertEqual(result, "<response><step></step></response>")
+        self.assertEqual(mock_make_api_call.call_count, 2)
+        self.assertEqual(mock_make_api_call.call_args[0][0]['messages'][-1],
+                         {'role': 'assistant', 'content': "<response><step>"})
+
+
+class TestPromptCaching(unittest.TestCase):
+
+    def setUp(self):
+        for key in prompt_cache_usage:
+            prompt_cache_usage[key] = 0
+
+    def test_build_system_prompt_marks_cache_control(self):
+        system = build_system_prompt("Instructions")
+        self.assertEqual(system, [{'type': 'text', 'text': "Instructions",
+                                   'cache_control': {'type': 'ephemeral'}}])
+
+    def test_build_system_prompt_empty(self):
+        self.assertEqual(build_system_prompt(None), "")
+
+    def test_build_user_content_without_prefix(self):
+        self.assertEqual(build_user_content("plain query"), "plain query")
+
+    def test_build_user_content_splits_project_context(self):
+        with prompt_cache_prefix('{"project": "ctx"}'):
+            content = build_user_content(
+                '\n{"project": "ctx"}\nUser query: add tests')
+        self.assertEqual(content[0]['text'], '\n{"project": "ctx"}')
+        self.assertEqual(content[0]['cache_control'], {'type': 'ephemeral'})
+        self.assertEqual(content[1], {'type': 'text',
+                                      'text': '\nUser query: add tests'})
+
+    def test_build_user_content_prefix_not_in_query(self):
+        with prompt_cache_prefix("missing context"):
+            self.assertEqual(build_user_content("query"), "query")
+
+    def test_build_user_content_prefix_after_other_text(self):
+        # marking it would cache the text before it along with the context
+        with prompt_cache_prefix("CONTEXT"):
+            self.assertEqual(build_user_content("Error: boom\nCONTEXT"), "Error: boom\nCONTEXT")
+
+    def test_monitor_error_prompt_caches_only_the_project_context(self):
+        context = '{"project": "ctx"}'
+        with prompt_cache_prefix(context):
+            content = build_user_content(get_error_resolution_prompt(
+                'ValueError', 'bad value 42', 'Traceback: line 7', 'stdout line', context, 'app.py'))
+        cached = content[0]
+        self.assertEqual(cached['cache_control'], {'type': 'ephemeral'})
+        self.assertEqual(cached['text'].strip(), context)
+        for per_error in ['ValueError', 'bad value 42', 'Traceback: line 7', 'stdout line', 'app.py']:
+            self.assertIn(per_error, content[1]['text'])
+
+    def test_prompt_cache_prefix_resets(self):
+        with prompt_cache_prefix("ctx"):
+            pass
+        self.assertEqual(build_user_content("ctx and query"), "ctx and query")
+
+    def test_record_usage(self):
+        record_usage({'input_tokens': 10, 'cache_read_input_tokens': 2000})
+        record_usage({'cache_creation_input_tokens': 500, 'output_tokens': 40})
+        usage = get_prompt_cache_usage()
+        self.assertEqual(usage['input_tokens'], 10)
+        self.assertEqual(usage['cache_read_input_tokens'], 2000)
+        self.assertEqual(usage['cache_creation_input_tokens'], 500)
+        self.assertEqual(usage['output_tokens'], 40)
+
+    @patch('drd.api.claude_api.get_api_key', return_value="key")
+    @patch('drd.api.claude_api.make_api_call')
+    def test_pagination_sends_cached_blocks_and_records_usage(self, mock_make_api_call, _):
+        mock_make_api_call.return_value.json.return_value = {
+            'content': [{'text': "<response>ok</response>"}],
+            'stop_reason': 'end_turn',
+            'usage': {'input_tokens': 12, 'cache_read_input_tokens': 1800}
+        }
+        with prompt_cache_prefix("CONTEXT"):
+            call_claude_api_with_pagination(
+                "CONTEXT then query", instruction_prompt="system")
+
+        data = mock_make_api_call.call_args[0][0]
+        self.assertEqual(data['system'][0]['cache_control'],
+                         {'type': 'ephemeral'})
+        self.assertEqual(data['messages'][0]['content'][0]['text'], "CONTEXT")
+        self.assertEqual(
+            get_prompt_cache_usage()['cache_read_input_tokens'], 1800)
+
+    @patch('drd.api.claude_api.get_api_key', return_value="key")
+    @patch('drd.api.claude_api.make_api_call')
+    def test_stream_records_cache_usage(self, mock_make_api_call, _):
+        mock_make_api_call.return_value.iter_content.return_value = [
+            b'data: {"type": "message_start", "message": {"usage": {"input_tokens": 5, "cache_creation_input_tokens": 1500, "output_tokens": 1}}}\n\n',
+            b'data: {"type": "content_block_delta", "delta": {"text": "Hi"}}\n\n',
+            b'data: {"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": 7}}\n\n',
+            b'data: {"type": "message_stop"}\n\n'
+        ]
+        self.assertEqual(list(stream_claude_response("query")), ["Hi"])
+        usage = get_prompt_cache_usage()
+        self.assertEqual(usage['cache_creation_input_tokens'], 1500)
+        self.assertEqual(usage['output_tokens'], 7)
+
+
+class TestAsyncClaudeApi(unittest.IsolatedAsyncioTestCase):
+
+    @patch('drd.api.claude_api.get_api_key', return_value="key")
+    @patch('drd.api.claude_api.async_make_api_call', new_callable=AsyncMock)
+    async def test_async_call_claude_api_with_pagination(self, mock_make_api_call, _):
+        first = MagicMock()
+        first.json.return_value = {
+            'content': [{'text': "<response>part one "}], 'stop_reason': 'max_tokens'}
+        second = MagicMock()
+        second.json.return_value = {
+            'content': [{'text': "part two</response>"}], 'stop_reason': 'end_turn'}
+        mock_make_api_call.side_effect = [first, second]
+
+        response = await async_call_claude_api_with_pagination("query")
+
+        self.assertEqual(response, "<response>part one part two</response>")
+        self.assertEqual(mock_make_api_call.await_count, 2)
@@ -0,0 +1,107 @@
+import unittest
+
+from drd.api.continuation import (
+    Continuation,
+    find_overlap,
+    tail_segment,
+    MAX_CONTINUATIONS,
+    PREFILL_TAIL_CHARS,
+    CONTINUE_PROMPT,
+)
+
+
+class TestContinuation(unittest.TestCase):
+
+    def setUp(self):
+        self.messages = [{'role': 'user', 'content': 'query'}]
+
+    def test_find_overlap(self):
+        self.assertEqual(find_overlap("abc<step>hello", "<step>hello world"), 11)
+        self.assertEqual(find_overlap("abcdef", "xyz"), 0)
+
+    def test_tail_segment_strips_trailing_whitespace(self):
+        self.assertEqual(tail_segment("abc  \n"), "abc")
+        self.assertEqual(len(tail_segment("x" * 5000)), PREFILL_TAIL_CHARS)
+
+    def test_next_messages_prefills_only_the_tail(self):
+        continuation = Continuation(self.messages)
+        continuation.add("x" * 5000)
+        messages = continuation.next_messages()
+
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(messages[0], self.messages[0])
+        self.assertEqual(messages[1]['role'], 'assistant')
+        self.assertEqual(len(messages[1]['content']), PREFILL_TAIL_CHARS)
+
+    def test_next_messages_without_prefill_asks_to_continue(self):
+        continuation = Continuation(self.messages, prefill=False)
+        continuation.add("partial")
+        messages = continuation.next_messages()
+
+        self.assertEqual(messages[-1], {'role': 'user', 'content': CONTINUE_PROMPT})
+        self.assertEqual(len(messages), 3)
+
+    def test_add_removes_repeated_text(self):
+        continuation = Continuation(self.messages, prefill=False)
+        continuation.add("<response><step><type>shell</type><command>")
+        continuation.next_messages()
+        continuation.add("<type>shell</type><command>ls</command></step></response>")
+
+        self.assertEqual(continuation.text,
+                         "<response><step><type>shell</type><command>ls</command></step></response>")
+
+    def test_add_restores_whitespace_dropped_from_prefill(self):
+        continuation = Continuation(self.messages)
+        continuation.add("<response>\n  ")
+        continuation.next_messages()
+        continuation.add("\n  <step/></response>")
+
+        self.assertEqual(continuation.text, "<response>\n  <step/></response>")
+
+    def test_short_overlap_is_kept(self):
+        continuation = Continuation(self.messages)
+        continuation.add("ab")
+        continuation.next_messages()
+        continuation.add("abc")
+
+        self.assertEqual(continuation.text, "ababc")
+
+    def test_stream_trims_continuation_head(self):
+        continuation = Continuation(self.messages, prefill=False)
+        first = list(continuation.stream(["<response><step>", "<command>npm install"]))
+        continuation.next_messages()
+        second = list(continuation.stream(
+            ["<command>npm ", "install --save</command>", "</step></response>"]))
+
+        self.assertEqual(first, ["<response><step>", "<command>npm install"])
+        self.assertEqual("".join(first + second),
+                         "<response><step><command>npm install --save</command></step></response>")
+        self.assertEqual(continuation.text, "".join(first + second))
+
+    def test_prefilled_continuation_keeps_repetitive_output(self):
+        rows = "id,name,value\n" + "1,fixture,0\n" * 200
+        continuation = Continuation(self.messages)
+        continuation.add(rows)
+        continuation.next_messages()
+        # the next rows look like the tail written before, but they are new
+        continuation.add("1,fixture,0\n" * 50)
+        self.assertEqual(continuation.text, rows + "1,fixture,0\n" * 50)
+
+        streamed = Continuation(self.messages)
+        list(streamed.stream([rows]))
+        streamed.next_messages()
+        second = list(streamed.stream(["1,fixture,0\n" * 25, "1,fixture,0\n" * 25]))
+        self.assertEqual("".join(second), "1,fixture,0\n" * 50)
+        self.assertEqual(streamed.text, continuation.text)
+
+    def test_should_continue_is_bounded(self):
+        continuation = Continuation(self.messages)
+        self.assertFalse(continuation.should_continue(False))
+        for _ in range(MAX_CONTINUATIONS):
+            self.assertTrue(continuation.should_continue(True))
+            continuation.next_messages()
+        self.assertFalse(continuation.should_continue(True))
+
+
+if __name__ == '__main__':
+    unittest.main()
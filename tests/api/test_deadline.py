@@ -0,0 +1,121 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+import time
+import asyncio
+import pytest
+import requests
+
+from drd.api.deadline import (
+    deadline_scope,
+    get_budget,
+    request_timeout,
+    guard_stream,
+    remaining_time,
+    DeadlineExceeded,
+    DO,
+    META_INIT,
+)
+from drd.api.retry import call_with_retries, async_call_with_retries
+from drd.api.claude_api import call_claude_api_with_pagination
+
+
+class TestDeadline(unittest.TestCase):
+
+    def test_no_deadline_outside_an_operation(self):
+        self.assertIsNone(remaining_time())
+        self.assertEqual(request_timeout(), (10.0, 300.0))
+        self.assertEqual(request_timeout(stream=True), (10.0, 60.0))
+
+    @patch.dict(os.environ, {'DRAVID_DEADLINE_DO': '5'})
+    def test_timeouts_shrink_with_the_budget(self):
+        with deadline_scope(DO):
+            connect, read = request_timeout()
+        self.assertLessEqual(read, 5)
+        self.assertLessEqual(connect, 5)
+
+    @patch.dict(os.environ, {'DRAVID_DEADLINE_META_INIT': '0'})
+    def test_zero_budget_disables_the_deadline(self):
+        self.assertIsNone(get_budget(META_INIT))
+        with deadline_scope(META_INIT) as deadline:
+            self.assertIsNone(deadline)
+
+    def test_nested_operation_cannot_outlive_its_parent(self):
+        with deadline_scope(DO, budget=1) as outer:
+            with deadline_scope(META_INIT, budget=100) as inner:
+                self.assertIs(inner, outer)
+            with deadline_scope(META_INIT, budget=0.5) as inner:
+                self.assertLess(inner.remaining(), 0.6)
+
+    def test_expired_deadline_rejects_new_requests(self):
+        with deadline_scope(DO, budget=0.01):
+            time.sleep(0.02)
+            with self.assertRaises(DeadlineExceeded):
+                request_timeout()
+
+    def test_guard_stream_stops_a_slow_stream(self):
+        def slow():
+            for chunk in ('a', 'b', 'c'):
+                time.sleep(0.05)
+                yield chunk
+
+        received = []
+        with deadline_scope(DO, budget=0.08), self.assertRaises(DeadlineExceeded):
+            for chunk in guard_stream(slow()):
+                received.append(chunk)
+        self.assertEqual(received, ['a'])
+
+    def test_retries_stop_at_the_deadline(self):
+        func = MagicMock(side_effect=requests.Timeout("read timed out"))
+        with deadline_scope(DO, budget=0.01):
+            time.sleep(0.02)
+            with self.assertRaises(DeadlineExceeded):
+                call_with_retries('claude', func)
+        func.assert_not_called()
+
+    def test_timeout_at_the_deadline_is_reported_as_deadline(self):
+        def timed_out():
+            time.sleep(0.03)
+            raise requests.ReadTimeout("read timed out")
+
+        with deadline_scope(DO, budget=0.02), self.assertRaises(DeadlineExceeded) as ctx:
+            call_with_retries('claude', timed_out)
+        self.assertIsInstance(ctx.exception.__cause__, requests.ReadTimeout)
+
+
+class TestAsyncDeadline(unittest.IsolatedAsyncioTestCase):
+
+    async def test_hanging_call_is_cancelled(self):
+        cancelled = asyncio.Event()
+
+        async def hang():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        start = time.perf_counter()
+        with deadline_scope(META_INIT, budget=0.05), self.assertRaises(DeadlineExceeded):
+            await async_call_with_retries('claude', hang)
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertTrue(cancelled.is_set())
+
+
+@patch.dict(os.environ, {'CLAUDE_API_KEY': 'fake-key'})
+class TestDeadlineAgainstServer(unittest.TestCase):
+
+    @pytest.fixture(autouse=True)
+    def use_server(self, fake_llm_server):
+        self.server = fake_llm_server
+
+    def test_hung_server_fails_within_the_budget(self):
+        self.server.configure(latency=5)
+        start = time.perf_counter()
+        with deadline_scope(DO, budget=0.3), self.assertRaises(DeadlineExceeded):
+            call_claude_api_with_pagination("Hi")
+        self.assertLess(time.perf_counter() - start, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
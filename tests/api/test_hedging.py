@@ -0,0 +1,193 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+import time
+import threading
+import pytest
+
+from drd.api.hedging import (
+    hedged_stream,
+    get_hedge_route,
+    get_hedge_deadline,
+    get_hedge_stats,
+    record_ttft,
+    reset_hedging,
+    MIN_TTFT_SAMPLES,
+)
+from drd.api.routing import Route, get_route
+from drd.api.main import stream_dravid_api, get_provider_name
+from drd.api.transport import get_session
+
+BACKUP = Route('azure')
+
+
+class Pause:
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+
+class FakeStreams:
+    def __init__(self, primary, backup, primary_delay=0.0, backup_delay=0.0):
+        self.streams = {'primary': (primary, primary_delay),
+                        'backup': (backup, backup_delay)}
+        self.opened = []
+        self.closed = threading.Event()
+
+    def open(self):
+        name = 'backup' if get_route() == BACKUP else 'primary'
+        self.opened.append(name)
+        return self.generate(name, *self.streams[name])
+
+    def generate(self, name, chunks, delay):
+        try:
+            time.sleep(delay)
+            for chunk in chunks:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                if isinstance(chunk, Pause):
+                    time.sleep(chunk.seconds)
+                    continue
+                yield chunk
+                time.sleep(0.01)
+        finally:
+            if name == 'primary':
+                self.closed.set()
+
+
+class TestHedging(unittest.TestCase):
+
+    def setUp(self):
+        reset_hedging()
+
+    def tearDown(self):
+        reset_hedging()
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_without_backup_streams_directly(self):
+        streams = FakeStreams(['<response>', '</response>'], [])
+        self.assertEqual(''.join(hedged_stream(streams.open, 'claude')), '<response></response>')
+        self.assertEqual(streams.opened, ['primary'])
+
+    @patch.dict(os.environ, {'DRAVID_HEDGE_DEADLINE': '1'})
+    def test_fast_primary_wins_without_hedging(self):
+        streams = FakeStreams(['<response>', 'ok', '</response>'], ['<response>backup</response>'])
+        result = ''.join(hedged_stream(streams.open, 'claude', BACKUP))
+        self.assertEqual(result, '<response>ok</response>')
+        self.assertEqual(streams.opened, ['primary'])
+
+    @patch.dict(os.environ, {'DRAVID_HEDGE_DEADLINE': '0.05'})
+    def test_slow_primary_is_hedged_and_cancelled(self):
+        streams = FakeStreams(['<response>', 'slow', '</response>'], ['<resp', 'onse>fast</response>'],
+                              primary_delay=0.5)
+        result = ''.join(hedged_stream(streams.open, 'claude', BACKUP))
+        self.assertEqual(result, '<response>fast</response>')
+        self.assertEqual(streams.opened, ['primary', 'backup'])
+        self.assertTrue(streams.closed.wait(2))
+        self.assertEqual(get_hedge_stats(), {'hedged': 1, 'backup_wins': 1})
+
+    @patch.dict(os.environ, {'DRAVID_HEDGE_DEADLINE': '5'})
+    def test_failed_primary_fails_over(self):
+        streams = FakeStreams([ConnectionError('reset')], ['<response>backup</response>'])
+        result = ''.join(hedged_stream(streams.open, 'claude', BACKUP))
+        self.assertEqual(result, '<response>backup</response>')
+        self.assertEqual(get_hedge_stats()['failover'], 1)
+
+    @patch.dict(os.environ, {'DRAVID_HEDGE_DEADLINE': '5'})
+    def test_both_failing_raises_primary_error(self):
+        streams = FakeStreams([ConnectionError('primary')], [ValueError('backup')])
+        with self.assertRaises(ConnectionError):
+            list(hedged_stream(streams.open, 'claude', BACKUP))
+
+    @patch.dict(os.environ, {'DRAVID_HEDGE_DEADLINE': '0.05'})
+    def test_first_output_wins_without_marker(self):
+        streams = FakeStreams(['slow answer'], ['fast answer'], primary_delay=0.5)
+        result = ''.join(hedged_stream(streams.open, 'claude', BACKUP, marker=None))
+        self.assertEqual(result, 'fast answer')
+
+    @patch.dict(os.environ, {'DRAVID_HEDGE_DEADLINE': '0.05'})
+    def test_fast_refusal_does_not_beat_a_valid_response(self):
+        streams = FakeStreams(['<response>', 'slow', '</response>'], ['I cannot help with that.'],
+                              primary_delay=0.3)
+        result = ''.join(hedged_stream(streams.open, 'claude', BACKUP))
+        self.assertEqual(result, '<response>slow</response>')
+        self.assertEqual(streams.opened, ['primary', 'backup'])
+        self.assertNotIn('backup_wins', get_hedge_stats())
+
+    @patch.dict(os.environ, {'DRAVID_HEDGE_DEADLINE': '0.05'})
+    def test_primary_streaming_a_preamble_is_not_hedged(self):
+        streams = FakeStreams(['Sure, ', Pause(0.3), '<response>ok</response>'], ['<response>backup</response>'])
+        result = ''.join(hedged_stream(streams.open, 'claude', BACKUP))
+        self.assertEqual(result, 'Sure, <response>ok</response>')
+        self.assertEqual(streams.opened, ['primary'])
+
+    @patch.dict(os.environ, {'DRAVID_HEDGE_PERCENTILE': '90'})
+    def test_deadline_follows_ttft_percentile(self):
+        for i in range(MIN_TTFT_SAMPLES * 5):
+            record_ttft('claude', (i + 1) / 100)
+        self.assertAlmostEqual(get_hedge_deadline('claude'), 0.91)
+
+    @patch.dict(os.environ, {'DRAVID_HEDGE_DEADLINE': '7'})
+    def test_deadline_falls_back_without_samples(self):
+        self.assertEqual(get_hedge_deadline('claude'), 7.0)
+
+    @patch.dict(os.environ, {'DRAVID_HEDGE_PROVIDER': 'ollama:llama3:8b'})
+    def test_get_hedge_route(self):
+        self.assertEqual(get_hedge_route(), Route('ollama', 'llama3:8b'))
+        with patch.dict(os.environ, {'DRAVID_HEDGE_PROVIDER': 'azure'}):
+            self.assertEqual(get_hedge_route(), Route('azure'))
+
+
+@patch.dict(os.environ, {'DRAVID_HEDGE_DEADLINE': '0.1'})
+class TestHedgingAgainstServer(unittest.TestCase):
+
+    @pytest.fixture(autouse=True)
+    def use_server(self, fake_llm_server):
+        self.server = fake_llm_server
+
+    def test_hung_primary_is_closed_before_its_first_byte(self):
+        self.server.configure(latency=5)
+        primary_done = threading.Event()
+
+        def open_stream():
+            if get_route() == BACKUP:
+                return iter(['<response>backup</response>'])
+            return hung()
+
+        def hung():
+            try:
+                response = get_session().post(self.server.url + "/v1/messages", json={},
+                                              stream=True, timeout=(5, 10))
+                yield from response.iter_content(chunk_size=None)
+            finally:
+                primary_done.set()
+
+        start = time.perf_counter()
+        result = ''.join(hedged_stream(open_stream, 'claude', BACKUP))
+        self.assertEqual(result, '<response>backup</response>')
+        self.assertTrue(primary_done.wait(2))
+        self.assertLess(time.perf_counter() - start, 2)
+
+
+class TestHedgedDravidStream(unittest.TestCase):
+
+    @patch.dict(os.environ, {'DRAVID_LLM': 'claude', 'DRAVID_HEDGE_PROVIDER': 'azure',
+                             'DRAVID_HEDGE_DEADLINE': '0.05'})
+    @patch('drd.api.main.Loader')
+    @patch('drd.api.main.pretty_print_xml_stream')
+    @patch('drd.api.main.get_api_functions')
+    def test_backup_provider_answers_slow_primary(self, mock_get_api_functions, mock_pretty_print, mock_loader):
+        def slow(query, instruction_prompt):
+            time.sleep(0.5)
+            yield '<response>claude</response>'
+
+        def fast(query, instruction_prompt):
+            yield '<response>azure</response>'
+
+        mock_get_api_functions.side_effect = lambda: (
+            None, None, fast if get_provider_name() == 'azure' else slow)
+
+        self.assertEqual(stream_dravid_api('query'), '<response>azure</response>')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+import requests
+
+from drd.api.ollama_api import (
+    get_ollama_endpoint,
+    get_num_ctx,
+    call_ollama_api,
+    warm_up_ollama,
+    MIN_NUM_CTX,
+)
+from drd.api.scheduler import get_scheduler
+from drd.api.telemetry import track_call
+from drd.api.main import warm_up_provider
+
+
+def chat_response(content, **fields):
+    response = MagicMock(status_code=200, headers={})
+    response.json.return_value = dict(
+        {"message": {"role": "assistant", "content": content}, "done": True, "done_reason": "stop"}, **fields)
+    return response
+
+
+class TestOllamaApi(unittest.TestCase):
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_endpoint_defaults_to_local_server(self):
+        self.assertEqual(get_ollama_endpoint(), "http://localhost:11434/api")
+
+    @patch.dict(os.environ, {"OLLAMA_HOST": "10.0.0.5:11434"})
+    def test_endpoint_follows_ollama_host(self):
+        self.assertEqual(get_ollama_endpoint(), "http://10.0.0.5:11434/api")
+        with patch.dict(os.environ, {"OLLAMA_HOST": "https://ollama.internal/"}):
+            self.assertEqual(get_ollama_endpoint(), "https://ollama.internal/api")
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_num_ctx_grows_in_powers_of_two(self):
+        self.assertEqual(get_num_ctx([{"content": "short"}]), MIN_NUM_CTX)
+        self.assertEqual(get_num_ctx([{"content": "x" * 4 * 10000}]), 16384)
+        self.assertEqual(get_num_ctx([{"content": "x" * 4 * 100000}]), 32768)
+        with patch.dict(os.environ, {"DRAVID_OLLAMA_MAX_CTX": "131072"}):
+            self.assertEqual(get_num_ctx([{"content": "x" * 4 * 100000}]), 131072)
+
+    @patch.dict(os.environ, {"DRAVID_OLLAMA_KEEP_ALIVE": "-1"})
+    @patch('drd.api.ollama_api.get_session')
+    def test_keep_alive_is_configurable(self, mock_get_session):
+        mock_get_session.return_value.post.return_value = chat_response("ok")
+        call_ollama_api("llama3", "query")
+        self.assertEqual(mock_get_session.return_value.post.call_args[1]['json']['keep_alive'], "-1")
+
+    @patch('drd.api.ollama_api.get_session')
+    def test_server_timings_are_recorded(self, mock_get_session):
+        mock_get_session.return_value.post.return_value = chat_response(
+            "ok", load_duration=2_000_000_000, prompt_eval_duration=500_000_000,
+            eval_duration=250_000_000, prompt_eval_count=100, eval_count=50)
+
+        with track_call('ollama', 'llama3', 'call', 'query') as metrics:
+            call_ollama_api("llama3", "query")
+
+        self.assertEqual(metrics.load_duration, 2.0)
+        self.assertEqual(metrics.prompt_eval_duration, 0.5)
+        self.assertEqual(metrics.eval_duration, 0.25)
+        self.assertEqual(metrics.tokens_per_second, 200)
+
+    @patch('drd.api.ollama_api.get_session')
+    def test_warm_up_loads_model_without_messages(self, mock_get_session):
+        warm_up_ollama("llama3")
+        data = mock_get_session.return_value.post.call_args[1]['json']
+        self.assertEqual(data['messages'], [])
+        self.assertEqual(data['options']['num_ctx'], MIN_NUM_CTX)
+
+    @patch('drd.api.ollama_api.get_session')
+    def test_warm_up_ignores_unreachable_server(self, mock_get_session):
+        mock_get_session.return_value.post.side_effect = requests.ConnectionError()
+        warm_up_ollama("llama3")
+
+    @patch.dict(os.environ, {"DRAVID_LLM": "ollama", "DRAVID_LLM_MODEL": "llama3"})
+    @patch('drd.api.ollama_api.warm_up_ollama')
+    def test_warm_up_provider_starts_for_ollama(self, mock_warm_up):
+        warm_up_provider().join(1)
+        mock_warm_up.assert_called_once_with("llama3")
+
+    @patch.dict(os.environ, {"DRAVID_LLM": "claude"})
+    @patch('drd.api.ollama_api.warm_up_ollama')
+    def test_warm_up_provider_skips_remote_providers(self, mock_warm_up):
+        self.assertIsNone(warm_up_provider())
+        mock_warm_up.assert_not_called()
+
+    @patch.dict(os.environ, {"OLLAMA_NUM_PARALLEL": "2"})
+    def test_concurrency_matches_server_parallelism(self):
+        scheduler = get_scheduler('ollama')
+        self.assertEqual(scheduler.max_concurrency, 2)
+        self.assertEqual(scheduler.concurrency, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 import requests
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, ANY, AsyncMock
 import os
 from openai import OpenAI, AzureOpenAI
 
@@ -10,10 +10,14 @@ from drd.api.openai_api import (
     get_model,
     parse_response,
     call_api_with_pagination,
+    async_call_api_with_pagination,
+    get_async_client,
     call_vision_api_with_pagination,
     stream_response,
+    stream_vision_response,
     DEFAULT_MODEL
 )
+from drd.utils.image_utils import PreparedImage
 
 
 class TestOpenAIApiUtils(unittest.TestCase):
@@ -116,16 +120,16 @@ class TestOpenAIApiUtils(unittest.TestCase):
 
     @patch('drd.api.openai_api.get_client')
     @patch('drd.api.openai_api.get_model')
-    @patch('drd.api.openai_api.convert_to_base64')
+    @patch('drd.api.openai_api.prepare_images')
     @patch.dict(os.environ, {"DRAVID_LLM": "openai", "OPENAI_MODEL": DEFAULT_MODEL})
-    def test_call_vision_api_with_pagination(self, mock_convert_to_base64, mock_get_model, mock_get_client):
+    def test_call_vision_api_with_pagination(self, mock_prepare_images, mock_get_model, mock_get_client):
         mock_client = MagicMock()
         mock_get_client.return_value = mock_client
         mock_get_model.return_value = DEFAULT_MODEL
 
-        # Mock the convert_to_base64 function
-        mock_convert_to_base64.return_value = (
-            'jpeg', 'base64encodedimagedata')
+        # Mock the image preparation
+        mock_prepare_images.return_value = [
+            PreparedImage('image/jpeg', 'base64encodedimagedata', 100)]
 
         mock_response = MagicMock()
         mock_response.choices[0].message.content = "<response>Test vision response</response>"
@@ -135,8 +139,8 @@ class TestOpenAIApiUtils(unittest.TestCase):
         response = call_vision_api_with_pagination(self.query, self.image_path)
         self.assertEqual(response, "<response>Test vision response</response>")
 
-        # Check if convert_to_base64 was called with the correct argument
-        mock_convert_to_base64.assert_called_once_with(self.image_path)
+        # Check if the images were prepared from the given path
+        mock_prepare_images.assert_called_once_with(self.image_path)
 
         mock_client.chat.completions.create.assert_called_once()
         call_args = mock_client.chat.completions.create.call_args[1]
@@ -177,6 +181,58 @@ class TestOpenAIApiUtils(unittest.TestCase):
         self.assertEqual(call_args['messages'][1]['content'], self.query)
         self.assertTrue(call_args['stream'])
 
+    @patch('drd.api.openai_api.get_client')
+    @patch('drd.api.openai_api.get_model')
+    @patch('drd.api.openai_api.prepare_images')
+    @patch.dict(os.environ, {"DRAVID_LLM": "openai", "OPENAI_MODEL": DEFAULT_MODEL})
+    def test_stream_vision_response(self, mock_prepare_images, mock_get_model, mock_get_client):
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_get_model.return_value = DEFAULT_MODEL
+        mock_prepare_images.return_value = [
+            PreparedImage('image/webp', 'first', 100), PreparedImage('image/png', 'second', 100)]
+        mock_response = MagicMock()
+        mock_response.__iter__.return_value = [
+            MagicMock(choices=[MagicMock(delta=MagicMock(content="Seen"))])]
+        mock_client.chat.completions.create.return_value = mock_response
+
+        result = list(stream_vision_response(self.query, ["a.webp", "b.png"]))
+
+        self.assertEqual(result, ["Seen"])
+        call_args = mock_client.chat.completions.create.call_args[1]
+        self.assertTrue(call_args['stream'])
+        self.assertEqual([part.get('image_url', {}).get('url') for part in call_args['messages'][1]['content']],
+                         [None, 'data:image/webp;base64,first', 'data:image/png;base64,second'])
+
+    @patch.dict(os.environ, {"DRAVID_LLM": "ollama", "DRAVID_LLM_MODEL": "starcoder"})
+    def test_stream_vision_response_ollama(self):
+        with self.assertRaises(NotImplementedError):
+            list(stream_vision_response(self.query, self.image_path))
+
+    @patch('drd.api.openai_api.get_client')
+    @patch('drd.api.openai_api.get_model')
+    @patch.dict(os.environ, {"DRAVID_LLM": "openai", "OPENAI_MODEL": DEFAULT_MODEL})
+    def test_call_api_with_pagination_continues_after_length(self, mock_get_model, mock_get_client):
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_get_model.return_value = DEFAULT_MODEL
+
+        first = MagicMock()
+        first.choices[0].message.content = "<response><step>"
+        first.choices[0].finish_reason = 'length'
+        second = MagicMock()
+        second.choices[0].message.content = "</step></response>"
+        second.choices[0].finish_reason = 'stop'
+        mock_client.chat.completions.create.side_effect = [first, second]
+
+        response = call_api_with_pagination(self.query)
+
+        self.assertEqual(response, "<response><step></step></response>")
+        self.assertEqual(response.root.find('step').tag, 'step')
+        messages = mock_client.chat.completions.create.call_args[1]['messages']
+        self.assertEqual(len(messages), 4)
+        self.assertEqual(messages[2], {'role': 'assistant', 'content': "<response><step>"})
+
     @patch.dict(os.environ, {"DRAVID_LLM": "ollama", "DRAVID_LLM_MODEL": "starcoder"})
     def test_get_client_ollama(self):
         client = get_client()
@@ -187,73 +243,137 @@ class TestOpenAIApiUtils(unittest.TestCase):
         model = get_model()
         self.assertEqual(model, "starcoder")
 
-    @patch('requests.post')
+    @patch('drd.api.ollama_api.get_session')
     @patch.dict(os.environ, {"DRAVID_LLM": "ollama", "DRAVID_LLM_MODEL": "starcoder"})
-    def test_call_api_with_pagination_ollama(self, mock_post):
-        mock_response = MagicMock()
+    def test_call_api_with_pagination_ollama(self, mock_get_session):
+        mock_response = MagicMock(status_code=200, headers={})
         mock_response.json.return_value = {
-            "response": "<response>Test Ollama response</response>"}
-        mock_post.return_value = mock_response
+            "message": {"role": "assistant", "content": "<response>Test Ollama response</response>"},
+            "done": True, "done_reason": "stop"}
+        mock_get_session.return_value.post.return_value = mock_response
 
         response = call_api_with_pagination(self.query)
         self.assertEqual(response, "<response>Test Ollama response</response>")
 
-        mock_post.assert_called_once_with(
-            "http://localhost:11434/api/generate",
+        mock_get_session.return_value.post.assert_called_once_with(
+            "http://localhost:11434/api/chat",
             json={
                 "model": "starcoder",
-                "prompt": self.query,
-                "system": "",
-                "stream": False
-            }
+                "messages": [{"role": "user", "content": self.query}],
+                "stream": False,
+                "keep_alive": "30m",
+                "options": {"num_ctx": 8192, "num_predict": 4096}
+            },
+            timeout=(10.0, 300.0)
         )
 
+    @patch('drd.api.ollama_api.get_session')
+    @patch.dict(os.environ, {"DRAVID_LLM": "ollama", "DRAVID_LLM_MODEL": "starcoder"})
+    def test_call_api_with_pagination_ollama_continues_truncated_output(self, mock_get_session):
+        first, second = MagicMock(status_code=200, headers={}), MagicMock(status_code=200, headers={})
+        first.json.return_value = {"message": {"content": "<response>part one"}, "done_reason": "length"}
+        second.json.return_value = {"message": {"content": " part two</response>"}, "done_reason": "stop"}
+        mock_get_session.return_value.post.side_effect = [first, second]
+
+        response = call_api_with_pagination(self.query)
+
+        self.assertEqual(response, "<response>part one part two</response>")
+        messages = mock_get_session.return_value.post.call_args_list[1][1]['json']['messages']
+        self.assertEqual(messages[1], {"role": "assistant", "content": "<response>part one"})
+
     @patch.dict(os.environ, {"DRAVID_LLM": "ollama", "DRAVID_LLM_MODEL": "starcoder"})
     def test_call_vision_api_with_pagination_ollama(self):
         with self.assertRaises(NotImplementedError):
             call_vision_api_with_pagination(self.query, self.image_path)
 
-    @patch('requests.post')
+    @patch('drd.api.ollama_api.get_session')
     @patch.dict(os.environ, {"DRAVID_LLM": "ollama", "DRAVID_LLM_MODEL": "starcoder"})
-    def test_stream_response_ollama(self, mock_post):
-        mock_response = MagicMock()
+    def test_stream_response_ollama(self, mock_get_session):
+        mock_response = MagicMock(status_code=200, headers={})
         mock_response.iter_lines.return_value = [
-            b'{"response":"Test"}',
-            b'{"response":" stream"}',
-            b'{"done":true}'
+            b'{"message":{"content":"Test"},"done":false}',
+            b'{"message":{"content":" stream"},"done":false}',
+            b'{"message":{"content":""},"done":true,"done_reason":"stop"}'
         ]
-        mock_post.return_value = mock_response
+        mock_get_session.return_value.post.return_value = mock_response
 
-        result = list(stream_response(self.query))
+        result = list(stream_response(self.query, "system"))
         self.assertEqual(result, ["Test", " stream"])
 
-        mock_post.assert_called_once_with(
-            "http://localhost:11434/api/generate",
+        mock_get_session.return_value.post.assert_called_once_with(
+            "http://localhost:11434/api/chat",
             json={
                 "model": "starcoder",
-                "prompt": self.query,
-                "system": "",
-                "stream": True
+                "messages": [{"role": "system", "content": "system"},
+                             {"role": "user", "content": self.query}],
+                "stream": True,
+                "keep_alive": "30m",
+                "options": {"num_ctx": 8192, "num_predict": 4096}
             },
-            stream=True
+            stream=True,
+            timeout=(10.0, 60.0)
         )
+        mock_response.close.assert_called_once()
 
-    @patch('requests.post')
+    @patch('drd.api.ollama_api.get_session')
     @patch.dict(os.environ, {"DRAVID_LLM": "ollama", "DRAVID_LLM_MODEL": "starcoder"})
-    def test_call_api_with_pagination_ollama_error(self, mock_post):
-        mock_post.side_effect = requests.RequestException("Ollama API error")
+    def test_call_api_with_pagination_ollama_error(self, mock_get_session):
+        mock_get_session.return_value.post.side_effect = requests.RequestException("Ollama API error")
 
         with self.assertRaises(requests.RequestException):
             call_api_with_pagination(self.query)
 
-    @patch('requests.post')
+    @patch('drd.api.ollama_api.get_session')
     @patch.dict(os.environ, {"DRAVID_LLM": "ollama", "DRAVID_LLM_MODEL": "starcoder"})
-    def test_stream_response_ollama_error(self, mock_post):
-        mock_post.side_effect = requests.RequestException("Ollama API error")
+    def test_stream_response_ollama_error(self, mock_get_session):
+        mock_get_session.return_value.post.side_effect = requests.RequestException("Ollama API error")
 
         with self.assertRaises(requests.RequestException):
             list(stream_response(self.query))
 
 
+class TestAsyncOpenAIApi(unittest.IsolatedAsyncioTestCase):
+
+    @patch.dict(os.environ, {"DRAVID_LLM": "openai", "OPENAI_API_KEY": "test_key"})
+    async def test_get_async_client_is_reused_on_loop(self):
+        client = get_async_client()
+        self.assertIs(client, get_async_client())
+
+    @patch.dict(os.environ, {"DRAVID_LLM": "ollama", "DRAVID_LLM_MODEL": "starcoder"})
+    async def test_get_async_client_ollama_unsupported(self):
+        with self.assertRaises(ValueError):
+            get_async_client()
+
+    @patch('drd.api.openai_api.get_async_client')
+    @patch.dict(os.environ, {"DRAVID_LLM": "openai", "OPENAI_MODEL": DEFAULT_MODEL})
+    async def test_async_call_api_with_pagination(self, mock_get_async_client):
+        mock_response = MagicMock()
+        mock_response.choices[0].message.content = "<response>Async</response>"
+        mock_response.choices[0].finish_reason = 'stop'
+        mock_get_async_client.return_value.chat.completions.create = AsyncMock(
+            return_value=mock_response)
+
+        response = await async_call_api_with_pagination("query")
+
+        self.assertEqual(response, "<response>Async</response>")
+
+    @patch('drd.api.ollama_api.async_post', new_callable=AsyncMock)
+    @patch.dict(os.environ, {"DRAVID_LLM": "ollama", "DRAVID_LLM_MODEL": "starcoder"})
+    async def test_async_call_api_with_pagination_ollama(self, mock_async_post):
+        mock_async_post.return_value.json = MagicMock(
+            return_value={"message": {"content": "<response>Local</response>"}, "done_reason": "stop"})
+
+        response = await async_call_api_with_pagination("query")
+
+        self.assertEqual(response, "<response>Local</response>")
+        mock_async_post.assert_awaited_once_with(
+            "http://localhost:11434/api/chat",
+            json={"model": "starcoder", "messages": [{"role": "user", "content": "query"}],
+                  "stream": False, "keep_alive": "30m",
+                  "options": {"num_ctx": 8192, "num_predict": 4096}},
+            on_response=ANY
+        )
+
+
 if __name__ == '__main__':
     unittest.main()
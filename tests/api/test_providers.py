@@ -0,0 +1,127 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+
+from drd.api.providers import (
+    register_provider,
+    unregister_provider,
+    get_provider,
+    get_cached_client,
+    get_registered_providers,
+    load_entry_point_providers,
+    get_entry_points,
+    reset_clients,
+)
+from drd.api.openai_api import get_client
+from drd.api.main import get_api_functions, get_async_api_function, get_model_name
+
+
+class TestProviderRegistry(unittest.TestCase):
+
+    def tearDown(self):
+        unregister_provider('acme')
+
+    def test_builtin_providers_are_registered(self):
+        self.assertEqual(set(get_registered_providers()),
+                         {'claude', 'openai', 'azure', 'custom', 'ollama'})
+
+    @patch.dict(os.environ, {"DRAVID_LLM": "Claude"})
+    def test_get_provider_uses_dravid_llm(self):
+        self.assertEqual(get_provider().name, 'claude')
+
+    @patch.dict(os.environ, {"DRAVID_LLM": "unknown"})
+    def test_get_provider_unsupported(self):
+        with self.assertRaises(ValueError):
+            get_provider()
+
+    @patch.dict(os.environ, {"DRAVID_LLM": "acme"})
+    def test_third_party_provider_plugs_into_main(self):
+        call_api, call_vision_api, stream_response = MagicMock(), MagicMock(), MagicMock()
+        register_provider('acme', call_api, call_vision_api, stream_response,
+                          get_model=lambda: 'acme-large')
+
+        self.assertEqual(get_api_functions(), (call_api, call_vision_api, stream_response))
+        self.assertEqual(get_model_name(), 'acme-large')
+        with self.assertRaises(ValueError):
+            get_async_api_function()
+
+    @patch.dict(os.environ, {"DRAVID_LLM": "acme"})
+    @patch('importlib.metadata.entry_points')
+    def test_entry_point_providers_are_loaded(self, mock_entry_points):
+        def register():
+            register_provider('acme', MagicMock(), MagicMock(), MagicMock())
+        entry_point = MagicMock()
+        entry_point.load.return_value = register
+        mock_entry_points.return_value.select.return_value = [entry_point]
+
+        with patch('drd.api.providers._entry_points_loaded', False):
+            self.assertEqual(get_provider().name, 'acme')
+        mock_entry_points.return_value.select.assert_called_once_with(group='drd.providers')
+
+    @patch('importlib.metadata.entry_points')
+    def test_entry_points_as_a_dict_of_groups(self, mock_entry_points):
+        # the form returned before Python 3.10
+        entry_point = MagicMock()
+        mock_entry_points.return_value = {'drd.providers': [entry_point]}
+        self.assertEqual(list(get_entry_points('drd.providers')), [entry_point])
+        self.assertEqual(list(get_entry_points('other.group')), [])
+
+    @patch('importlib.metadata.entry_points', return_value={})
+    def test_unknown_provider_without_plugins(self, mock_entry_points):
+        with patch('drd.api.providers._entry_points_loaded', False):
+            with self.assertRaises(ValueError):
+                get_provider('llama3:8b')
+
+    @patch('drd.api.providers.print_warning')
+    @patch('importlib.metadata.entry_points')
+    def test_broken_entry_point_is_reported(self, mock_entry_points, mock_print_warning):
+        entry_point = MagicMock()
+        entry_point.name = 'broken'
+        entry_point.load.side_effect = ImportError('missing')
+        mock_entry_points.return_value.select.return_value = [entry_point]
+
+        with patch('drd.api.providers._entry_points_loaded', False):
+            load_entry_point_providers()
+        mock_print_warning.assert_called_once()
+
+
+class TestClientCache(unittest.TestCase):
+
+    def tearDown(self):
+        reset_clients()
+
+    def test_get_cached_client_builds_once(self):
+        factory = MagicMock()
+        self.assertIs(get_cached_client('key', factory),
+                      get_cached_client('key', factory))
+        factory.assert_called_once()
+
+    def test_reset_clients_closes_clients(self):
+        client = get_cached_client('key', MagicMock)
+        reset_clients()
+        client.close.assert_called_once()
+
+    @patch.dict(os.environ, {"DRAVID_LLM": "openai", "OPENAI_API_KEY": "test_key"})
+    def test_openai_client_is_reused(self):
+        self.assertIs(get_client(), get_client())
+
+    @patch.dict(os.environ, {
+        "DRAVID_LLM": "azure",
+        "AZURE_OPENAI_API_KEY": "test_azure_key",
+        "AZURE_OPENAI_API_VERSION": "2023-05-15",
+        "AZURE_OPENAI_ENDPOINT": "https://test.openai.azure.com"
+    })
+    def test_azure_client_is_reused(self):
+        self.assertIs(get_client(), get_client())
+
+    @patch.dict(os.environ, {"DRAVID_LLM": "openai", "OPENAI_API_KEY": "first_key"})
+    def test_changed_configuration_gets_a_new_client(self):
+        first = get_client()
+        with patch.dict(os.environ, {"OPENAI_API_KEY": "second_key"}):
+            second = get_client()
+        self.assertIsNot(first, second)
+        self.assertEqual(second.api_key, "second_key")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,244 @@
+import unittest
+from unittest.mock import patch, MagicMock, AsyncMock
+import os
+import httpx
+import openai
+import requests
+
+from drd.api.phases import phase_scope, METADATA, MAIN_QUERY, get_phase
+from drd.api.deadline import deadline_scope, DeadlineExceeded, DO
+from drd.api.retry import (
+    CircuitBreaker,
+    CircuitOpenError,
+    call_with_retries,
+    async_call_with_retries,
+    get_retry_after,
+    get_retry_deadline,
+    get_circuit_breaker,
+    get_retry_stats,
+    is_retryable,
+    parse_duration,
+    reset_circuit_breakers,
+    retry_stats,
+    PHASE_RETRY_DEADLINES,
+)
+
+
+def http_error(status, headers=None):
+    response = MagicMock(status_code=status, headers=headers or {})
+    return requests.HTTPError(f"{status} Error", response=response)
+
+
+class TestRetryHelpers(unittest.TestCase):
+
+    def test_is_retryable(self):
+        self.assertTrue(is_retryable(http_error(429)))
+        self.assertTrue(is_retryable(http_error(529)))
+        self.assertTrue(is_retryable(http_error(503)))
+        self.assertFalse(is_retryable(http_error(400)))
+        self.assertTrue(is_retryable(requests.ConnectionError()))
+        self.assertTrue(is_retryable(httpx.ReadTimeout("timed out")))
+        self.assertFalse(is_retryable(ValueError("bad xml")))
+
+    def test_is_retryable_openai_errors(self):
+        request = httpx.Request('POST', 'https://api.openai.com/v1/chat/completions')
+        rate_limited = openai.RateLimitError(
+            "slow down", response=httpx.Response(429, request=request), body=None)
+        bad_request = openai.BadRequestError(
+            "bad", response=httpx.Response(400, request=request), body=None)
+        self.assertTrue(is_retryable(rate_limited))
+        self.assertTrue(is_retryable(openai.APIConnectionError(request=request)))
+        self.assertFalse(is_retryable(bad_request))
+
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration("1s"), 1)
+        self.assertEqual(parse_duration("6m0s"), 360)
+        self.assertAlmostEqual(parse_duration("20ms"), 0.02)
+        self.assertEqual(parse_duration("2.5"), 2.5)
+        self.assertIsNone(parse_duration("soon"))
+
+    def test_get_retry_after_prefers_explicit_headers(self):
+        self.assertEqual(get_retry_after(
+            http_error(429, {'retry-after-ms': '1500', 'retry-after': '9'})), 1.5)
+        self.assertEqual(get_retry_after(
+            http_error(529, {'retry-after': '3'})), 3)
+
+    def test_get_retry_after_uses_rate_limit_reset(self):
+        error = http_error(429, {'x-ratelimit-reset-requests': '2s',
+                                 'x-ratelimit-reset-tokens': '7s'})
+        self.assertEqual(get_retry_after(error), 7)
+        self.assertIsNone(get_retry_after(http_error(503)))
+
+    def test_get_retry_deadline_per_phase(self):
+        with phase_scope(METADATA):
+            self.assertEqual(get_phase(), METADATA)
+            self.assertEqual(get_retry_deadline(), PHASE_RETRY_DEADLINES[METADATA])
+        self.assertIsNone(get_phase())
+
+    @patch.dict(os.environ, {"DRAVID_RETRY_DEADLINE_MAIN_QUERY": "5"})
+    def test_get_retry_deadline_from_env(self):
+        self.assertEqual(get_retry_deadline(MAIN_QUERY), 5)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_after_threshold(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+        self.assertFalse(breaker.allow())
+
+    @patch('drd.api.retry.time.monotonic')
+    def test_half_open_allows_single_probe(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        mock_monotonic.return_value = 131
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+
+
+    @patch('drd.api.retry.time.monotonic')
+    def test_released_probe_lets_the_next_call_probe(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        mock_monotonic.return_value = 131
+        self.assertTrue(breaker.allow())
+        breaker.release_probe()
+        self.assertEqual(breaker.state, 'half_open')
+        self.assertTrue(breaker.allow())
+
+
+class TestCallWithRetries(unittest.TestCase):
+
+    def setUp(self):
+        reset_circuit_breakers()
+        retry_stats.clear()
+
+    def tearDown(self):
+        reset_circuit_breakers()
+
+    @patch('drd.api.retry.time.sleep')
+    def test_retries_until_success(self, mock_sleep):
+        func = MagicMock(side_effect=[http_error(529), http_error(429, {'retry-after': '2'}), 'ok'])
+
+        self.assertEqual(call_with_retries('claude', func, 'arg'), 'ok')
+
+        self.assertEqual(func.call_count, 3)
+        self.assertEqual(mock_sleep.call_args_list[-1][0][0], 2)
+        stats = get_retry_stats()['claude']
+        self.assertEqual(stats['retries'], 2)
+        self.assertEqual(stats['rate_limited'], 1)
+
+    @patch('drd.api.retry.time.sleep')
+    def test_non_retryable_error_is_raised_immediately(self, mock_sleep):
+        func = MagicMock(side_effect=http_error(400))
+
+        with self.assertRaises(requests.HTTPError):
+            call_with_retries('claude', func)
+
+        func.assert_called_once()
+        mock_sleep.assert_not_called()
+
+    @patch.dict(os.environ, {"DRAVID_RETRY_MAX_ATTEMPTS": "3"})
+    @patch('drd.api.retry.time.sleep')
+    def test_gives_up_after_max_attempts(self, mock_sleep):
+        func = MagicMock(side_effect=requests.ConnectionError())
+
+        with self.assertRaises(requests.ConnectionError):
+            call_with_retries('openai', func)
+
+        self.assertEqual(func.call_count, 3)
+        self.assertEqual(get_retry_stats()['openai']['exhausted'], 1)
+
+    @patch('drd.api.retry.time.sleep')
+    def test_gives_up_when_retry_after_exceeds_deadline(self, mock_sleep):
+        func = MagicMock(side_effect=http_error(429, {'retry-after': '50'}))
+
+        with patch.dict(os.environ, {"DRAVID_RETRY_DEADLINE_MAIN_QUERY": "10"}), phase_scope(MAIN_QUERY):
+            with self.assertRaises(requests.HTTPError):
+                call_with_retries('claude', func)
+
+        func.assert_called_once()
+
+    @patch.dict(os.environ, {"DRAVID_RETRY_MAX_ATTEMPTS": "5"})
+    @patch('drd.api.retry.time.sleep')
+    def test_open_circuit_fails_fast(self, mock_sleep):
+        func = MagicMock(side_effect=http_error(503))
+
+        with self.assertRaises(requests.HTTPError):
+            call_with_retries('claude', func)
+        self.assertEqual(func.call_count, 5)
+        with self.assertRaises(CircuitOpenError):
+            call_with_retries('claude', func)
+
+        self.assertEqual(func.call_count, 5)
+        self.assertEqual(get_retry_stats()['claude']['rejected'], 1)
+
+    @patch.dict(os.environ, {"DRAVID_RETRY_MAX_ATTEMPTS": "6"})
+    @patch('drd.api.retry.time.sleep')
+    def test_rate_limits_do_not_open_circuit(self, mock_sleep):
+        func = MagicMock(side_effect=http_error(429, {'retry-after': '0'}))
+
+        with self.assertRaises(requests.HTTPError):
+            call_with_retries('claude', func)
+
+        self.assertEqual(func.call_count, 6)
+        self.assertNotIn('rejected', get_retry_stats()['claude'])
+
+
+    @patch('drd.api.retry.time.sleep')
+    @patch('drd.api.retry.time.monotonic')
+    def test_rate_limited_probe_does_not_wedge_the_circuit(self, mock_monotonic, mock_sleep):
+        mock_monotonic.return_value = 100
+        breaker = get_circuit_breaker('claude')
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        mock_monotonic.return_value = 100 + breaker.reset_timeout
+
+        with patch.dict(os.environ, {"DRAVID_RETRY_MAX_ATTEMPTS": "1"}):
+            with self.assertRaises(requests.HTTPError):
+                call_with_retries('claude', MagicMock(side_effect=http_error(429)))
+        self.assertFalse(breaker.probing)
+
+        self.assertEqual(call_with_retries('claude', MagicMock(return_value='ok')), 'ok')
+        self.assertEqual(breaker.state, 'closed')
+
+    @patch('drd.api.retry.time.monotonic')
+    def test_interrupted_probe_does_not_wedge_the_circuit(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        breaker = get_circuit_breaker('claude')
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        mock_monotonic.return_value = 100 + breaker.reset_timeout
+
+        with self.assertRaises(KeyboardInterrupt):
+            call_with_retries('claude', MagicMock(side_effect=KeyboardInterrupt))
+        with deadline_scope(DO, budget=0.01):
+            with self.assertRaises(DeadlineExceeded):
+                call_with_retries('claude', MagicMock(side_effect=DeadlineExceeded(DO, 0.01)))
+        self.assertFalse(breaker.probing)
+        self.assertEqual(call_with_retries('claude', MagicMock(return_value='ok')), 'ok')
+
+
+class TestAsyncCallWithRetries(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        reset_circuit_breakers()
+
+    @patch('drd.api.retry.asyncio.sleep', new_callable=AsyncMock)
+    async def test_retries_until_success(self, mock_sleep):
+        func = AsyncMock(side_effect=[httpx.ConnectError("refused"), 'ok'])
+
+        self.assertEqual(await async_call_with_retries('claude', func), 'ok')
+        self.assertEqual(func.call_count, 2)
+        mock_sleep.assert_awaited_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
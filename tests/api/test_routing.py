@@ -0,0 +1,90 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+
+from drd.api.phases import phase_scope, FILE_IDENTIFICATION, MAIN_QUERY, METADATA
+from drd.api.routing import Route, parse_route, get_route
+from drd.api.telemetry import track_call, record_call_usage, get_phase_summary, format_phase_summary, reset_aggregates
+from drd.api import claude_api, openai_api
+from drd.api.main import get_api_functions, get_provider_name, get_model_name
+
+
+class TestRouting(unittest.TestCase):
+
+    def test_parse_route(self):
+        self.assertEqual(parse_route('openai:gpt-4o-mini'), Route('openai', 'gpt-4o-mini'))
+        self.assertEqual(parse_route('claude-3-haiku-20240307'), Route(None, 'claude-3-haiku-20240307'))
+        self.assertEqual(parse_route('ollama:llama3:8b'), Route('ollama', 'llama3:8b'))
+        self.assertEqual(parse_route('llama3:8b'), Route(None, 'llama3:8b'))
+
+    @patch.dict(os.environ, {'DRAVID_ROUTE_METADATA': 'openai:gpt-4o-mini'}, clear=True)
+    def test_get_route_reads_phase_variable(self):
+        self.assertEqual(get_route(METADATA), Route('openai', 'gpt-4o-mini'))
+        self.assertEqual(get_route(MAIN_QUERY), Route())
+        self.assertEqual(get_route(), Route())
+
+    @patch.dict(os.environ, {'DRAVID_LLM': 'claude', 'DRAVID_ROUTING': 'fast'}, clear=True)
+    def test_fast_routing_uses_small_model_for_cheap_phases(self):
+        self.assertEqual(get_route(FILE_IDENTIFICATION).model, 'claude-3-haiku-20240307')
+        self.assertEqual(get_route(METADATA).model, 'claude-3-haiku-20240307')
+        self.assertIsNone(get_route(MAIN_QUERY).model)
+
+    @patch.dict(os.environ, {'DRAVID_LLM': 'claude', 'DRAVID_ROUTING': 'fast',
+                             'DRAVID_ROUTE_METADATA': 'claude-3-5-sonnet-20240620'}, clear=True)
+    def test_phase_variable_overrides_fast_routing(self):
+        self.assertEqual(get_route(METADATA).model, 'claude-3-5-sonnet-20240620')
+
+    @patch.dict(os.environ, {'DRAVID_LLM': 'claude', 'DRAVID_ROUTE_FILE_IDENTIFICATION': 'claude-3-haiku-20240307'})
+    def test_claude_model_follows_phase(self):
+        with phase_scope(FILE_IDENTIFICATION):
+            self.assertEqual(claude_api.get_model(), 'claude-3-haiku-20240307')
+        self.assertEqual(claude_api.get_model(), claude_api.MODEL)
+
+    @patch.dict(os.environ, {'DRAVID_LLM': 'claude', 'DRAVID_ROUTE_METADATA': 'openai:gpt-4o-mini'})
+    def test_phase_can_switch_provider(self):
+        with phase_scope(METADATA):
+            self.assertEqual(get_provider_name(), 'openai')
+            self.assertEqual(get_model_name(), 'gpt-4o-mini')
+            self.assertEqual(openai_api.get_llm_type(), 'openai')
+            self.assertIs(get_api_functions()[0], openai_api.call_api_with_pagination)
+        self.assertEqual(get_provider_name(), 'claude')
+        self.assertIs(get_api_functions()[0], claude_api.call_claude_api_with_pagination)
+
+    @patch.dict(os.environ, {'DRAVID_LLM': 'claude', 'DRAVID_ROUTE_METADATA': 'claude-3-haiku-20240307',
+                             'CLAUDE_API_KEY': 'key'})
+    @patch('drd.api.claude_api.make_api_call')
+    def test_routed_model_is_sent_to_provider(self, mock_make_api_call):
+        mock_make_api_call.return_value.json.return_value = {
+            'content': [{'text': '<response>ok</response>'}], 'stop_reason': 'end_turn'}
+        with phase_scope(METADATA):
+            claude_api.call_claude_api_with_pagination('query')
+        self.assertEqual(mock_make_api_call.call_args[0][0]['model'], 'claude-3-haiku-20240307')
+
+
+class TestPhaseSummary(unittest.TestCase):
+
+    def setUp(self):
+        reset_aggregates()
+
+    def tearDown(self):
+        reset_aggregates()
+
+    def test_summary_groups_calls_by_phase(self):
+        with phase_scope(METADATA):
+            for _ in range(2):
+                with track_call('claude', 'claude-3-haiku-20240307', 'async', 'query'):
+                    record_call_usage({'input_tokens': 1000, 'output_tokens': 100})
+        with phase_scope(MAIN_QUERY), track_call('claude', 'claude-3-5-sonnet-20240620', 'stream', 'query'):
+            record_call_usage({'input_tokens': 1000, 'output_tokens': 100})
+
+        summary = get_phase_summary()
+        self.assertEqual(summary[METADATA]['calls'], 2)
+        self.assertAlmostEqual(summary[METADATA]['cost'], 2 * (1000 * 0.25 + 100 * 1.25) / 1e6)
+        self.assertEqual(summary[MAIN_QUERY]['models'], ['claude/claude-3-5-sonnet-20240620'])
+        lines = format_phase_summary()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith('metadata: 2 calls'))
+
+
+if __name__ == '__main__':
+    unittest.main()
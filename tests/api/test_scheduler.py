@@ -0,0 +1,231 @@
+import unittest
+from unittest.mock import patch
+import os
+import time
+import asyncio
+import threading
+
+from drd.api.scheduler import (
+    ProviderScheduler,
+    TokenBucket,
+    get_scheduler,
+    get_scheduler_stats,
+    observe_response,
+    record_ticket_usage,
+    reset_schedulers,
+    MIN_CONCURRENCY,
+    BORROWABLE_SLOTS,
+)
+from drd.api.phases import phase_scope, get_lane, INTERACTIVE, FIX, BACKGROUND, METADATA, ERROR_FIX
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_wait_time(self):
+        bucket = TokenBucket(60)
+        now = bucket.updated
+        bucket.take(60)
+        self.assertAlmostEqual(bucket.wait_time(2, now), 2)
+        self.assertEqual(bucket.wait_time(2, now + 2), 0)
+
+    def test_oversized_request_waits_for_full_bucket(self):
+        bucket = TokenBucket(60)
+        self.assertEqual(bucket.wait_time(1000, bucket.updated), 0)
+
+    def test_sync_adopts_limit_and_remaining(self):
+        bucket = TokenBucket(50)
+        bucket.sync(4000, 10, bucket.updated)
+        self.assertEqual(bucket.capacity, 4000)
+        self.assertEqual(bucket.level, 10)
+
+
+class TestProviderScheduler(unittest.TestCase):
+
+    def setUp(self):
+        reset_schedulers()
+
+    def tearDown(self):
+        reset_schedulers()
+
+    def test_concurrency_limit(self):
+        scheduler = ProviderScheduler('test', initial_concurrency=2)
+        first = scheduler.acquire()
+        scheduler.acquire()
+        acquired = threading.Event()
+
+        def third():
+            scheduler.acquire()
+            acquired.set()
+
+        threading.Thread(target=third, daemon=True).start()
+        time.sleep(0.05)
+        self.assertFalse(acquired.is_set())
+        self.assertEqual(scheduler.queue_depth, 1)
+
+        scheduler.release(first)
+        self.assertTrue(acquired.wait(1))
+        self.assertEqual(scheduler.queue_depth, 0)
+
+    def test_request_budget(self):
+        scheduler = ProviderScheduler('test', rpm=600, initial_concurrency=10)
+        scheduler.buckets['rpm'].level = 1
+        scheduler.acquire()
+        start = time.monotonic()
+        scheduler.acquire()
+        self.assertGreater(time.monotonic() - start, 0.05)
+
+    def test_token_usage_is_reconciled(self):
+        scheduler = ProviderScheduler('test', input_tpm=1000, output_tpm=1000)
+        with scheduler.slot(input_tokens=100, output_tokens=500) as ticket:
+            record_ticket_usage(120, 50)
+            self.assertEqual(ticket.used_input, 120)
+        self.assertAlmostEqual(scheduler.buckets['input_tpm'].level, 880, delta=1)
+        self.assertAlmostEqual(scheduler.buckets['output_tpm'].level, 950, delta=1)
+
+    def test_rate_limit_halves_concurrency_and_pauses(self):
+        scheduler = ProviderScheduler('test', initial_concurrency=8)
+        scheduler.observe(429, {'retry-after': '2'})
+        self.assertEqual(scheduler.concurrency, 4)
+        self.assertGreater(scheduler.paused_until - time.monotonic(), 1.5)
+        for _ in range(5):
+            scheduler.observe(529, {})
+        self.assertEqual(scheduler.concurrency, MIN_CONCURRENCY)
+
+    def test_success_grows_concurrency(self):
+        scheduler = ProviderScheduler('test', initial_concurrency=2, max_concurrency=3)
+        for _ in range(20):
+            scheduler.observe(200, {})
+        self.assertEqual(scheduler.concurrency, 3)
+
+    def test_headers_update_budgets(self):
+        scheduler = ProviderScheduler('claude', rpm=50, input_tpm=40000)
+        scheduler.observe(200, {
+            'anthropic-ratelimit-requests-limit': '4000',
+            'anthropic-ratelimit-requests-remaining': '3999',
+            'anthropic-ratelimit-input-tokens-limit': '400000',
+            'anthropic-ratelimit-input-tokens-remaining': '390000',
+            'anthropic-ratelimit-output-tokens-limit': '80000',
+            'anthropic-ratelimit-output-tokens-remaining': '80000',
+        })
+        self.assertEqual(scheduler.buckets['rpm'].capacity, 4000)
+        self.assertEqual(scheduler.buckets['input_tpm'].capacity, 400000)
+        self.assertEqual(scheduler.buckets['output_tpm'].capacity, 80000)
+
+    def test_openai_headers_update_budgets(self):
+        scheduler = ProviderScheduler('openai', rpm=500, input_tpm=30000)
+        scheduler.observe(200, {
+            'x-ratelimit-limit-requests': '10000',
+            'x-ratelimit-remaining-requests': '9999',
+            'x-ratelimit-limit-tokens': '2000000',
+            'x-ratelimit-remaining-tokens': '1999000',
+        })
+        self.assertEqual(scheduler.buckets['rpm'].capacity, 10000)
+        self.assertEqual(scheduler.buckets['input_tpm'].capacity, 2000000)
+
+    def test_non_http_status_is_ignored(self):
+        scheduler = ProviderScheduler('test', initial_concurrency=2)
+        scheduler.observe(None, {})
+        self.assertEqual(scheduler.concurrency, 2)
+
+    @patch.dict(os.environ, {"DRAVID_RPM": "120", "DRAVID_MAX_CONCURRENCY": "5"})
+    def test_get_scheduler_from_env(self):
+        scheduler = get_scheduler('claude')
+        self.assertIs(scheduler, get_scheduler('claude'))
+        self.assertEqual(scheduler.buckets['rpm'].capacity, 120)
+        self.assertEqual(scheduler.max_concurrency, 5)
+        self.assertIn('claude', get_scheduler_stats())
+
+    def test_observe_response_without_scheduler(self):
+        observe_response('nobody', 429, {})
+        self.assertEqual(get_scheduler_stats(), {})
+
+
+class TestPriorityLanes(unittest.TestCase):
+
+    def test_get_lane(self):
+        self.assertEqual(get_lane(), INTERACTIVE)
+        with phase_scope(METADATA):
+            self.assertEqual(get_lane(), BACKGROUND)
+        with phase_scope(ERROR_FIX):
+            self.assertEqual(get_lane(), FIX)
+
+    def test_unknown_lane(self):
+        scheduler = ProviderScheduler('test')
+        with self.assertRaises(ValueError):
+            scheduler.acquire(lane='urgent')
+
+    def test_higher_lane_jumps_the_queue(self):
+        scheduler = ProviderScheduler('test', initial_concurrency=1)
+        scheduler.buckets['rpm'] = None
+        held = scheduler.acquire(lane=INTERACTIVE)
+        background = scheduler._enqueue(0, 0, BACKGROUND)
+        fix = scheduler._enqueue(0, 0, FIX)
+
+        scheduler.release(held)
+
+        self.assertIsNotNone(fix.ticket)
+        self.assertIsNone(background.ticket)
+        self.assertEqual(scheduler.queue_depth, 1)
+
+    def test_interactive_borrows_slots_from_background(self):
+        scheduler = ProviderScheduler('test', initial_concurrency=2)
+        scheduler.acquire(lane=BACKGROUND)
+        scheduler.acquire(lane=BACKGROUND)
+
+        for _ in range(BORROWABLE_SLOTS):
+            scheduler.acquire(lane=INTERACTIVE)
+
+        self.assertEqual(scheduler.in_flight, 2 + BORROWABLE_SLOTS)
+        background = scheduler._enqueue(0, 0, BACKGROUND)
+        scheduler._dispatch()
+        self.assertIsNone(background.ticket)
+
+    def test_lane_wait_stats(self):
+        scheduler = ProviderScheduler('test')
+        ticket = scheduler.acquire(lane=FIX)
+        scheduler.release(ticket)
+
+        lanes = scheduler.stats()['lanes']
+        self.assertEqual(lanes[FIX]['wait']['count'], 1)
+        self.assertEqual(lanes[INTERACTIVE]['wait']['count'], 0)
+        self.assertEqual(lanes[BACKGROUND]['queued'], 0)
+
+
+class TestAsyncScheduler(unittest.IsolatedAsyncioTestCase):
+
+    async def test_async_slots_bound_concurrency(self):
+        scheduler = ProviderScheduler('test', initial_concurrency=3)
+        in_flight = 0
+        peak = 0
+
+        async def call():
+            nonlocal in_flight, peak
+            async with scheduler.async_slot(lane=BACKGROUND):
+                in_flight += 1
+                peak = max(peak, in_flight)
+                await asyncio.sleep(0.01)
+                in_flight -= 1
+
+        await asyncio.gather(*(call() for _ in range(20)))
+
+        self.assertEqual(peak, 3)
+        self.assertEqual(scheduler.in_flight, 0)
+        self.assertEqual(scheduler.admitted, 20)
+
+    async def test_cancelled_waiter_leaves_queue(self):
+        scheduler = ProviderScheduler('test', initial_concurrency=1)
+        ticket = await scheduler.async_acquire()
+        waiter = asyncio.ensure_future(scheduler.async_acquire())
+        await asyncio.sleep(0.01)
+        self.assertEqual(scheduler.queue_depth, 1)
+
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(scheduler.queue_depth, 0)
+        scheduler.release(ticket)
+        self.assertEqual(scheduler.in_flight, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
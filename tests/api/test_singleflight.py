@@ -0,0 +1,321 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from drd.api.singleflight import SingleFlight, FlightAbandoned
+from drd.api.deadline import deadline_scope, DeadlineExceeded, DO
+from drd.api.telemetry import get_aggregates, reset_aggregates
+from drd.api.main import call_dravid_api_with_pagination, stream_dravid_api
+
+
+def wait_for_hits(flight, hits):
+    deadline = time.time() + 5
+    while flight.hits < hits and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def slow_call(self):
+        self.calls += 1
+        self.release.wait(5)
+        return 'result'
+
+    def test_concurrent_identical_calls_share_one_result(self):
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(self.flight.do, 'key', self.slow_call)
+                       for _ in range(4)]
+            wait_for_hits(self.flight, 3)
+            self.release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(results, ['result'] * 4)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.flight.stats(), {'hits': 3, 'leaders': 1})
+
+    def test_sequential_calls_are_not_deduplicated(self):
+        self.release.set()
+        self.flight.do('key', self.slow_call)
+        self.flight.do('key', self.slow_call)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.flight.hits, 0)
+
+    def test_no_key_always_calls(self):
+        self.release.set()
+        self.flight.do(None, self.slow_call)
+        self.flight.do(None, self.slow_call)
+        self.assertEqual(self.calls, 2)
+
+    def test_followers_share_the_leader_error(self):
+        def failing_call():
+            self.release.wait(5)
+            raise ValueError('boom')
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            futures = [pool.submit(self.flight.do, 'key', failing_call)
+                       for _ in range(2)]
+            wait_for_hits(self.flight, 1)
+            self.release.set()
+            for future in futures:
+                with self.assertRaises(ValueError):
+                    future.result()
+
+    def test_late_stream_follower_replays_earlier_chunks(self):
+        first_chunk_sent = threading.Event()
+
+        def source():
+            self.calls += 1
+            yield 'a'
+            first_chunk_sent.set()
+            self.release.wait(5)
+            yield 'b'
+            yield 'c'
+
+        def consume():
+            return ''.join(self.flight.stream('key', source))
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            leader = pool.submit(consume)
+            first_chunk_sent.wait(5)
+            follower = pool.submit(consume)
+            wait_for_hits(self.flight, 1)
+            self.release.set()
+            self.assertEqual(leader.result(), 'abc')
+            self.assertEqual(follower.result(), 'abc')
+        self.assertEqual(self.calls, 1)
+
+    def test_stream_follower_restarts_when_source_is_interrupted(self):
+        started = threading.Event()
+
+        def source():
+            self.calls += 1
+            if self.calls == 1:
+                started.set()
+                self.release.wait(5)
+                raise KeyboardInterrupt
+            yield 'a'
+
+        def lead():
+            try:
+                list(self.flight.stream('key', source))
+            except FlightAbandoned:
+                return 'abandoned'
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            leader = pool.submit(lead)
+            started.wait(5)
+            follower = pool.submit(
+                lambda: ''.join(self.flight.stream('key', source)))
+            wait_for_hits(self.flight, 1)
+            self.release.set()
+            self.assertEqual(leader.result(), 'abandoned')
+            self.assertEqual(follower.result(), 'a')
+        self.assertEqual(self.calls, 2)
+
+    def test_stream_follower_continues_when_leader_stops_reading(self):
+        def source():
+            yield 'a'
+            self.release.wait(5)
+            yield 'b'
+
+        leader = self.flight.stream('key', source)
+        self.assertEqual(next(leader), 'a')
+        follower = self.flight.stream('key', source)
+        self.assertEqual(next(follower), 'a')
+        leader.close()
+        self.release.set()
+        self.assertEqual(''.join(follower), 'b')
+
+    def test_source_stops_when_its_last_reader_leaves(self):
+        closed = threading.Event()
+
+        def source():
+            try:
+                yield 'a'
+                self.release.wait(5)
+                yield 'b'
+            finally:
+                closed.set()
+
+        leader = self.flight.stream('key', source)
+        self.assertEqual(next(leader), 'a')
+        leader.close()
+        self.release.set()
+        self.assertTrue(closed.wait(2))
+        # a new identical stream makes its own call
+        self.assertEqual(''.join(self.flight.stream('key', source)), 'ab')
+
+    def test_stream_follower_honours_the_deadline(self):
+        def source():
+            self.release.wait(5)
+            yield 'a'
+
+        leader = self.flight.stream('key', source)
+        with deadline_scope(DO, budget=0.1):
+            follower = self.flight.stream('key', source)
+            with self.assertRaises(DeadlineExceeded):
+                next(follower)
+        self.release.set()
+        self.assertEqual(''.join(leader), 'a')
+
+    def test_blocking_follower_honours_the_deadline(self):
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            leader = pool.submit(self.flight.do, 'key', self.slow_call)
+            time.sleep(0.05)
+            with deadline_scope(DO, budget=0.1), self.assertRaises(DeadlineExceeded):
+                self.flight.do('key', self.slow_call)
+            self.release.set()
+            self.assertEqual(leader.result(), 'result')
+
+    def test_long_stream_without_followers_is_not_kept(self):
+        def source():
+            yield 'a'
+            yield 'bc'
+            yield 'd'
+
+        leader = self.flight.stream('key', source, replay_limit=2)
+        self.assertEqual(next(leader), 'a')
+        self.assertEqual(next(leader), 'bc')
+        # past the limit a new identical stream makes its own call
+        self.assertEqual(''.join(self.flight.stream('key', source, replay_limit=2)), 'abcd')
+        self.assertEqual(''.join(leader), 'd')
+        self.assertEqual(self.flight.stats(), {'hits': 0, 'leaders': 2})
+
+    def test_long_stream_with_a_follower_is_still_shared(self):
+        def source():
+            self.calls += 1
+            yield 'a'
+            self.release.wait(5)
+            yield 'bc'
+
+        leader = self.flight.stream('key', source, replay_limit=2)
+        self.assertEqual(next(leader), 'a')
+        follower = self.flight.stream('key', source, replay_limit=2)
+        self.assertEqual(next(follower), 'a')
+        self.release.set()
+        self.assertEqual(''.join(leader), 'bc')
+        self.assertEqual(''.join(follower), 'bc')
+        self.assertEqual(self.calls, 1)
+
+
+class TestAsyncSingleFlight(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_identical_calls_share_one_result(self):
+        flight = SingleFlight()
+        calls = 0
+
+        async def call():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return 'result'
+
+        results = await asyncio.gather(*[flight.async_do('key', call) for _ in range(5)])
+
+        self.assertEqual(results, ['result'] * 5)
+        self.assertEqual(calls, 1)
+        self.assertEqual(flight.hits, 4)
+
+    async def test_cancelled_leader_lets_followers_call(self):
+        flight = SingleFlight()
+        calls = 0
+
+        async def call():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return 'result'
+
+        leader = asyncio.create_task(flight.async_do('key', call))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.async_do('key', call))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        self.assertEqual(await follower, 'result')
+        self.assertEqual(calls, 2)
+
+
+class TestMainSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        reset_aggregates()
+
+    def tearDown(self):
+        reset_aggregates()
+
+    @patch.dict(os.environ, {'DRAVID_LLM': 'claude'})
+    @patch('drd.api.main.get_api_functions')
+    def test_identical_blocking_calls_make_one_request(self, mock_get_api_functions):
+        release = threading.Event()
+        mock_call_api = MagicMock()
+        mock_get_api_functions.return_value = (mock_call_api, None, None)
+        mock_call_api.side_effect = lambda *args: release.wait(5) and 'response'
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            futures = [pool.submit(call_dravid_api_with_pagination, 'same query')
+                       for _ in range(3)]
+            time.sleep(0.2)
+            release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(results, ['response'] * 3)
+        mock_call_api.assert_called_once()
+        totals = next(iter(get_aggregates().values()))
+        self.assertEqual(totals['calls'], 3)
+        self.assertEqual(totals['dedup_hits'], 2)
+
+    @patch.dict(os.environ, {'DRAVID_LLM': 'claude', 'DRAVID_SINGLE_FLIGHT': 'false'})
+    @patch('drd.api.main.get_api_functions')
+    def test_single_flight_can_be_disabled(self, mock_get_api_functions):
+        release = threading.Event()
+        mock_call_api = MagicMock()
+        mock_get_api_functions.return_value = (mock_call_api, None, None)
+        mock_call_api.side_effect = lambda *args: release.wait(5) and 'response'
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            futures = [pool.submit(call_dravid_api_with_pagination, 'same query')
+                       for _ in range(2)]
+            time.sleep(0.2)
+            release.set()
+            [future.result() for future in futures]
+
+        self.assertEqual(mock_call_api.call_count, 2)
+
+    @patch.dict(os.environ, {'DRAVID_LLM': 'claude'})
+    @patch('drd.api.main.Loader')
+    @patch('drd.api.main.pretty_print_xml_stream')
+    @patch('drd.api.main.get_api_functions')
+    def test_identical_streams_make_one_request(self, mock_get_api_functions, mock_pretty_print, mock_loader):
+        release = threading.Event()
+        mock_stream = MagicMock()
+        mock_get_api_functions.return_value = (None, None, mock_stream)
+
+        def chunks(query, instruction_prompt):
+            yield '<response>'
+            release.wait(5)
+            yield '</response>'
+        mock_stream.side_effect = chunks
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            futures = [pool.submit(stream_dravid_api, 'same query')
+                       for _ in range(2)]
+            time.sleep(0.2)
+            release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(results, ['<response></response>'] * 2)
+        mock_stream.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from unittest.mock import MagicMock
+
+from drd.api.sse import SSEDecoder, ServerSentEvent, iter_sse, iter_json_events, iter_response_events
+
+
+class TestSSEDecoder(unittest.TestCase):
+
+    def test_event_split_across_chunks(self):
+        decoder = SSEDecoder()
+        self.assertEqual(decoder.feed(b'event: content_block_delta\ndata: {"a"'), [])
+        events = decoder.feed(b': 1}\n\nevent: ping\ndata: {}\n\n')
+        self.assertEqual(events, [
+            ServerSentEvent('content_block_delta', '{"a": 1}'),
+            ServerSentEvent('ping', '{}'),
+        ])
+        self.assertEqual(events[0].json(), {'a': 1})
+
+    def test_multi_line_data_is_joined(self):
+        events = list(iter_sse([b'data: first\ndata: second\n\n']))
+        self.assertEqual(events[0].data, 'first\nsecond')
+        self.assertEqual(events[0].event, 'message')
+
+    def test_crlf_split_between_chunks(self):
+        events = list(iter_sse([b'data: one\r', b'\n\r', b'\ndata: two\r\n\r\n']))
+        self.assertEqual([event.data for event in events], ['one', 'two'])
+
+    def test_comments_and_empty_events_are_skipped(self):
+        events = list(iter_sse([b': keep-alive\n\nevent: ping\n\ndata: x\n\n']))
+        self.assertEqual([event.data for event in events], ['x'])
+
+    def test_id_and_retry_fields(self):
+        decoder = SSEDecoder()
+        events = decoder.feed(b'id: 7\nretry: 3000\ndata: x\n\ndata: y\n\n')
+        self.assertEqual([event.id for event in events], ['7', '7'])
+        self.assertEqual(decoder.retry, 3000)
+
+    def test_multibyte_character_split_across_chunks(self):
+        payload = 'data: héllo\n\n'.encode('utf-8')
+        split = payload.index(b'\xc3') + 1
+        events = list(iter_sse([payload[:split], payload[split:]]))
+        self.assertEqual(events[0].data, 'héllo')
+
+    def test_flush_emits_event_without_trailing_blank_line(self):
+        events = list(iter_sse([b'data: a\n\ndata: b']))
+        self.assertEqual([event.data for event in events], ['a', 'b'])
+
+    def test_openai_done_sentinel(self):
+        events = list(iter_sse([
+            b'data: {"choices": [{"delta": {"content": "Hi"}}]}\n\n',
+            b'data: [DONE]\n\n'
+        ]))
+        self.assertFalse(events[0].done)
+        self.assertTrue(events[1].done)
+
+    def test_mixed_block_falls_back_to_line_parsing(self):
+        events = list(iter_sse([b'event: a\ndata: 1\n\n: comment\ndata: 2\ndata: 3\n\n']))
+        self.assertEqual(events, [ServerSentEvent('a', '1'), ServerSentEvent('message', '2\n3')])
+
+    def test_iter_json_events_decodes_payloads_and_skips_pings(self):
+        events = list(iter_json_events([
+            b'event: ping\ndata: {"type": "ping"}\n\ndata: {"a": 1}\n\ndata: [1, 2]\n\n',
+            b'data: [DONE]\n\n'
+        ]))
+        self.assertEqual(events, [('message', {'a': 1}), ('message', [1, 2]), ('message', '[DONE]')])
+
+    def test_iter_response_events_reads_raw_chunks(self):
+        response = MagicMock()
+        response.iter_content.return_value = [b'data: {"type": "message_stop"}\n\n']
+        self.assertEqual(list(iter_response_events(response)),
+                         [('message', {'type': 'message_stop'})])
+        response.iter_content.assert_called_once_with(chunk_size=None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+import json
+import shutil
+import tempfile
+
+from drd.api.phases import phase_scope, MAIN_QUERY
+from drd.api.telemetry import (
+    CallMetrics,
+    track_call,
+    record_call_usage,
+    record_output,
+    mark_first_token,
+    count_continuation,
+    estimate_cost,
+    get_aggregates,
+    reset_aggregates,
+)
+from drd.api.main import call_dravid_api_with_pagination, stream_dravid_api
+
+
+class TestTelemetry(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.metrics_file = os.path.join(self.tmp_dir, 'metrics.jsonl')
+        self.prometheus_file = os.path.join(self.tmp_dir, 'dravid.prom')
+        reset_aggregates()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        reset_aggregates()
+
+    def read_events(self):
+        with open(self.metrics_file) as f:
+            return [json.loads(line) for line in f]
+
+    def test_track_call_writes_jsonl_event(self):
+        with patch.dict(os.environ, {'DRAVID_METRICS_FILE': self.metrics_file}):
+            with phase_scope(MAIN_QUERY), track_call('claude', 'claude-3-5-sonnet-20240620', 'stream', 'query', 'system'):
+                mark_first_token()
+                record_call_usage({'input_tokens': 1000, 'output_tokens': 200,
+                                   'cache_read_input_tokens': 5000})
+                count_continuation()
+
+        event = self.read_events()[0]
+        self.assertEqual(event['phase'], MAIN_QUERY)
+        self.assertEqual(event['provider'], 'claude')
+        self.assertEqual(event['request_bytes'], 11)
+        self.assertEqual(event['input_tokens'], 1000)
+        self.assertEqual(event['output_tokens'], 200)
+        self.assertEqual(event['continuations'], 1)
+        self.assertIsNotNone(event['ttft'])
+        self.assertIsNotNone(event['tokens_per_second'])
+        self.assertAlmostEqual(event['cost'], (1000 * 3 + 200 * 15 + 5000 * 0.3) / 1e6)
+        self.assertNotIn('started', event)
+
+    def test_tokens_are_estimated_without_usage(self):
+        with patch.dict(os.environ, {'DRAVID_METRICS_FILE': self.metrics_file}):
+            with track_call('custom', 'my-model', 'call', 'x' * 40):
+                record_output('y' * 20)
+
+        event = self.read_events()[0]
+        self.assertTrue(event['tokens_estimated'])
+        self.assertEqual(event['input_tokens'], 10)
+        self.assertEqual(event['output_tokens'], 5)
+        self.assertIsNone(event['cost'])
+
+    def test_error_is_recorded(self):
+        with patch.dict(os.environ, {'DRAVID_METRICS_FILE': self.metrics_file}):
+            with self.assertRaises(ValueError):
+                with track_call('claude', None, 'call', 'query'):
+                    raise ValueError("boom")
+
+        self.assertEqual(self.read_events()[0]['error'], 'ValueError')
+
+    def test_usage_outside_call_is_ignored(self):
+        record_call_usage({'input_tokens': 10})
+        record_output('text')
+        self.assertEqual(get_aggregates(), {})
+
+    def test_estimate_cost(self):
+        metrics = CallMetrics(provider='ollama', model='llama3', kind='call')
+        self.assertEqual(estimate_cost(metrics), 0.0)
+        metrics = CallMetrics(provider='openai', model='gpt-4o', kind='call',
+                              input_tokens=1_000_000, output_tokens=1_000_000)
+        self.assertEqual(estimate_cost(metrics), 20.0)
+
+    def test_prometheus_file(self):
+        with patch.dict(os.environ, {'DRAVID_PROMETHEUS_FILE': self.prometheus_file}):
+            with phase_scope(MAIN_QUERY), track_call('claude', 'claude-3-5-sonnet-20240620', 'call', 'query'):
+                record_call_usage({'input_tokens': 10, 'output_tokens': 5})
+
+        with open(self.prometheus_file) as f:
+            text = f.read()
+        labels = 'phase="main_query",provider="claude",model="claude-3-5-sonnet-20240620"'
+        self.assertIn(f'dravid_llm_calls_total{{{labels}}} 1', text)
+        self.assertIn(f'dravid_llm_output_tokens_total{{{labels}}} 5', text)
+        self.assertIn(f'dravid_llm_latency_seconds_bucket{{{labels},le="+Inf"}} 1', text)
+        self.assertIn(f'dravid_llm_latency_seconds_count{{{labels}}} 1', text)
+
+
+class TestTrackedApiCalls(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.metrics_file = os.path.join(self.tmp_dir, 'metrics.jsonl')
+        self.env = patch.dict(os.environ, {
+            'DRAVID_LLM': 'claude',
+            'DRAVID_METRICS_FILE': self.metrics_file
+        })
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    @patch('drd.api.main.get_api_functions')
+    def test_call_emits_event(self, mock_get_api_functions):
+        mock_call_api = MagicMock(return_value="<response>ok</response>")
+        mock_get_api_functions.return_value = (mock_call_api, None, None)
+
+        call_dravid_api_with_pagination("query")
+
+        with open(self.metrics_file) as f:
+            event = json.loads(f.readline())
+        self.assertEqual(event['kind'], 'call')
+        self.assertEqual(event['model'], 'claude-3-5-sonnet-20240620')
+        self.assertIsNone(event['ttft'])
+        self.assertEqual(event['lane'], 'interactive')
+        self.assertIsNotNone(event['queue_wait'])
+
+    @patch('drd.api.main.get_api_functions')
+    @patch('drd.api.main.pretty_print_xml_stream')
+    @patch('drd.api.main.Loader')
+    def test_stream_emits_event_with_ttft(self, mock_loader, mock_pretty_print, mock_get_api_functions):
+        mock_stream = MagicMock(return_value=iter(["<response>", "</response>"]))
+        mock_get_api_functions.return_value = (None, None, mock_stream)
+
+        stream_dravid_api("query")
+
+        with open(self.metrics_file) as f:
+            event = json.loads(f.readline())
+        self.assertEqual(event['kind'], 'stream')
+        self.assertIsNotNone(event['ttft'])
+        self.assertEqual(event['output_tokens'], 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
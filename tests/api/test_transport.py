@@ -0,0 +1,168 @@
+import unittest
+from unittest.mock import patch, MagicMock, AsyncMock
+import os
+import time
+import threading
+import httpx
+import pytest
+import requests
+
+from drd.api.transport import (
+    get_pool_size,
+    is_http2_enabled,
+    create_session,
+    get_session,
+    reset_session,
+    HttpxResponse,
+    DEFAULT_POOL_SIZE,
+    get_async_http_client,
+    async_post,
+    close_async_http_client,
+    CancelScope,
+    cancel_scope,
+    RequestCancelled,
+)
+
+
+class TestTransport(unittest.TestCase):
+
+    def tearDown(self):
+        reset_session()
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_get_pool_size_default(self):
+        self.assertEqual(get_pool_size(), DEFAULT_POOL_SIZE)
+
+    @patch.dict(os.environ, {"DRAVID_HTTP_POOL_SIZE": "32"})
+    def test_get_pool_size_from_env(self):
+        self.assertEqual(get_pool_size(), 32)
+
+    @patch.dict(os.environ, {"DRAVID_HTTP_POOL_SIZE": "lots"})
+    def test_get_pool_size_invalid(self):
+        self.assertEqual(get_pool_size(), DEFAULT_POOL_SIZE)
+
+    @patch.dict(os.environ, {"DRAVID_HTTP2": "true"})
+    def test_is_http2_enabled(self):
+        self.assertTrue(is_http2_enabled())
+
+    @patch.dict(os.environ, {"DRAVID_HTTP_POOL_SIZE": "4"}, clear=True)
+    def test_create_session_mounts_pooled_adapter(self):
+        session = create_session()
+        self.assertIsInstance(session, requests.Session)
+        adapter = session.get_adapter('https://api.anthropic.com/v1/messages')
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertEqual(session.headers['Connection'], 'keep-alive')
+
+    @patch.dict(os.environ, {"DRAVID_HTTP2": "1"}, clear=True)
+    @patch.dict('sys.modules', {'h2': None})
+    def test_create_session_falls_back_without_h2(self):
+        session = create_session()
+        self.assertIsInstance(session, requests.Session)
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_get_session_is_shared(self):
+        self.assertIs(get_session(), get_session())
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_reset_session(self):
+        first = get_session()
+        reset_session()
+        self.assertIsNot(first, get_session())
+
+    def test_httpx_response_raise_for_status(self):
+        inner = MagicMock(status_code=529, url='https://api.anthropic.com')
+        response = HttpxResponse(inner)
+        with self.assertRaises(requests.HTTPError) as ctx:
+            response.raise_for_status()
+        self.assertEqual(ctx.exception.response.status_code, 529)
+
+    def test_httpx_response_iter_lines_yields_bytes(self):
+        inner = MagicMock(status_code=200)
+        inner.iter_lines.return_value = iter(['data: {}', ''])
+        response = HttpxResponse(inner)
+        self.assertEqual(list(response.iter_lines()), [b'data: {}', b''])
+
+
+class TestCancelScope(unittest.TestCase):
+
+    @pytest.fixture(autouse=True)
+    def use_server(self, fake_llm_server):
+        self.server = fake_llm_server
+
+    def post_in_scope(self, scope):
+        errors = []
+
+        def post():
+            with cancel_scope(scope):
+                try:
+                    get_session().post(self.server.url + "/v1/messages", json={}, stream=True, timeout=(5, 10))
+                except Exception as e:
+                    errors.append(e)
+
+        thread = threading.Thread(target=post, daemon=True)
+        thread.start()
+        return thread, errors
+
+    def test_cancel_aborts_a_request_waiting_for_headers(self):
+        # once on a fresh connection, once on the kept-alive one
+        for _ in range(2):
+            get_session().post(self.server.url + "/v1/messages", json={}).close()
+            self.server.configure(latency=5)
+            scope = CancelScope()
+            thread, errors = self.post_in_scope(scope)
+            time.sleep(0.2)
+            start = time.perf_counter()
+            scope.cancel()
+            thread.join(2)
+            self.assertFalse(thread.is_alive())
+            self.assertLess(time.perf_counter() - start, 1)
+            self.assertIsInstance(errors[0], requests.ConnectionError)
+            self.server.configure(latency=0)
+
+    def test_cancelled_scope_sends_nothing(self):
+        scope = CancelScope()
+        scope.cancel()
+        thread, errors = self.post_in_scope(scope)
+        thread.join(2)
+        self.assertIsInstance(errors[0], RequestCancelled)
+
+
+class TestAsyncTransport(unittest.IsolatedAsyncioTestCase):
+
+    @patch.dict(os.environ, {"DRAVID_ASYNC_POOL_SIZE": "10"})
+    async def test_get_async_http_client_is_shared_per_loop(self):
+        client = get_async_http_client()
+        self.assertIs(client, get_async_http_client())
+        await close_async_http_client()
+        self.assertIsNot(client, get_async_http_client())
+        await close_async_http_client()
+
+    @patch.dict(os.environ, {"DRAVID_ASYNC_POOL_SIZE": "40"})
+    async def test_get_async_http_client_round_robins_shards(self):
+        clients = {id(get_async_http_client()) for _ in range(8)}
+        self.assertEqual(len(clients), 4)
+        await close_async_http_client()
+
+    @patch('drd.api.transport.get_async_http_client')
+    async def test_async_post_returns_wrapped_response(self, mock_get_client):
+        request = httpx.Request('POST', 'http://localhost/v1/messages')
+        mock_get_client.return_value.post = AsyncMock(
+            return_value=httpx.Response(200, json={'ok': True}, request=request))
+
+        response = await async_post('http://localhost/v1/messages', json={})
+
+        self.assertEqual(response.json(), {'ok': True})
+
+    @patch('drd.api.transport.get_async_http_client')
+    async def test_async_post_raises_http_error(self, mock_get_client):
+        request = httpx.Request('POST', 'http://localhost/v1/messages')
+        mock_get_client.return_value.post = AsyncMock(
+            return_value=httpx.Response(429, json={}, request=request))
+
+        with self.assertRaises(requests.HTTPError) as ctx:
+            await async_post('http://localhost/v1/messages', json={})
+        self.assertEqual(ctx.exception.response.status_code, 429)
+
+
+if __name__ == '__main__':
+    unittest.main()
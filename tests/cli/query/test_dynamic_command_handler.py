@@ -251,6 +251,33 @@ class TestDynamicCommandHandler(unittest.TestCase):
             call("Completed step 2/2")
         ])
 
+    @patch('drd.cli.query.dynamic_command_handler.print_info')
+    @patch('drd.cli.query.dynamic_command_handler.print_debug')
+    def test_execute_commands_from_a_stream(self, mock_print_debug, mock_print_info):
+        executed = []
+
+        def stream():
+            yield {'type': 'shell', 'command': 'mkdir app'}
+            # the first step has run before the next one is generated
+            self.assertEqual(executed, ['mkdir app'])
+            yield {'type': 'shell', 'command': 'ls app'}
+
+        def run(cmd, executor):
+            executed.append(cmd['command'])
+            return "Shell output"
+
+        with patch('drd.cli.query.dynamic_command_handler.handle_shell_command', side_effect=run):
+            success, steps_completed, error, output = execute_commands(
+                stream(), self.executor, self.metadata_manager, debug=True)
+
+        self.assertTrue(success)
+        self.assertEqual(steps_completed, 2)
+        self.assertEqual(executed, ['mkdir app', 'ls app'])
+        mock_print_debug.assert_has_calls([
+            call("Completed step 1/?"),
+            call("Completed step 2/?")
+        ])
+
     @patch('drd.cli.query.dynamic_command_handler.print_error')
     @patch('drd.cli.query.dynamic_command_handler.print_info')
     @patch('drd.cli.query.dynamic_command_handler.print_debug')
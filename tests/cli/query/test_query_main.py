@@ -1,3 +1,4 @@
+import os
 import unittest
 from unittest.mock import patch, MagicMock, call
 import requests
@@ -5,6 +6,25 @@ import requests
 from drd.cli.query.main import execute_dravid_command
 
 
+def streamed(response):
+    # the query command reads its commands from the parser fed by the stream
+    def stream(*args, parser=None, **kwargs):
+        parser.feed(response)
+        return response
+    return stream
+
+
+def streamed_steps(response):
+    def stream(*args, parser=None, **kwargs):
+        def steps():
+            yield from parser.feed(response)
+            received = len(parser.received)
+            parser.close()
+            yield from parser.received[received:]
+        return steps()
+    return stream
+
+
 class TestExecuteDravidCommand(unittest.TestCase):
 
     def setUp(self):
@@ -39,7 +59,7 @@ class TestExecuteDravidCommand(unittest.TestCase):
             'file_contents_to_load': ['file1.py', 'file2.py']
         }
 
-        mock_stream_api.return_value = """
+        mock_stream_api.side_effect = streamed("""
         <response>
             <steps>
                 <step>
@@ -54,7 +74,7 @@ class TestExecuteDravidCommand(unittest.TestCase):
                 </step>
             </steps>
         </response>
-        """
+        """)
         mock_execute_commands.return_value = (
             True, 2, None, "All commands executed successfully")
         mock_run_with_loader.side_effect = lambda f, *args, **kwargs: f()
@@ -89,7 +109,7 @@ class TestExecuteDravidCommand(unittest.TestCase):
             'new_files': [],
             'file_contents_to_load': ['file1.py', 'file2.py']
         }
-        mock_stream_api.return_value = """
+        mock_stream_api.side_effect = streamed("""
         <response>
             <explanation>Test explanation</explanation>
             <steps>
@@ -99,7 +119,7 @@ class TestExecuteDravidCommand(unittest.TestCase):
                 </step>
             </steps>
         </response>
-        """
+        """)
         mock_execute_commands.return_value = (
             False, 1, "Command failed", "Error output")
         mock_handle_error.return_value = True
@@ -114,9 +134,55 @@ class TestExecuteDravidCommand(unittest.TestCase):
         mock_print_info.assert_any_call(
             "Fix applied successfully. Continuing with the remaining commands.", indent=2)
 
+    @patch.dict(os.environ, {'DRAVID_PIPELINE': 'true'})
+    @patch('drd.cli.query.main.Executor')
+    @patch('drd.cli.query.main.ProjectMetadataManager')
+    @patch('drd.cli.query.main.stream_dravid_commands')
+    @patch('drd.cli.query.main.execute_commands')
+    @patch('drd.cli.query.main.handle_error_with_dravid')
+    @patch('drd.cli.query.main.print_error')
+    @patch('drd.cli.query.main.get_files_to_modify')
+    @patch('drd.cli.query.main.is_directory_empty')
+    @patch('drd.cli.query.main.run_with_loader')
+    def test_execute_dravid_command_pipelined(self, mock_run_with_loader, mock_is_directory_empty, mock_get_files,
+                                              mock_print_error, mock_handle_error, mock_execute_commands,
+                                              mock_stream_commands, mock_metadata_manager, mock_executor):
+        mock_executor.return_value = self.executor
+        mock_is_directory_empty.return_value = False
+        mock_metadata_manager.return_value = self.metadata_manager
+        self.metadata_manager.get_project_context.return_value = "Test project context"
+        mock_get_files.return_value = {
+            'main_file': None,
+            'dependencies': [],
+            'new_files': [],
+            'file_contents_to_load': []
+        }
+        mock_run_with_loader.side_effect = lambda f, *args, **kwargs: f()
+        mock_stream_commands.side_effect = streamed_steps(
+            "<response><steps>"
+            "<step><type>shell</type><command>false</command></step>"
+            "<step><type>shell</type><command>ls</command></step>"
+            "</steps></response>")
+
+        def execute(steps, *args, **kwargs):
+            if isinstance(steps, list):
+                return True, len(steps), None, "Remaining output"
+            # fails on the first step, before the rest has been read
+            next(steps)
+            return False, 1, "Command failed", "Error output"
+        mock_execute_commands.side_effect = execute
+        mock_handle_error.return_value = True
+
+        execute_dravid_command(self.query, self.image_path,
+                               self.debug, self.instruction_prompt)
+
+        mock_print_error.assert_any_call("Failed to execute command at step 1.")
+        self.assertEqual(mock_handle_error.call_args[0][1], {'type': 'shell', 'command': 'false'})
+        self.assertEqual(mock_execute_commands.call_args[0][0], [{'type': 'shell', 'command': 'ls'}])
+
     @patch('drd.cli.query.main.Executor')
     @patch('drd.cli.query.main.ProjectMetadataManager')
-    @patch('drd.cli.query.main.call_dravid_vision_api')
+    @patch('drd.cli.query.main.stream_dravid_vision_api')
     @patch('drd.cli.query.main.execute_commands')
     @patch('drd.cli.query.main.print_info')
     @patch('drd.cli.query.main.print_warning')
@@ -125,15 +191,16 @@ class TestExecuteDravidCommand(unittest.TestCase):
     @patch('drd.cli.query.main.get_files_to_modify')  # Add this line
     def test_execute_dravid_command_with_image(self, mock_get_files, mock_is_directory_empty, mock_run_with_loader,
                                                mock_print_warning, mock_print_info,
-                                               mock_execute_commands, mock_call_vision_api,
+                                               mock_execute_commands, mock_stream_vision_api,
                                                mock_metadata_manager, mock_executor):
         self.image_path = "test_image.jpg"
         mock_executor.return_value = self.executor
         mock_is_directory_empty.return_value = False
         mock_metadata_manager.return_value = self.metadata_manager
         self.metadata_manager.get_project_context.return_value = "Test project context"
-        mock_call_vision_api.return_value = [
-            {'type': 'shell', 'command': 'echo "Image processed"'}]
+        mock_stream_vision_api.side_effect = streamed(
+            "<response><steps><step><type>shell</type>"
+            "<command>echo \"Image processed\"</command></step></steps></response>")
         mock_execute_commands.return_value = (
             True, 1, None, "Image command executed successfully")
         mock_run_with_loader.side_effect = lambda f, *args, **kwargs: f()
@@ -146,7 +213,9 @@ class TestExecuteDravidCommand(unittest.TestCase):
         execute_dravid_command(self.query, self.image_path,
                                self.debug, self.instruction_prompt)
 
-        mock_call_vision_api.assert_called_once()
+        mock_stream_vision_api.assert_called_once()
+        self.assertEqual(mock_execute_commands.call_args[0][0], [
+            {'type': 'shell', 'command': 'echo "Image processed"'}])
         mock_print_info.assert_any_call(
             f"Processing image: {self.image_path}", indent=4)
 
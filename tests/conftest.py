@@ -0,0 +1,33 @@
+import pytest
+
+from drd.api.hedging import reset_hedging
+from drd.api.retry import reset_circuit_breakers
+from drd.api.scheduler import reset_schedulers
+from drd.api.transport import reset_session
+from drd.testing.fake_llm_server import start_fake_llm_server
+
+
+@pytest.fixture(autouse=True)
+def reset_provider_state():
+    # schedulers, circuit breakers and hedging samples are process-wide, so
+    # budgets used up or failures seen by one test must not leak into the next
+    reset_schedulers()
+    reset_circuit_breakers()
+    reset_hedging()
+    yield
+    reset_schedulers()
+    reset_circuit_breakers()
+    reset_hedging()
+
+
+@pytest.fixture
+def fake_llm_server(monkeypatch):
+    # every provider pointed at a local server speaking its wire format;
+    # reconfigure it with fake_llm_server.configure(latency=..., rpm=...)
+    server = start_fake_llm_server()
+    for name, value in server.env().items():
+        monkeypatch.setenv(name, value)
+    reset_session()
+    yield server
+    server.stop()
+    reset_session()
@@ -70,7 +70,7 @@ class TestProjectMetadataManager(unittest.TestCase):
         self.assertFalse(self.manager.is_binary_file('script.py'))
         self.assertFalse(self.manager.is_binary_file('config.json'))
 
-    @patch('src.drd.metadata.project_metadata.call_dravid_api_with_pagination')
+    @patch('src.drd.metadata.project_metadata.async_call_dravid_api_with_pagination')
     @patch('builtins.open', new_callable=mock_open, read_data='print("Hello, World!")')
     async def test_analyze_file(self, mock_file, mock_api_call):
         mock_api_call.return_value = '''
@@ -88,6 +88,23 @@ class TestProjectMetadataManager(unittest.TestCase):
         self.assertEqual(file_info['type'], 'python')
         self.assertEqual(file_info['summary'], 'A simple Python script')
 
+    @patch('src.drd.metadata.project_metadata.async_call_dravid_api_with_pagination')
+    @patch('builtins.open', new_callable=mock_open, read_data='print("Hello, World!")')
+    async def test_analyze_file_with_prose_before_the_xml(self, mock_file, mock_api_call):
+        mock_api_call.return_value = '''Here is the metadata for script.py:
+        <response>
+          <metadata>
+            <type>python</type>
+            <summary>Reads & prints a greeting</summary>
+            <exports>None</exports>
+            <imports>None</imports>
+          </metadata>
+        </response>
+        '''
+        file_info = await self.manager.analyze_file('/fake/project/dir/script.py')
+        self.assertEqual(file_info['type'], 'python')
+        self.assertEqual(file_info['summary'], 'Reads & prints a greeting')
+
     @patch('src.drd.metadata.project_metadata.ProjectMetadataManager.analyze_file')
     @patch('os.walk')
     async def test_build_metadata(self, mock_walk, mock_analyze_file):
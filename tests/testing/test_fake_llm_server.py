@@ -0,0 +1,82 @@
+import unittest
+from unittest.mock import patch
+import os
+import time
+import pytest
+import requests
+
+from drd.api.claude_api import call_claude_api_with_pagination, async_call_claude_api_with_pagination, stream_claude_response
+from drd.api.openai_api import call_api_with_pagination, stream_response
+from drd.api.ollama_api import call_ollama_api, stream_ollama_response
+from drd.testing.fake_llm_server import DEFAULT_RESPONSE
+
+CUSTOM_ENV = {'DRAVID_LLM': 'custom', 'DRAVID_LLM_API_KEY': 'fake-key', 'DRAVID_LLM_MODEL': 'fake-model'}
+SCRIPTED = "<response><explanation>Scripted</explanation></response>"
+
+
+@patch.dict(os.environ, {'CLAUDE_API_KEY': 'fake-key'})
+class TestFakeLLMServer(unittest.TestCase):
+
+    @pytest.fixture(autouse=True)
+    def use_server(self, fake_llm_server):
+        self.server = fake_llm_server
+
+    def test_anthropic_messages(self):
+        self.assertIn('echo fake', call_claude_api_with_pagination("Hi"))
+        self.assertEqual(self.server.request_count('/v1/messages'), 1)
+
+    def test_anthropic_sse(self):
+        self.assertEqual(''.join(stream_claude_response("Hi")), DEFAULT_RESPONSE)
+
+    @patch.dict(os.environ, CUSTOM_ENV)
+    def test_openai_chat_completions(self):
+        self.assertIn('echo fake', call_api_with_pagination("Hi"))
+        self.assertEqual(''.join(stream_response("Hi")), DEFAULT_RESPONSE)
+        self.assertEqual(self.server.request_count('/v1/chat/completions'), 2)
+
+    def test_ollama_chat(self):
+        self.assertEqual(call_ollama_api('llama3', "Hi"), DEFAULT_RESPONSE)
+        self.assertEqual(''.join(stream_ollama_response('llama3', "Hi")), DEFAULT_RESPONSE)
+
+    def test_ollama_generate(self):
+        response = requests.post(f"{self.server.url}/api/generate",
+                                 json={'model': 'llama3', 'prompt': 'Hi', 'stream': False})
+        self.assertEqual(response.json()['response'], DEFAULT_RESPONSE)
+        self.assertTrue(response.json()['done'])
+
+    def test_scripted_responses_are_served_in_turn(self):
+        self.server.configure(responses=[SCRIPTED, DEFAULT_RESPONSE])
+        self.assertIn('Scripted', call_claude_api_with_pagination("Hi"))
+        self.assertIn('echo fake', call_claude_api_with_pagination("Hi"))
+
+    def test_rate_limited_requests_are_retried(self):
+        self.server.configure(error_rate=0.3, retry_after=0.01, seed=7)
+        for _ in range(12):
+            call_claude_api_with_pagination("Hi")
+        self.assertGreater(self.server.rate_limited, 0)
+        self.assertEqual(self.server.request_count(), 12 + self.server.rate_limited)
+
+    def test_latency_and_throughput(self):
+        self.server.configure(latency=0.1, tokens_per_second=1000)
+        start = time.perf_counter()
+        call_claude_api_with_pagination("Hi")
+        # 0.1s to the first byte, then about 30 tokens at 1000 per second
+        self.assertGreaterEqual(time.perf_counter() - start, 0.12)
+
+    def test_unknown_path(self):
+        self.assertEqual(requests.post(f"{self.server.url}/v2/other", json={}).status_code, 404)
+
+
+class TestAsyncFakeLLMServer(unittest.IsolatedAsyncioTestCase):
+
+    @pytest.fixture(autouse=True)
+    def use_server(self, fake_llm_server):
+        self.server = fake_llm_server
+
+    @patch.dict(os.environ, {'CLAUDE_API_KEY': 'fake-key'})
+    async def test_async_anthropic_messages(self):
+        self.assertIn('echo fake', await async_call_claude_api_with_pagination("Hi"))
+
+
+if __name__ == '__main__':
+    unittest.main()
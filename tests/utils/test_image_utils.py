@@ -0,0 +1,99 @@
+import unittest
+from unittest.mock import patch
+import base64
+import os
+import tempfile
+
+from drd.utils import image_utils
+from drd.utils.image_utils import (
+    prepare_image,
+    prepare_images,
+    guess_mime_type,
+    clear_image_cache,
+    has_pillow,
+)
+
+PNG_HEADER = b'\x89PNG\r\n\x1a\n'
+
+
+class TestImageUtils(unittest.TestCase):
+
+    def setUp(self):
+        clear_image_cache()
+        image_utils._warned_missing_pillow = False
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        clear_image_cache()
+        self.tmpdir.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_guess_mime_type_prefers_content(self):
+        self.assertEqual(guess_mime_type('shot.jpg', PNG_HEADER + b'rest'), 'image/png')
+        self.assertEqual(guess_mime_type('shot.img', b'RIFF\x00\x00\x00\x00WEBPVP8 '), 'image/webp')
+        self.assertEqual(guess_mime_type('shot.gif', b'unknown'), 'image/gif')
+
+    @patch('drd.utils.image_utils.has_pillow', return_value=False)
+    def test_without_pillow_image_is_sent_unchanged(self, _):
+        path = self.write('shot.png', PNG_HEADER + b'data')
+        image = prepare_image(path)
+        self.assertEqual(image.mime_type, 'image/png')
+        self.assertEqual(base64.b64decode(image.data), PNG_HEADER + b'data')
+
+    @patch('drd.utils.image_utils.has_pillow', return_value=False)
+    def test_unchanged_file_is_encoded_once(self, _):
+        path = self.write('a.png', PNG_HEADER + b'same')
+        with patch.object(image_utils, 'encode_image', wraps=image_utils.encode_image) as mock_encode:
+            self.assertEqual(prepare_image(path), prepare_image(path))
+            self.write('a.png', PNG_HEADER + b'changed')
+            self.assertEqual(base64.b64decode(prepare_image(path).data), PNG_HEADER + b'changed')
+        self.assertEqual(mock_encode.call_count, 2)
+
+    @patch('drd.utils.image_utils.has_pillow', return_value=False)
+    def test_prepared_image_is_kept_in_the_response_cache(self, _):
+        path = self.write('a.png', PNG_HEADER + b'data')
+        cache_dir = os.path.join(self.tmpdir.name, 'cache')
+        with patch.dict(os.environ, {'DRAVID_CACHE': '1', 'DRAVID_CACHE_DIR': cache_dir}), \
+                patch.object(image_utils, 'encode_image', wraps=image_utils.encode_image) as mock_encode:
+            first = prepare_image(path)
+            clear_image_cache()
+            self.assertEqual(prepare_image(path), first)
+        self.assertEqual(mock_encode.call_count, 1)
+
+    @patch('drd.utils.image_utils.print_warning')
+    @patch('drd.utils.image_utils.has_pillow', return_value=False)
+    def test_missing_pillow_is_reported_once(self, _, mock_warning):
+        prepare_images([self.write(f'{i}.png', PNG_HEADER + bytes([i])) for i in range(3)])
+        mock_warning.assert_called_once()
+        self.assertIn('dravid[images]', mock_warning.call_args[0][0])
+
+    @patch('drd.utils.image_utils.has_pillow', return_value=False)
+    def test_prepare_images_keeps_order(self, _):
+        paths = [self.write(f'{i}.png', PNG_HEADER + bytes([i])) for i in range(5)]
+        images = prepare_images(paths)
+        self.assertEqual([base64.b64decode(image.data)[-1] for image in images], list(range(5)))
+        self.assertEqual(len(prepare_images(paths[0])), 1)
+
+    @unittest.skipUnless(has_pillow(), "Pillow is not installed")
+    def test_large_image_is_downscaled_and_reencoded(self):
+        from PIL import Image
+        import io
+        output = io.BytesIO()
+        Image.effect_noise((3000, 2000), 64).convert('RGB').save(output, 'PNG')
+        path = self.write('big.png', output.getvalue())
+
+        image = prepare_image(path)
+
+        self.assertIn(image.mime_type, ('image/webp', 'image/jpeg'))
+        self.assertLess(len(base64.b64decode(image.data)), image.original_size)
+        with Image.open(io.BytesIO(base64.b64decode(image.data))) as result:
+            self.assertEqual(max(result.size), 1568)
+
+
+if __name__ == '__main__':
+    unittest.main()
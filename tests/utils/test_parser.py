@@ -1,4 +1,5 @@
 import unittest
+import pickle
 from unittest.mock import patch, MagicMock
 import xml.etree.ElementTree as ET
 from lxml import etree
@@ -7,7 +8,9 @@ from drd.utils.parser import (
     extract_and_parse_xml,
     parse_dravid_response,
     parse_file_list_response,
-    parse_find_file_response
+    parse_find_file_response,
+    parse_xml,
+    ParsedResponse
 )
 
 
@@ -346,3 +349,25 @@ class TestDravidParser(unittest.TestCase):
         self.assertIn('- old_function()', result[1]['changes'])
         self.assertIn('+ new_function()', result[1]['changes'])
         self.assertIn('+ additional_line()', result[1]['changes'])
+
+    def test_parsed_response_is_parsed_once(self):
+        response = ParsedResponse("Sure: <response><explanation>Hi</explanation>"
+                                  "<steps><step><type>shell</type><command>ls</command></step></steps></response>")
+        self.assertTrue(response.startswith("Sure:"))
+        with patch('drd.utils.parser.parse_xml', wraps=parse_xml) as mock_parse_xml:
+            root = extract_and_parse_xml(response)
+            self.assertIs(extract_and_parse_xml(response), root)
+            self.assertEqual(parse_dravid_response(response), [
+                {'type': 'explanation', 'content': 'Hi'},
+                {'type': 'shell', 'command': 'ls'}])
+        mock_parse_xml.assert_called_once()
+
+    def test_parsed_response_keeps_a_given_tree(self):
+        root = extract_and_parse_xml("<response><file>a.py</file></response>")
+        response = ParsedResponse("<response><file>a.py</file></response>", root)
+        self.assertIs(response.root, root)
+        self.assertEqual(parse_file_list_response(response), ['a.py'])
+        # pickling keeps the text only
+        copy = pickle.loads(pickle.dumps(response))
+        self.assertEqual(copy, response)
+        self.assertIsNot(copy.root, root)
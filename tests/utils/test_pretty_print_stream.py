@@ -1,4 +1,4 @@
-from drd.utils.pretty_print_stream import stream_and_print_commands
+from drd.utils.pretty_print_stream import stream_and_print_commands, pretty_print_xml_stream
 
 
 def test_basic_explanation(capsys):
@@ -382,3 +382,46 @@ def test_cdata_with_instruction_like_content(capsys):
     assert "<html> <body>This is the content of the file</body> </html>" in captured.out
     assert "]]>" in captured.out
     assert "</response>" in captured.out
+
+
+def test_output_does_not_depend_on_chunking(capsys):
+    text = (
+        "<response>< explanation >Chunking</ explanation ><steps>"
+        "<step><type>file</type><operation>CREATE</operation><filename>a.txt</filename>"
+        "<content><![CDATA[a < b </steps>]]></content></step>"
+        "<step\n><type>shell</type><command>ls</command></step\n>"
+        "</steps></response>"
+    )
+    stream_and_print_commands([text])
+    whole = capsys.readouterr().out
+    stream_and_print_commands(list(text))
+    assert capsys.readouterr().out == whole
+    assert "Shell Command: ls" in whole
+
+
+def test_large_step_is_not_rescanned(capsys):
+    state = {'buffer': '', 'in_step': False}
+    pretty_print_xml_stream("<response><steps><step><type>file</type><content><![CDATA[", state)
+    for _ in range(5000):
+        pretty_print_xml_stream("x" * 20, state)
+    # the body of the step is set aside, only an unfinished tag stays in the buffer
+    assert state['buffer'] == ''
+    pretty_print_xml_stream("]]></content></st", state)
+    assert state['buffer'] == '</st'
+    pretty_print_xml_stream("ep>", state)
+    assert not state['in_step']
+    assert "x" * 100000 in capsys.readouterr().out
+
+
+def test_oversized_step_shows_its_start_and_end(capsys):
+    state = {'buffer': '', 'in_step': False, 'step_limit': 100}
+    pretty_print_xml_stream("<step><type>file</type><content><![CDATA[", state)
+    for i in range(1000):
+        pretty_print_xml_stream(f"{i:05d} ", state)
+    pretty_print_xml_stream("]]></content></step>", state)
+    out = capsys.readouterr().out
+    assert "00000 " in out
+    assert "00999" in out
+    assert "00500 " not in out
+    assert "characters not shown" in out
+    assert state['kept'] == 0
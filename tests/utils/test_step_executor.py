@@ -3,11 +3,13 @@ from unittest.mock import patch, mock_open, MagicMock
 import os
 import json
 import subprocess
+import tempfile
 from io import StringIO
 
 # Update this import to match your actual module structure
 from drd.utils.step_executor import Executor
 from drd.utils.apply_file_changes import apply_changes
+from drd.utils.spool import SpoolWriter
 
 
 class TestExecutor(unittest.TestCase):
@@ -141,6 +143,22 @@ class TestExecutor(unittest.TestCase):
         mock_file().write.assert_called_with('content')
         mock_confirm.assert_called_once()
 
+    @patch('click.confirm')
+    def test_perform_file_operation_create_spooled(self, mock_confirm):
+        mock_confirm.return_value = True
+        writer = SpoolWriter()
+        writer.write("spooled content\n")
+        content = writer.close()
+        with tempfile.TemporaryDirectory() as project:
+            self.executor.current_dir = project
+            self.executor.allowed_directories = [project]
+            result = self.executor.perform_file_operation(
+                'CREATE', 'big.txt', content)
+            self.assertTrue(result)
+            with open(os.path.join(project, 'big.txt')) as f:
+                self.assertEqual(f.read(), 'spooled content')
+        self.assertFalse(os.path.exists(content.path))
+
     @patch('os.path.exists')
     @patch('builtins.open', new_callable=mock_open, read_data="original content")
     @patch('click.confirm')
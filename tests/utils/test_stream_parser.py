@@ -0,0 +1,149 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from drd.utils.parser import parse_dravid_response, escape_stray_markup, MarkupEscaper
+from drd.utils.stream_parser import StreamParser
+from drd.utils.spool import SpooledContent, SpoolWriter
+
+RESPONSE = """Here is the plan:
+<response>
+    <explanation>Create a Flask app &amp; install it</explanation>
+    <requires_restart>false</requires_restart>
+    <steps>
+        <step>
+            <type>shell</type>
+            <command>mkdir app && cd app</command>
+        </step>
+        <step>
+            <type>file</type>
+            <operation>CREATE</operation>
+            <filename>app.py</filename>
+            <content><![CDATA[
+if a < b and c & d:
+    print("</step></response>")
+]]></content>
+        </step>
+        <step>
+            <type>shell</type>
+            <command>pip install flask</command>
+        </step>
+    </steps>
+</response>
+Let me know if you need anything else."""
+
+
+def feed_in_chunks(parser, text, size):
+    completed = []
+    for i in range(0, len(text), size):
+        completed.append(parser.feed(text[i:i + size]))
+    return completed
+
+
+class TestStreamParser(unittest.TestCase):
+
+    def test_matches_full_parse_for_any_chunking(self):
+        expected = parse_dravid_response(RESPONSE)
+        self.assertEqual(len(expected), 5)
+        for size in (1, 2, 7, 64, len(RESPONSE)):
+            parser = StreamParser()
+            feed_in_chunks(parser, RESPONSE, size)
+            self.assertEqual(parser.close(), expected, f"chunk size {size}")
+
+    def test_steps_are_emitted_when_their_closing_tag_arrives(self):
+        parser = StreamParser()
+        first = RESPONSE.index('</step>') + len('</step>')
+        emitted = parser.feed(RESPONSE[:first - 1])
+        self.assertEqual([c['type'] for c in emitted], ['explanation', 'requires_restart'])
+        self.assertEqual(parser.feed(RESPONSE[first - 1:first]), [
+            {'type': 'shell', 'command': 'mkdir app && cd app'}])
+
+    def test_cdata_is_kept_verbatim(self):
+        parser = StreamParser()
+        feed_in_chunks(parser, RESPONSE, 3)
+        content = parser.close()[3]['content']
+        self.assertEqual(content, 'if a < b and c & d:\n    print("</step></response>")')
+
+    def test_junk_before_and_after_the_response_is_ignored(self):
+        parser = StreamParser()
+        parser.feed("Sure, <resp")
+        parser.feed("onse> is coming: <response><steps><step><type>shell</type>")
+        parser.feed("<command>ls</command></step></steps></response> <response>again")
+        self.assertEqual(parser.close(), [{'type': 'shell', 'command': 'ls'}])
+
+    def test_no_response(self):
+        parser = StreamParser()
+        parser.feed("I cannot help with that.")
+        self.assertEqual(parser.close(), [])
+
+    def test_truncated_stream_keeps_only_complete_steps(self):
+        parser = StreamParser()
+        cut = RESPONSE.index('<filename>')
+        feed_in_chunks(parser, RESPONSE[:cut], 5)
+        self.assertEqual([c['type'] for c in parser.close()], ['explanation', 'requires_restart', 'shell'])
+
+    @patch.object(MarkupEscaper, 'feed', lambda self, chunk, final=False: chunk)
+    def test_steps_after_a_syntax_error_come_from_the_same_pass(self):
+        # unescaped, `&&` makes libxml2 stop reporting events
+        parser = StreamParser()
+        emitted = sum(feed_in_chunks(parser, RESPONSE, 16), [])
+        commands = parser.close()
+        self.assertLess(len(emitted), len(commands))
+        self.assertEqual([c['type'] for c in commands],
+                         ['explanation', 'requires_restart', 'shell', 'file', 'shell'])
+
+    def test_large_cdata_is_spooled_to_disk(self):
+        parser = StreamParser(spool_threshold=16)
+        feed_in_chunks(parser, RESPONSE, 5)
+        commands = parser.close()
+        content = commands[3]['content']
+        self.assertIsInstance(content, SpooledContent)
+        try:
+            self.assertEqual(content.read(), 'if a < b and c & d:\n    print("</step></response>")')
+            self.assertEqual(content.size, os.path.getsize(content.path))
+            # the rest of the response is parsed as usual
+            self.assertEqual(commands[:3] + commands[4:], parse_dravid_response(RESPONSE)[:3] + [
+                {'type': 'shell', 'command': 'pip install flask'}])
+        finally:
+            content.discard()
+        self.assertFalse(os.path.exists(content.path))
+
+    def test_small_cdata_stays_in_memory(self):
+        parser = StreamParser(spool_threshold=1024)
+        feed_in_chunks(parser, RESPONSE, 5)
+        self.assertEqual(parser.close(), parse_dravid_response(RESPONSE))
+
+
+class TestSpoolWriter(unittest.TestCase):
+
+    def test_strips_like_inline_content(self):
+        writer = SpoolWriter()
+        for chunk in ["\n  ", " a", " é ", "\n", " b  ", "\n\n"]:
+            writer.write(chunk)
+        content = writer.close()
+        try:
+            self.assertEqual(content.read(), "a é \n b")
+            self.assertEqual(content.size, len("a é \n b".encode('utf-8')))
+        finally:
+            content.discard()
+
+
+class TestMarkupEscaper(unittest.TestCase):
+
+    def test_escapes_stray_ampersands_and_brackets(self):
+        self.assertEqual(escape_stray_markup("<c>a && b < c &amp; &#38;</c>"),
+                         "<c>a &amp;&amp; b &lt; c &amp; &#38;</c>")
+
+    def test_leaves_cdata_and_comments_alone(self):
+        text = "<c><![CDATA[a && b < c]]><!-- x & y --></c>"
+        self.assertEqual(escape_stray_markup(text), text)
+
+    def test_constructs_split_across_chunks(self):
+        escaper = MarkupEscaper()
+        chunks = ["<c>a &a", "mp; b &", "& c <!", "[CDATA[x & y]", "]> <", "/c>"]
+        escaped = ''.join(escaper.feed(chunk) for chunk in chunks) + escaper.close()
+        self.assertEqual(escaped, "<c>a &amp; b &amp;&amp; c <![CDATA[x & y]]> </c>")
+
+
+if __name__ == '__main__':
+    unittest.main()